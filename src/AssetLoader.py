@@ -0,0 +1,195 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+import ctypes
+import logging
+import time
+import numpy as np
+from GLBackend import *
+
+log = logging.getLogger(__name__)
+
+class AssetLoader:
+
+    '''
+    Loads textures through the texture cache on a worker pool and uploads them on the
+    GL thread within a per-frame time budget, staging the pixels through a pixel
+    buffer object.
+    '''
+
+    def __init__(self, workers: int = None, processes: bool = False, upload_budget_ms: float = 4.0, use_pbo: bool = True):
+
+        '''
+        Initializes the worker pool.
+
+        Args:
+            workers: Number of decode workers, defaults to the executor's default.
+            processes: Decode in a process pool instead of a thread pool.
+            upload_budget_ms: Time per frame the GL thread may spend uploading.
+            use_pbo: Stage uploads through a pixel buffer object.
+        '''
+
+        if processes:
+            self.executor = ProcessPoolExecutor(max_workers=workers)
+        else:
+            self.executor = ThreadPoolExecutor(max_workers=workers)
+
+        self.upload_budget_ms = upload_budget_ms
+        self.use_pbo = use_pbo
+        self.pbo = None
+
+        # decoded images waiting for the GL thread, appended from worker callbacks.
+        self.ready = deque()
+        self.pending = 0
+
+        # counters.
+        self.decoded = 0
+        self.uploaded = 0
+        self.failed = 0
+        self.decode_seconds = 0.0
+        self.upload_seconds = 0.0
+
+    def request(self, handle):
+
+        '''
+        Queues a texture for decoding.
+
+        Args:
+            handle: The TextureHandle to load, uploaded through its manager once decoded.
+        '''
+
+        self.pending += 1
+        future = self.executor.submit(handle.manager.cache.load, handle.path)
+        future.add_done_callback(lambda future: self.ready.append((handle, future)))
+
+    def pump(self, budget_ms: float = None) -> int:
+
+        '''
+        Uploads decoded textures until the queue is empty or the time budget is spent.
+        Must be called on the GL thread, once per frame. Textures that failed to load
+        are counted and logged, their objects keep the placeholder.
+
+        Args:
+            budget_ms: Upload time budget, defaults to upload_budget_ms.
+
+        Returns:
+            The number of textures uploaded.
+        '''
+
+        if budget_ms is None:
+            budget_ms = self.upload_budget_ms
+
+        start = time.perf_counter()
+        deadline = start + budget_ms / 1000.0
+        uploaded = 0
+
+        # always upload at least one texture so large images still make progress.
+        while self.ready and (uploaded == 0 or time.perf_counter() < deadline):
+            handle, future = self.ready.popleft()
+            self.pending -= 1
+
+            try:
+                data = future.result()
+            except Exception as error:
+                # a missing or corrupt image must not stop the scene, the handle stays
+                # marked loading so it is not requested again every frame.
+                self.failed += 1
+                log.warning("could not load texture %s: %s", handle.path, error)
+                continue
+
+            self.decoded += 1
+            self.decode_seconds += data.decode_seconds
+
+            self.upload(handle, data)
+            uploaded += 1
+
+        self.uploaded += uploaded
+        self.upload_seconds += time.perf_counter() - start
+
+        return uploaded
+
+    def upload(self, handle, data):
+
+        '''
+        Uploads a texture's mip chain, through the pixel buffer object if enabled.
+
+        Args:
+            handle: The TextureHandle being loaded.
+            data: The TextureData returned by the texture cache.
+        '''
+
+        if not self.use_pbo:
+            handle.manager.upload(handle, data)
+            return
+
+        if self.pbo is None:
+            self.pbo = glGenBuffers(1)
+
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, self.pbo)
+
+        # orphan the previous storage so the driver does not wait for the last transfer.
+        glBufferData(GL_PIXEL_UNPACK_BUFFER, data.nbytes, None, GL_STREAM_DRAW)
+        pointer = glMapBufferRange(GL_PIXEL_UNPACK_BUFFER, 0, data.nbytes,
+                                   GL_MAP_WRITE_BIT | GL_MAP_INVALIDATE_BUFFER_BIT)
+
+        if not pointer:
+            # mapping is not available, fall back to a client-memory upload.
+            glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+            self.use_pbo = False
+            handle.manager.upload(handle, data)
+            return
+
+        # copy the levels back to back, straight from the (possibly memory-mapped) arrays.
+        offsets = []
+        offset = 0
+        for level in data.levels:
+            level = np.ascontiguousarray(level)
+            ctypes.memmove(pointer + offset, level.ctypes.data, level.nbytes)
+            offsets.append(offset)
+            offset += level.nbytes
+
+        glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+
+        # with a bound unpack buffer the data arguments are offsets into it.
+        handle.manager.upload(handle, data, offsets)
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+
+    def stats(self) -> dict:
+
+        '''
+        Returns the loader counters.
+
+        Returns:
+            A dict with queue sizes, counts (including failed loads) and accumulated
+            decode/upload times.
+        '''
+
+        return {
+            "pending": self.pending,
+            "ready": len(self.ready),
+            "decoded": self.decoded,
+            "uploaded": self.uploaded,
+            "failed": self.failed,
+            "decode_seconds": self.decode_seconds,
+            "upload_seconds": self.upload_seconds,
+        }
+
+    def shutdown(self):
+
+        '''
+        Stops the worker pool, waiting for decodes already running, and frees the
+        pixel buffer object.
+        '''
+
+        self.executor.shutdown(wait=True, cancel_futures=True)
+
+        if self.pbo is not None:
+            glDeleteBuffers(1, [self.pbo])
+            self.pbo = None
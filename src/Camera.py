@@ -7,14 +7,33 @@ Digital Museum
 '''
 
 import numpy as np
-from OpenGL.GL import *
-import sdl2
-import sdl2.video
+from GLBackend import *
+from ShaderProgram import BLOCK_BINDINGS
+
+def get_orbit_path(frames: int, degrees: float = 360.0):
+
+    '''
+    Returns a scripted camera path turning the camera at a constant rate.
+
+    Args:
+        frames: Number of frames the path takes.
+        degrees: Total rotation over the path.
+
+    Returns:
+        A function of the frame number returning the rotation in degrees.
+    '''
+
+    return lambda frame: degrees * frame / max(frames, 1)
 
 class Camera:
     
     '''
     Represents a camera in a 3D scene, capable of projection and view transformations.
+
+    The projection and view matrices and the eye position live in a std140 uniform
+    buffer bound to the "Camera" block of every shader program:
+
+        layout (std140) uniform Camera { mat4 projection; mat4 view; vec4 viewPos; };
     '''
 
     def __init__(self, shader):
@@ -23,13 +42,23 @@ class Camera:
         Initializes the camera with a specific shader and sets up the initial projection matrix.
 
         Args:
-            shader (int): The shader program ID to be used for rendering.
+            shader (ShaderProgram): The shader program used for rendering.
         '''
         
         self.rotation_angle_degrees = 0.0
         self.shader = shader
         
         self.projection_transform = self.get_projection_mx(90, 800/600, 0.1, 10)
+
+        # two column-major mat4 and a vec4, 144 bytes in std140 layout.
+        self.ubo = glGenBuffers(1)
+        glBindBuffer(GL_UNIFORM_BUFFER, self.ubo)
+        glBufferData(GL_UNIFORM_BUFFER, 144, None, GL_DYNAMIC_DRAW)
+        glBindBufferBase(GL_UNIFORM_BUFFER, BLOCK_BINDINGS["Camera"], self.ubo)
+
+        # angle of the last upload, the buffer is only rewritten when it changes.
+        self.uploaded_angle = None
+        self.buffer_updates = 0
         
 
     def start(self):
@@ -103,26 +132,57 @@ class Camera:
             [0, 0, 0, 1]
         ], dtype=np.float32)
         
+    def get_position(self) -> np.ndarray:
+
+        '''
+        Computes the eye position in world space from the view matrix.
+
+        Returns:
+        numpy.ndarray: The (x, y, z, 1) position the view matrix maps to the origin.
+        '''
+
+        # a rigid view maps p to p @ R + t, the eye is -t @ R^T.
+        view = self.get_rotation_mx()
+        position = np.ones(4, dtype=np.float32)
+        position[:3] = -view[3, :3] @ view[:3, :3].T
+
+        return position
+
+    def get_view_projection_mx(self) -> np.ndarray:
+
+        '''
+        Combines the camera rotation with the projection.
+
+        Returns:
+        numpy.ndarray: The matrix mapping world-space row vectors to clip space.
+        '''
+
+        return np.dot(
+            self.get_rotation_mx(),
+            self.projection_transform
+        )
+        
     def tell_shader(self):
         
         '''
-        Applies the current rotation to the projection transform and updates the shader's
-        projection matrix uniform.
+        Writes the projection, the current rotation (view) and the eye position to the
+        camera uniform buffer, once per change rather than once per program or object.
         '''
-        
-        # set the uniform matrix in shader.
-        glUniformMatrix4fv(
-            glGetUniformLocation(
-                self.shader,
-                "projection"
-            ),
-            1,
-            GL_FALSE,
-            np.dot(
-                self.get_rotation_mx(),
-                self.projection_transform
-            )
-        )
+
+        if self.uploaded_angle == self.rotation_angle_degrees:
+            return
+
+        # uploaded as is, like glUniformMatrix4fv with GL_FALSE, GLSL sees the column-major transposes.
+        data = np.concatenate((
+            self.projection_transform.ravel(),
+            self.get_rotation_mx().ravel(),
+            self.get_position()
+        ))
+        glBindBuffer(GL_UNIFORM_BUFFER, self.ubo)
+        glBufferSubData(GL_UNIFORM_BUFFER, 0, data.nbytes, data)
+
+        self.uploaded_angle = self.rotation_angle_degrees
+        self.buffer_updates += 1
               
 
 
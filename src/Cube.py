@@ -6,9 +6,13 @@ Mail: william_abrahamsson@outlook.com
 Digital Museum
 '''
 
-from OpenGL.GL import *
+from GLBackend import *
 import numpy as np
-from PIL import Image
+from Mesh import Mesh
+import Geometry
+import MeshLoader
+import TextureManager
+import TransformStore
 
 class Cube:
     
@@ -16,7 +20,109 @@ class Cube:
     Represents a 3D object within a scene, including its geometry, texture, and transformations.
     '''
 
-    def __init__(self, position: list[float], angles: list[float], scale: list[float], angular_velocity: list[float], texture_path: str):
+    # 3D Space: (x, y, z), Texture: (u, v)
+    VERTICES = (
+        # front face
+        -0.5, -0.5, -0.5, 0, 0,
+        0.5, -0.5, -0.5, 1, 0,
+        0.5,  0.5, -0.5, 1, 1,
+        0.5,  0.5, -0.5, 1, 1,
+        -0.5,  0.5, -0.5, 0, 1,
+        -0.5, -0.5, -0.5, 0, 0,
+
+        # back face
+        -0.5, -0.5,  0.5, 1, 0,
+        0.5, -0.5,  0.5, 0, 0,
+        0.5,  0.5,  0.5, 0, 1,
+        0.5,  0.5,  0.5, 0, 1,
+        -0.5,  0.5,  0.5, 1, 1,
+        -0.5, -0.5,  0.5, 1, 0,
+
+        # left face
+        -0.5, -0.5, -0.5, 0, 0,
+        -0.5, -0.5,  0.5, 1, 0,
+        -0.5,  0.5,  0.5, 1, 1,
+        -0.5,  0.5,  0.5, 1, 1,
+        -0.5,  0.5, -0.5, 0, 1,
+        -0.5, -0.5, -0.5, 0, 0,
+
+        # right face
+        0.5, -0.5, -0.5, 1, 0,
+        0.5, -0.5,  0.5, 0, 0,
+        0.5,  0.5,  0.5, 0, 1,
+        0.5,  0.5,  0.5, 0, 1,
+        0.5,  0.5, -0.5, 1, 1,
+        0.5, -0.5, -0.5, 1, 0,
+
+        # top face
+        -0.5, -0.5,  0.5, 0, 1,
+        0.5, -0.5,  0.5, 1, 1,
+        0.5, -0.5, -0.5, 1, 0,
+        0.5, -0.5, -0.5, 1, 0,
+        -0.5, -0.5, -0.5, 0, 0,
+        -0.5, -0.5,  0.5, 0, 1,
+
+        # bottom face
+        -0.5,  0.5,  0.5, 0, 0,
+        0.5,  0.5,  0.5, 1, 0,
+        0.5,  0.5, -0.5, 1, 1,
+        0.5,  0.5, -0.5, 1, 1,
+        -0.5,  0.5, -0.5, 0, 1,
+        -0.5,  0.5,  0.5, 0, 0
+    )
+
+    # Normals for each face of the cube (nx, ny, nz).
+    NORMALS = (
+        # front face
+        0.0, 0.0, -1.0,
+        0.0, 0.0, -1.0,
+        0.0, 0.0, -1.0,
+        0.0, 0.0, -1.0,
+        0.0, 0.0, -1.0,
+        0.0, 0.0, -1.0,
+
+        # back face
+        0.0, 0.0, 1.0,
+        0.0, 0.0, 1.0,
+        0.0, 0.0, 1.0,
+        0.0, 0.0, 1.0,
+        0.0, 0.0, 1.0,
+        0.0, 0.0, 1.0,
+
+        # left face
+        -1.0, 0.0, 0.0,
+        -1.0, 0.0, 0.0,
+        -1.0, 0.0, 0.0,
+        -1.0, 0.0, 0.0,
+        -1.0, 0.0, 0.0,
+        -1.0, 0.0, 0.0,
+
+        # right face
+        1.0, 0.0, 0.0,
+        1.0, 0.0, 0.0,
+        1.0, 0.0, 0.0,
+        1.0, 0.0, 0.0,
+        1.0, 0.0, 0.0,
+        1.0, 0.0, 0.0,
+
+        # top face
+        0.0, 1.0, 0.0,
+        0.0, 1.0, 0.0,
+        0.0, 1.0, 0.0,
+        0.0, 1.0, 0.0,
+        0.0, 1.0, 0.0,
+        0.0, 1.0, 0.0,
+
+        # bottom face
+        0.0, -1.0, 0.0,
+        0.0, -1.0, 0.0,
+        0.0, -1.0, 0.0,
+        0.0, -1.0, 0.0,
+        0.0, -1.0, 0.0,
+        0.0, -1.0, 0.0
+    )
+
+    def __init__(self, position: list[float], angles: list[float], scale: list[float], angular_velocity: list[float], texture_path: str, registry=None, store=None, textures=None, mesh_path: str = None):
         
         '''
         Initializes a new 3D object with specified position, orientation, scale, angular velocity, and texture.
@@ -27,149 +133,158 @@ class Cube:
             scale: Scale factors along the X, Y, and Z axes.
             angular_velocity: Angular velocity for each of the Euler angles.
             texture_path: Path to the texture image file.
+            registry: GeometryRegistry to take the mesh from, defaults to the shared registry.
+            store: TransformStore holding the transform, defaults to the shared store.
+            textures: TextureManager to take the texture from, defaults to the shared manager.
+            mesh_path: Path to an .obj or .glb model drawn instead of the cube, scaled like the cube.
+                Models get simplified levels of detail, see set_lod.
         '''
 
-        # initialize params into object.
-        self.position = np.array(position, dtype=np.float32)
-        self.angles = np.array(angles, dtype=np.float32)
-        self.angular_velocity = np.array(angular_velocity, dtype=np.float32)
-        self.scale = np.array(scale, dtype=np.float32)
+        # initialize params into the transform store, the object keeps its row index.
+        self.store = store or TransformStore.store
+        self.index = self.store.allocate(position, angles, scale, angular_velocity)
         self.texture_path = texture_path
+        self.textures = textures
 
-        # 3D Space: (x, y, z), Texture: (u, v)
-        self.vertices = (
-            # front face
-            -0.5, -0.5, -0.5, 0, 0,
-            0.5, -0.5, -0.5, 1, 0,
-            0.5,  0.5, -0.5, 1, 1,
-            0.5,  0.5, -0.5, 1, 1,
-            -0.5,  0.5, -0.5, 0, 1,
-            -0.5, -0.5, -0.5, 0, 0,
-
-            # back face
-            -0.5, -0.5,  0.5, 1, 0,
-            0.5, -0.5,  0.5, 0, 0,
-            0.5,  0.5,  0.5, 0, 1,
-            0.5,  0.5,  0.5, 0, 1,
-            -0.5,  0.5,  0.5, 1, 1,
-            -0.5, -0.5,  0.5, 1, 0,
-
-            # left face
-            -0.5, -0.5, -0.5, 0, 0,
-            -0.5, -0.5,  0.5, 1, 0,
-            -0.5,  0.5,  0.5, 1, 1,
-            -0.5,  0.5,  0.5, 1, 1,
-            -0.5,  0.5, -0.5, 0, 1,
-            -0.5, -0.5, -0.5, 0, 0,
-
-            # right face
-            0.5, -0.5, -0.5, 1, 0,
-            0.5, -0.5,  0.5, 0, 0,
-            0.5,  0.5,  0.5, 0, 1,
-            0.5,  0.5,  0.5, 0, 1,
-            0.5,  0.5, -0.5, 1, 1,
-            0.5, -0.5, -0.5, 1, 0,
-
-            # top face
-            -0.5, -0.5,  0.5, 0, 1,
-            0.5, -0.5,  0.5, 1, 1,
-            0.5, -0.5, -0.5, 1, 0,
-            0.5, -0.5, -0.5, 1, 0,
-            -0.5, -0.5, -0.5, 0, 0,
-            -0.5, -0.5,  0.5, 0, 1,
-
-            # bottom face
-            -0.5,  0.5,  0.5, 0, 0,
-            0.5,  0.5,  0.5, 1, 0,
-            0.5,  0.5, -0.5, 1, 1,
-            0.5,  0.5, -0.5, 1, 1,
-            -0.5,  0.5, -0.5, 0, 1,
-            -0.5,  0.5,  0.5, 0, 0
-        )
-
-        self.vertex_count = len(self.vertices) // 5
-        self.vertices = np.array(self.vertices, dtype=np.float32)
-
-        # Create VAO and VBOs
-        self.vao = glGenVertexArrays(1)
-        glBindVertexArray(self.vao)
-        self.vbo_vertices = glGenBuffers(1)
-        glBindBuffer(GL_ARRAY_BUFFER, self.vbo_vertices)
-        glBufferData(GL_ARRAY_BUFFER, self.vertices.nbytes,
-                     self.vertices, GL_STATIC_DRAW)
-
-        # Vertex positions
-        glEnableVertexAttribArray(0)
-        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(0))
-
-        # Texture coordinates
-        glEnableVertexAttribArray(1)
-        glVertexAttribPointer(1, 2, GL_FLOAT, GL_FALSE,
-                              20, ctypes.c_void_p(12))
+        # share one uploaded copy of each mesh between all objects using it.
+        registry = registry or Geometry.registry
+        if mesh_path is None:
+            self.lods = [registry.acquire("cube", Cube.build_mesh)]
+        else:
+            self.lods = registry.acquire_lods(mesh_path, lambda: MeshLoader.load_mesh(mesh_path).build_lods())
+            self.store.set_bounds(self.index, *self.lods[0].bounds)
+
+        self.set_lod(0)
 
         self.create_texture()
 
-        # Normals for each face of the cube (nx, ny, nz).
-        self.normals = (
-            # front face
-            0.0, 0.0, -1.0,
-            0.0, 0.0, -1.0,
-            0.0, 0.0, -1.0,
-            0.0, 0.0, -1.0,
-            0.0, 0.0, -1.0,
-            0.0, 0.0, -1.0,
-
-            # back face
-            0.0, 0.0, 1.0,
-            0.0, 0.0, 1.0,
-            0.0, 0.0, 1.0,
-            0.0, 0.0, 1.0,
-            0.0, 0.0, 1.0,
-            0.0, 0.0, 1.0,
-
-            # left face
-            -1.0, 0.0, 0.0,
-            -1.0, 0.0, 0.0,
-            -1.0, 0.0, 0.0,
-            -1.0, 0.0, 0.0,
-            -1.0, 0.0, 0.0,
-            -1.0, 0.0, 0.0,
-
-            # right face
-            1.0, 0.0, 0.0,
-            1.0, 0.0, 0.0,
-            1.0, 0.0, 0.0,
-            1.0, 0.0, 0.0,
-            1.0, 0.0, 0.0,
-            1.0, 0.0, 0.0,
-
-            # top face
-            0.0, 1.0, 0.0,
-            0.0, 1.0, 0.0,
-            0.0, 1.0, 0.0,
-            0.0, 1.0, 0.0,
-            0.0, 1.0, 0.0,
-            0.0, 1.0, 0.0,
-
-            # bottom face
-            0.0, -1.0, 0.0,
-            0.0, -1.0, 0.0,
-            0.0, -1.0, 0.0,
-            0.0, -1.0, 0.0,
-            0.0, -1.0, 0.0,
-            0.0, -1.0, 0.0
-        )
-
-        # Create a VBO for normals
-        self.normals = np.array(self.normals, dtype=np.float32)
-        self.vbo_normals = glGenBuffers(1)
-        glBindBuffer(GL_ARRAY_BUFFER, self.vbo_normals)
-        glBufferData(GL_ARRAY_BUFFER, self.normals.nbytes,
-                     self.normals, GL_STATIC_DRAW)
-
-        # Normals attribute
-        glEnableVertexAttribArray(2)
-        glVertexAttribPointer(2, 3, GL_FLOAT, GL_FALSE, 0, ctypes.c_void_p(0))
+    @staticmethod
+    def create_many(indices: np.ndarray, texture_paths: list, texture_handles: list, mesh,
+                    store=None, textures=None) -> list:
+
+        '''
+        Creates cubes for rows already in the transform store, without per-object GL
+        or texture work. The caller takes the mesh and texture references in bulk.
+
+        Args:
+            indices: Row index of every cube in the store.
+            texture_paths: Texture path of every cube.
+            texture_handles: Acquired texture of every cube.
+            mesh: The acquired MeshHandle shared by the cubes, or the list of
+                its levels of detail, finest first.
+            store: TransformStore holding the rows, defaults to the shared store.
+            textures: TextureManager the textures came from, None for the shared manager.
+
+        Returns:
+            The new cubes.
+        '''
+
+        store = store or TransformStore.store
+        lods = mesh if isinstance(mesh, list) else [mesh]
+
+        cubes = []
+        for index, texture_path, texture in zip(indices.tolist(), texture_paths, texture_handles):
+            cube = Cube.__new__(Cube)
+            cube.store = store
+            cube.index = index
+            cube.texture_path = texture_path
+            cube.textures = textures
+            cube.lods = lods
+            cube.set_lod(0)
+            cube.texture = texture
+            cubes.append(cube)
+
+        return cubes
+
+    @staticmethod
+    def build_mesh() -> Mesh:
+
+        '''
+        Interleaves the cube's positions, texture coordinates and normals and welds
+        the corners that the two triangles of each face share.
+
+        Returns:
+            The indexed Mesh, 24 vertices and 36 indices.
+        '''
+
+        vertices = np.array(Cube.VERTICES, dtype=np.float32).reshape(-1, 5)
+        normals = np.array(Cube.NORMALS, dtype=np.float32).reshape(-1, 3)
+
+        return Mesh(np.hstack((vertices, normals))).weld()
+
+    def set_lod(self, level: int):
+
+        '''
+        Switches the mesh that is drawn to one of the object's levels of detail.
+
+        Args:
+            level: Index into self.lods, 0 being the full mesh.
+        '''
+
+        self.lod = level
+        self.mesh = self.lods[level]
+        self.vao = self.mesh.vao
+        self.vertex_count = self.mesh.vertex_count
+        self.index_count = self.mesh.index_count
+
+    @property
+    def position(self) -> np.ndarray:
+        return self.store.positions[self.index]
+
+    @position.setter
+    def position(self, value):
+        self.store.positions[self.index] = value
+        self.store.mark_dirty(self.index)
+
+    @property
+    def angles(self) -> np.ndarray:
+        return self.store.angles[self.index]
+
+    @angles.setter
+    def angles(self, value):
+        self.store.angles[self.index] = value
+        self.store.mark_dirty(self.index)
+
+    @property
+    def scale(self) -> np.ndarray:
+        return self.store.scales[self.index]
+
+    @scale.setter
+    def scale(self, value):
+        self.store.scales[self.index] = value
+        self.store.mark_dirty(self.index)
+
+    @property
+    def angular_velocity(self) -> np.ndarray:
+        return self.store.angular_velocities[self.index]
+
+    @angular_velocity.setter
+    def angular_velocity(self, value):
+        self.store.angular_velocities[self.index] = value
+        self.store.mark_dirty(self.index)
+
+    def mark_dirty(self):
+
+        '''
+        Flags the cached model matrix as stale after modifying position, angles
+        or scale in place (e.g. cube.position[0] += 1).
+        '''
+
+        self.store.mark_dirty(self.index)
+
+    def release(self):
+
+        '''
+        Gives the object's shared mesh and texture back to their managers and
+        its row back to the transform store.
+        '''
+
+        if self.mesh is not None:
+            for level in self.lods:
+                level.release()
+            self.mesh = None
+            self.texture.release()
+            self.store.free(self.index)
 
     def get_identity_mx(self) -> np.ndarray:
         
@@ -285,49 +400,29 @@ class Cube:
     def create_texture(self):
         
         '''
-        Creates a texture from an image file and sets up texture parameters.
+        Takes a shared handle to the object's texture from the texture manager,
+        the image is only loaded if no other object uses it yet.
         '''
         
-        # Generate a texture ID
-        texture = glGenTextures(1)
-
-        # Bind the texture
-        glBindTexture(GL_TEXTURE_2D, texture)
-
-        # Load image using PIL
-        image = Image.open(self.texture_path)
-        img_data = image.convert("RGBA").tobytes()  # Convert to bytes
-
-        # Set texture parameters
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_REPEAT)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_REPEAT)
-
-        # Set the texture data
-        glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, image.width,
-                     image.height, 0, GL_RGBA, GL_UNSIGNED_BYTE, img_data)
-
-        self.texture = texture
+        self.texture = (self.textures or TextureManager.textures).acquire(self.texture_path)
 
     def use_texture(self):
         '''
         Activate and bind texture.
         '''
         glActiveTexture(GL_TEXTURE0)
-        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glBindTexture(GL_TEXTURE_2D, self.texture.get())
         
-    def tell_shader(self, shader):
-        # call transform function.
-        glUniformMatrix4fv(
-            glGetUniformLocation(
-                shader,
-                "model"
-            ),
-            1,
-            GL_FALSE,
-            self.transform()
-        )
+    def tell_shader(self, shader, model: np.ndarray = None, normal: np.ndarray = None):
+        # call transform function unless the model matrix was computed in a batch.
+        if model is None:
+            model = self.transform()
+        if normal is None:
+            normal = TransformStore.TransformStore.get_normal_mxs(model[None])[0]
+
+        # the program skips the upload if the uniform already holds this matrix.
+        shader.set_uniform("model", model)
+        shader.set_uniform("normalMatrix", normal)
 
     def display(self, shader):
         
@@ -339,14 +434,40 @@ class Cube:
         velocity, facilitating continuous rotation.
         '''
 
-        glBindVertexArray(self.vao)
-        glDrawArrays(GL_TRIANGLES, 0, self.vertex_count)
+        self.update()
+        self.draw(shader, self.transform())
 
-        self.use_texture()
+    def draw(self, shader, model: np.ndarray = None, state=None, normal: np.ndarray = None):
 
-        # update angles according to angular velocity for each axis.
-        self.angles[0] += self.angular_velocity[0]
-        self.angles[1] += self.angular_velocity[1]
-        self.angles[2] += self.angular_velocity[2]
+        '''
+        Renders the object with an already computed model matrix.
+
+        Args:
+            shader: The ShaderProgram in use.
+            model: The object's 4x4 model matrix, None when the shader's model
+                uniform already holds it and the upload can be skipped.
+            state: Optional StateTracker that drops binds of already bound objects.
+            normal: The object's 3x3 normal matrix, computed from model when None.
+        '''
+
+        # all state is set before the draw call that uses it.
+        if state is not None:
+            state.bind_vertex_array(self.vao)
+            state.bind_texture(self.texture.target, self.texture.get())
+        else:
+            glBindVertexArray(self.vao)
+            self.use_texture()
 
-        self.tell_shader(shader)
\ No newline at end of file
+        if model is not None:
+            self.tell_shader(shader, model, normal)
+
+        glDrawElements(GL_TRIANGLES, self.index_count, GL_UNSIGNED_INT, None)
+
+    def update(self):
+
+        '''
+        Advances the object's angles by its angular velocity.
+        '''
+
+        # update angles according to angular velocity for each axis.
+        self.angles += self.angular_velocity
\ No newline at end of file
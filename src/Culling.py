@@ -0,0 +1,359 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import numpy as np
+
+def compute_aabbs(matrices: np.ndarray, local_min: np.ndarray = None, local_max: np.ndarray = None) -> tuple:
+
+    '''
+    Computes world-space axis-aligned bounding boxes of transformed local boxes.
+
+    Args:
+        matrices: (N, 4, 4) model matrices (row-vector convention, translation in the last row).
+        local_min: (3,) or (N, 3) local box minimum, defaults to the unit cube's -0.5.
+        local_max: (3,) or (N, 3) local box maximum, defaults to the unit cube's 0.5.
+
+    Returns:
+        (centers, half_extents), both (N, 3) float32 arrays.
+    '''
+
+    if local_min is None:
+        local_min = np.full(3, -0.5, dtype=np.float32)
+    if local_max is None:
+        local_max = np.full(3, 0.5, dtype=np.float32)
+
+    local_center = (local_min + local_max) * 0.5
+    local_half = (local_max - local_min) * 0.5
+
+    linear = matrices[:, :3, :3]
+    centers = np.einsum("...i,...ij->...j", np.broadcast_to(local_center, (len(matrices), 3)), linear) + matrices[:, 3, :3]
+    half_extents = np.einsum("...i,...ij->...j", np.broadcast_to(local_half, (len(matrices), 3)), np.abs(linear))
+
+    return centers.astype(np.float32), half_extents.astype(np.float32)
+
+def extract_frustum_planes(clip_mx: np.ndarray, rect=(-1.0, 1.0, -1.0, 1.0)) -> np.ndarray:
+
+    '''
+    Extracts the six frustum planes of a view-projection matrix.
+
+    Args:
+        clip_mx: 4x4 matrix mapping row vectors to clip space (clip = v * clip_mx).
+        rect: (left, right, bottom, top) in normalized device coordinates, a smaller
+            rectangle gives the frustum through that part of the screen.
+
+    Returns:
+        A (6, 4) array of normalized planes (a, b, c, d), a point is inside a plane
+        when a * x + b * y + c * z + d >= 0.
+    '''
+
+    left, right, bottom, top = rect
+    columns = np.asarray(clip_mx, dtype=np.float64).T
+    planes = np.array([
+        columns[0] - left * columns[3],  # left
+        right * columns[3] - columns[0],  # right
+        columns[1] - bottom * columns[3],  # bottom
+        top * columns[3] - columns[1],  # top
+        columns[3] + columns[2],  # near
+        columns[3] - columns[2],  # far
+    ])
+
+    return planes / np.linalg.norm(planes[:, :3], axis=1, keepdims=True)
+
+def classify_boxes(planes: np.ndarray, centers: np.ndarray, half_extents: np.ndarray) -> tuple:
+
+    '''
+    Tests boxes against frustum planes.
+
+    Args:
+        planes: (6, 4) frustum planes.
+        centers: (N, 3) box centers.
+        half_extents: (N, 3) box half extents.
+
+    Returns:
+        (outside, inside) boolean arrays, a box neither outside nor inside intersects the frustum.
+    '''
+
+    distances = centers @ planes[:, :3].T + planes[:, 3]
+    radii = half_extents @ np.abs(planes[:, :3]).T
+
+    outside = (distances < -radii).any(axis=1)
+    inside = (distances >= radii).all(axis=1)
+
+    return outside, inside
+
+class BVH:
+
+    '''
+    Bounding volume hierarchy over axis-aligned boxes, built by median splits and
+    refitted incrementally when boxes move.
+    '''
+
+    def __init__(self, leaf_size: int = 8):
+
+        '''
+        Initializes an empty hierarchy.
+
+        Args:
+            leaf_size: Maximum number of boxes per leaf.
+        '''
+
+        self.leaf_size = leaf_size
+        self.clear()
+
+    def clear(self):
+
+        '''
+        Empties the hierarchy.
+        '''
+
+        self.count = 0
+
+        # primitive boxes, indexed by primitive (object row).
+        self.box_min = np.zeros((0, 3), dtype=np.float32)
+        self.box_max = np.zeros((0, 3), dtype=np.float32)
+
+        # primitives sorted so every leaf covers a contiguous range.
+        self.order = np.zeros(0, dtype=np.int64)
+        self.leaf_of = np.zeros(0, dtype=np.int64)
+
+        # nodes in depth-first order.
+        self.node_min = np.zeros((0, 3), dtype=np.float32)
+        self.node_max = np.zeros((0, 3), dtype=np.float32)
+        self.left = np.zeros(0, dtype=np.int64)
+        self.right = np.zeros(0, dtype=np.int64)
+        self.parent = np.zeros(0, dtype=np.int64)
+        self.start = np.zeros(0, dtype=np.int64)
+        self.size = np.zeros(0, dtype=np.int64)
+        self.depth = np.zeros(0, dtype=np.int64)
+
+    def build(self, box_min: np.ndarray, box_max: np.ndarray):
+
+        '''
+        Builds the hierarchy from scratch.
+
+        Args:
+            box_min: (N, 3) box minimums.
+            box_max: (N, 3) box maximums.
+        '''
+
+        # an empty hierarchy has no nodes, not even a root.
+        if len(box_min) == 0:
+            self.clear()
+            return
+
+        self.count = len(box_min)
+        self.box_min = np.array(box_min, dtype=np.float32)
+        self.box_max = np.array(box_max, dtype=np.float32)
+        self.order = np.arange(self.count)
+
+        centers = (self.box_min + self.box_max) * 0.5
+        nodes = []
+
+        # (start, size, parent, depth, is right child) of nodes left to split.
+        stack = [(0, self.count, -1, 0, False)]
+        while stack:
+            start, size, parent, depth, is_right = stack.pop()
+            index = len(nodes)
+            nodes.append([start, size, parent, depth, -1, -1])
+
+            if parent >= 0:
+                nodes[parent][5 if is_right else 4] = index
+
+            if size <= self.leaf_size:
+                continue
+
+            # split at the median along the axis of largest center spread.
+            primitives = self.order[start:start + size]
+            spread = centers[primitives].max(axis=0) - centers[primitives].min(axis=0)
+            axis = int(np.argmax(spread))
+            half = size // 2
+
+            partition = np.argpartition(centers[primitives, axis], half)
+            self.order[start:start + size] = primitives[partition]
+
+            # the left child is pushed last so nodes are numbered depth first.
+            stack.append((start + half, size - half, index, depth + 1, True))
+            stack.append((start, half, index, depth + 1, False))
+
+        nodes = np.array(nodes, dtype=np.int64).reshape(-1, 6)
+        self.start, self.size, self.parent, self.depth, self.left, self.right = nodes.T.copy()
+
+        leaves = np.flatnonzero(self.left < 0)
+        self.leaf_of = np.zeros(self.count, dtype=np.int64)
+        self.leaf_of[self.get_primitives(leaves)[0]] = np.repeat(leaves, self.size[leaves])
+
+        self.node_min = np.zeros((len(nodes), 3), dtype=np.float32)
+        self.node_max = np.zeros((len(nodes), 3), dtype=np.float32)
+        self.refit_nodes(np.ones(len(nodes), dtype=bool))
+
+    def get_primitives(self, nodes: np.ndarray) -> tuple:
+
+        '''
+        Concatenates the primitive ranges of several nodes.
+
+        Args:
+            nodes: Node indices.
+
+        Returns:
+            (primitives, offsets), offsets being where each node's range starts.
+        '''
+
+        sizes = self.size[nodes]
+        offsets = np.concatenate(([0], np.cumsum(sizes)[:-1]))
+        positions = np.repeat(self.start[nodes] - offsets, sizes) + np.arange(sizes.sum())
+
+        return self.order[positions], offsets
+
+    def refit(self, moved: np.ndarray, box_min: np.ndarray, box_max: np.ndarray):
+
+        '''
+        Updates moved boxes and refits only the nodes above them.
+
+        Args:
+            moved: Indices of the boxes that changed.
+            box_min: (len(moved), 3) new box minimums.
+            box_max: (len(moved), 3) new box maximums.
+        '''
+
+        if len(moved) == 0:
+            return
+
+        self.box_min[moved] = box_min
+        self.box_max[moved] = box_max
+
+        dirty = np.zeros(len(self.start), dtype=bool)
+        dirty[self.leaf_of[moved]] = True
+        self.refit_nodes(dirty)
+
+    def refit_nodes(self, dirty: np.ndarray):
+
+        '''
+        Recomputes the bounds of dirty nodes and their ancestors, deepest level first.
+
+        Args:
+            dirty: (nodes,) flags of nodes whose bounds are stale.
+        '''
+
+        for depth in range(int(self.depth.max()), -1, -1):
+            nodes = np.flatnonzero(dirty & (self.depth == depth))
+            if len(nodes) == 0:
+                continue
+
+            leaves = nodes[self.left[nodes] < 0]
+            if len(leaves):
+                primitives, offsets = self.get_primitives(leaves)
+                self.node_min[leaves] = np.minimum.reduceat(self.box_min[primitives], offsets)
+                self.node_max[leaves] = np.maximum.reduceat(self.box_max[primitives], offsets)
+
+            inner = nodes[self.left[nodes] >= 0]
+            self.node_min[inner] = np.minimum(self.node_min[self.left[inner]], self.node_min[self.right[inner]])
+            self.node_max[inner] = np.maximum(self.node_max[self.left[inner]], self.node_max[self.right[inner]])
+
+            parents = self.parent[nodes]
+            dirty[parents[parents >= 0]] = True
+
+    def query(self, planes: np.ndarray) -> np.ndarray:
+
+        '''
+        Finds the boxes inside or intersecting a frustum, one tree level at a time.
+
+        Args:
+            planes: (6, 4) frustum planes.
+
+        Returns:
+            (N,) boolean visibility flags.
+        '''
+
+        visible = np.zeros(self.count, dtype=bool)
+        if self.count == 0:
+            return visible
+
+        frontier = np.zeros(1, dtype=np.int64)
+        while len(frontier):
+            centers = (self.node_min[frontier] + self.node_max[frontier]) * 0.5
+            half_extents = (self.node_max[frontier] - self.node_min[frontier]) * 0.5
+            outside, inside = classify_boxes(planes, centers, half_extents)
+
+            # nodes fully inside accept their whole primitive range without further tests.
+            leaves = self.left[frontier] < 0
+            accepted = frontier[inside]
+            tested = frontier[~outside & ~inside & leaves]
+
+            if len(accepted):
+                visible[self.get_primitives(accepted)[0]] = True
+
+            if len(tested):
+                primitives, _ = self.get_primitives(tested)
+                centers = (self.box_min[primitives] + self.box_max[primitives]) * 0.5
+                half_extents = (self.box_max[primitives] - self.box_min[primitives]) * 0.5
+                outside_primitives, _ = classify_boxes(planes, centers, half_extents)
+                visible[primitives[~outside_primitives]] = True
+
+            descend = frontier[~outside & ~inside & ~leaves]
+            frontier = np.concatenate((self.left[descend], self.right[descend]))
+
+        return visible
+
+class FrustumCuller:
+
+    '''
+    Keeps a BVH over the bounding boxes of all objects in a transform store and
+    selects the objects visible to the camera each frame.
+    '''
+
+    def __init__(self, leaf_size: int = 8):
+
+        '''
+        Initializes the culler.
+
+        Args:
+            leaf_size: Maximum number of boxes per BVH leaf.
+        '''
+
+        self.bvh = BVH(leaf_size)
+
+        # statistics of the last cull.
+        self.visible_count = 0
+        self.total_count = 0
+
+    def cull(self, matrices: np.ndarray, changed: np.ndarray, clip_mx: np.ndarray,
+             local_min: np.ndarray = None, local_max: np.ndarray = None) -> np.ndarray:
+
+        '''
+        Updates the hierarchy and returns the objects inside the view frustum.
+
+        Args:
+            matrices: (N, 4, 4) model matrices of the transform store.
+            changed: (N,) flags of matrices that changed this frame.
+            clip_mx: The camera's view-projection matrix.
+            local_min: (N, 3) local box minimums of the objects' meshes, the unit cube when None.
+            local_max: (N, 3) local box maximums of the objects' meshes, the unit cube when None.
+
+        Returns:
+            (N,) boolean visibility flags, indexed like the transform store.
+        '''
+
+        if len(matrices) != self.bvh.count:
+            centers, half_extents = compute_aabbs(matrices, local_min, local_max)
+            self.bvh.build(centers - half_extents, centers + half_extents)
+        else:
+            moved = np.flatnonzero(changed[:len(matrices)])
+            if len(moved):
+                centers, half_extents = compute_aabbs(
+                    matrices[moved],
+                    None if local_min is None else local_min[moved],
+                    None if local_max is None else local_max[moved]
+                )
+                self.bvh.refit(moved, centers - half_extents, centers + half_extents)
+
+        visible = self.bvh.query(extract_frustum_planes(clip_mx))
+
+        self.visible_count = int(visible.sum())
+        self.total_count = len(visible)
+
+        return visible
@@ -0,0 +1,122 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import os
+import sys
+import ctypes
+import numpy as np
+import OpenGL
+
+# the GL layer every module imports with "from GLBackend import *" instead of OpenGL.GL.
+# release (default): PyOpenGL's per-call error checking and logging are off and the hot
+# calls go straight to the driver through ctypes; debug: full PyOpenGL checking.
+# PyOpenGL builds its functions with the flags set when OpenGL.GL is imported, so this
+# module has to be imported (after Headless) before anything else imports OpenGL.GL.
+MODE = os.environ.get("DIGITAL_MUSEUM_GL", "release")
+if MODE not in ("release", "debug"):
+    raise ValueError(f"DIGITAL_MUSEUM_GL must be release or debug, not {MODE}")
+
+DEBUG = MODE == "debug"
+
+if "OpenGL.GL" in sys.modules:
+    raise RuntimeError("OpenGL.GL was imported before GLBackend, import GLBackend first")
+
+# PyOpenGL's EGL bindings do not import with error checking off, on the EGL platform
+# they are imported (as Headless does) before the flags change.
+if os.environ.get("PYOPENGL_PLATFORM") == "egl":
+    import OpenGL.EGL
+
+# OpenGL.platform copies the flags on its first import, so the copy is set as well.
+for _flag in ("ERROR_CHECKING", "ERROR_LOGGING"):
+    setattr(OpenGL, _flag, DEBUG)
+    if "OpenGL._configflags" in sys.modules:
+        setattr(sys.modules["OpenGL._configflags"], _flag, DEBUG)
+
+import OpenGL.GL
+from OpenGL import platform
+from OpenGL.GL import *
+
+class ArrayPointer:
+
+    '''
+    ctypes argument type passing a NumPy array by its data pointer, without the copies
+    and type checks of PyOpenGL. The caller makes sure the dtype and layout are right.
+    '''
+
+    @staticmethod
+    def from_param(value):
+        if isinstance(value, np.ndarray):
+            try:
+                # a ctypes view of the array's memory, cheaper than going through value.ctypes.
+                return ctypes.byref(ctypes.c_char.from_buffer(value))
+            except (TypeError, ValueError):
+                # read-only or empty arrays.
+                return ctypes.c_void_p(value.ctypes.data)
+        return value
+
+# signatures of the calls made per object or per group every frame.
+HOT_FUNCTIONS = {
+    "glUseProgram": (ctypes.c_uint,),
+    "glBindVertexArray": (ctypes.c_uint,),
+    "glBindTexture": (ctypes.c_uint, ctypes.c_uint),
+    "glActiveTexture": (ctypes.c_uint,),
+    "glBindBuffer": (ctypes.c_uint, ctypes.c_uint),
+    "glDrawArrays": (ctypes.c_uint, ctypes.c_int, ctypes.c_int),
+    "glDrawElements": (ctypes.c_uint, ctypes.c_int, ctypes.c_uint, ctypes.c_void_p),
+    "glDrawElementsInstanced": (ctypes.c_uint, ctypes.c_int, ctypes.c_uint, ctypes.c_void_p, ctypes.c_int),
+    "glEnableVertexAttribArray": (ctypes.c_uint,),
+    "glVertexAttribPointer": (ctypes.c_uint, ctypes.c_int, ctypes.c_uint, ctypes.c_ubyte, ctypes.c_int,
+                              ctypes.c_void_p),
+    "glVertexAttribDivisor": (ctypes.c_uint, ctypes.c_uint),
+    "glUniform1i": (ctypes.c_int, ctypes.c_int),
+    "glUniform1f": (ctypes.c_int, ctypes.c_float),
+    "glUniform2fv": (ctypes.c_int, ctypes.c_int, ArrayPointer),
+    "glUniform3fv": (ctypes.c_int, ctypes.c_int, ArrayPointer),
+    "glUniform4fv": (ctypes.c_int, ctypes.c_int, ArrayPointer),
+    "glUniform3iv": (ctypes.c_int, ctypes.c_int, ArrayPointer),
+    "glUniformMatrix3fv": (ctypes.c_int, ctypes.c_int, ctypes.c_ubyte, ArrayPointer),
+    "glUniformMatrix4fv": (ctypes.c_int, ctypes.c_int, ctypes.c_ubyte, ArrayPointer),
+}
+
+def bind_function(name: str, argtypes: tuple):
+
+    '''
+    Binds a GL entry point exported by the platform's GL library as a ctypes function.
+
+    Args:
+        name: The GL function name.
+        argtypes: The ctypes types of its arguments.
+
+    Returns:
+        The ctypes function, or None if the library does not export it.
+    '''
+
+    try:
+        address = ctypes.cast(getattr(platform.PLATFORM.GL, name), ctypes.c_void_p).value
+    except AttributeError:
+        return None
+
+    function = ctypes.CFUNCTYPE(None, *argtypes)(address)
+    function.__name__ = name
+
+    return function
+
+# the PyOpenGL functions and their ctypes fast paths, for comparisons.
+wrapped = {name: getattr(OpenGL.GL, name) for name in HOT_FUNCTIONS}
+fast = {}
+for _name, _argtypes in HOT_FUNCTIONS.items():
+    _function = bind_function(_name, _argtypes)
+    if _function is not None:
+        fast[_name] = _function
+
+# release mode replaces the hot calls, functions the library does not export stay PyOpenGL's.
+if not DEBUG:
+    globals().update(fast)
+
+# everything OpenGL.GL exports, with the hot calls of the current mode.
+__all__ = [name for name in vars(OpenGL.GL) if not name.startswith("_")]
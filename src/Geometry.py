@@ -0,0 +1,217 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+from GLBackend import *
+from Mesh import Mesh
+
+class MeshHandle:
+
+    '''
+    Shared handle to a mesh that has been uploaded to the GPU by a GeometryRegistry.
+    '''
+
+    def __init__(self, registry, key, vao: int, vbo: int, ebo: int, mesh: Mesh):
+
+        '''
+        Initializes a handle for an uploaded mesh.
+
+        Args:
+            registry: The GeometryRegistry that owns the GPU buffers.
+            key: The key the mesh was registered under.
+            vao: The vertex array object describing the mesh layout.
+            vbo: The interleaved vertex buffer (position, uv, normal).
+            ebo: The index buffer, bound to the vertex array.
+            mesh: The uploaded Mesh, kept for CPU-side baking such as static batching.
+        '''
+
+        self.registry = registry
+        self.key = key
+        self.vao = vao
+        self.vbo = vbo
+        self.ebo = ebo
+        self.vertices = mesh.vertices
+        self.indices = mesh.indices
+        self.vertex_count = mesh.vertex_count
+        self.index_count = mesh.index_count
+        self.bounds = mesh.bounds
+        self.ref_count = 0
+
+    def release(self):
+
+        '''
+        Gives this reference back to the registry.
+        '''
+
+        self.registry.release(self)
+
+class GeometryRegistry:
+
+    '''
+    Uploads each unique mesh once and hands out shared, reference-counted handles to it.
+    '''
+
+    # interleaved layout: (x, y, z, u, v, nx, ny, nz)
+    FLOATS_PER_VERTEX = 8
+    STRIDE = FLOATS_PER_VERTEX * 4
+
+    def __init__(self):
+
+        '''
+        Initializes an empty registry and its upload counters.
+        '''
+
+        self.meshes = {}
+
+        # number of levels of detail of meshes acquired through acquire_lods.
+        self.level_counts = {}
+
+        # counters.
+        self.buffers_allocated = 0
+        self.vertex_arrays_allocated = 0
+        self.bytes_uploaded = 0
+
+    def acquire(self, key, build, references: int = 1) -> MeshHandle:
+
+        '''
+        Returns a handle to the mesh registered under key, uploading it on first use.
+
+        Args:
+            key: Hashable identifier of the mesh (e.g. "cube" or a model path).
+            build: Callable returning the Mesh, only called on first use.
+            references: Number of references to take at once, for batched loading.
+
+        Returns:
+            The shared MeshHandle, with its reference count incremented.
+        '''
+
+        handle = self.meshes.get(key)
+        if handle is None:
+            handle = self.upload(key, build())
+            self.meshes[key] = handle
+
+        handle.ref_count += references
+        return handle
+
+    def acquire_lods(self, key, build, references: int = 1) -> list:
+
+        '''
+        Returns handles to every level of detail of a mesh, uploading them on first use.
+        The finest level is registered under key, so acquire(key) shares it.
+
+        Args:
+            key: Hashable identifier of the mesh.
+            build: Callable returning the list of level Meshes, finest first, only
+                called on first use.
+            references: Number of references to take at once, for batched loading.
+
+        Returns:
+            The shared MeshHandles, finest first, each with its reference count incremented.
+        '''
+
+        keys = [key] + [(key, level) for level in range(1, self.level_counts.get(key, 0))]
+        if key not in self.level_counts or any(level_key not in self.meshes for level_key in keys):
+            levels = build()
+            keys = [key] + [(key, level) for level in range(1, len(levels))]
+            for level_key, mesh in zip(keys, levels):
+                if level_key not in self.meshes:
+                    self.meshes[level_key] = self.upload(level_key, mesh)
+
+            self.level_counts[key] = len(levels)
+
+        handles = [self.meshes[level_key] for level_key in keys]
+        for handle in handles:
+            handle.ref_count += references
+
+        return handles
+
+    def upload(self, key, mesh) -> MeshHandle:
+
+        '''
+        Creates the VAO, interleaved VBO and index buffer for a mesh.
+
+        Args:
+            key: Identifier of the mesh.
+            mesh: The Mesh, or interleaved vertex data with FLOATS_PER_VERTEX floats
+                per vertex that is drawn in order.
+
+        Returns:
+            A new MeshHandle with a reference count of zero.
+        '''
+
+        if not isinstance(mesh, Mesh):
+            mesh = Mesh(mesh)
+
+        vao = glGenVertexArrays(1)
+        glBindVertexArray(vao)
+        vbo = glGenBuffers(1)
+        glBindBuffer(GL_ARRAY_BUFFER, vbo)
+        glBufferData(GL_ARRAY_BUFFER, mesh.vertices.nbytes, mesh.vertices, GL_STATIC_DRAW)
+
+        # the element buffer binding is part of the vertex array.
+        ebo = glGenBuffers(1)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, ebo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, mesh.indices.nbytes, mesh.indices, GL_STATIC_DRAW)
+
+        # Vertex positions
+        glEnableVertexAttribArray(0)
+        glVertexAttribPointer(0, 3, GL_FLOAT, GL_FALSE, self.STRIDE, ctypes.c_void_p(0))
+
+        # Texture coordinates
+        glEnableVertexAttribArray(1)
+        glVertexAttribPointer(1, 2, GL_FLOAT, GL_FALSE, self.STRIDE, ctypes.c_void_p(12))
+
+        # Normals
+        glEnableVertexAttribArray(2)
+        glVertexAttribPointer(2, 3, GL_FLOAT, GL_FALSE, self.STRIDE, ctypes.c_void_p(20))
+
+        self.vertex_arrays_allocated += 1
+        self.buffers_allocated += 2
+        self.bytes_uploaded += mesh.vertices.nbytes + mesh.indices.nbytes
+
+        return MeshHandle(self, key, vao, vbo, ebo, mesh)
+
+    def release(self, handle: MeshHandle):
+
+        '''
+        Drops one reference to a mesh and frees its GPU buffers when none remain.
+        Releasing a handle whose mesh was already freed does nothing.
+
+        Args:
+            handle: The handle previously returned by acquire.
+        '''
+
+        # the key may have been acquired again since, under a new handle.
+        if handle.ref_count <= 0 or self.meshes.get(handle.key) is not handle:
+            return
+
+        handle.ref_count -= 1
+        if handle.ref_count > 0:
+            return
+
+        del self.meshes[handle.key]
+        glDeleteBuffers(2, [handle.vbo, handle.ebo])
+        glDeleteVertexArrays(1, [handle.vao])
+
+    def stats(self) -> dict:
+
+        '''
+        Returns the registry counters.
+
+        Returns:
+            A dict with the number of live meshes, allocated buffers and uploaded bytes.
+        '''
+
+        return {
+            "meshes": len(self.meshes),
+            "buffers_allocated": self.buffers_allocated,
+            "vertex_arrays_allocated": self.vertex_arrays_allocated,
+            "bytes_uploaded": self.bytes_uploaded,
+        }
+
+# registry shared by all primitives.
+registry = GeometryRegistry()
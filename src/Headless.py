@@ -0,0 +1,184 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import os
+
+# PyOpenGL resolves GL entry points through the platform chosen on its first import,
+# so this module has to be imported before anything else imports OpenGL, GLBackend included.
+os.environ.setdefault("PYOPENGL_PLATFORM", "egl")
+
+import ctypes
+import numpy as np
+from OpenGL import EGL, platform
+from GLBackend import *
+
+# EGL_MESA_platform_surfaceless, a display that needs neither a GPU device nor a window system.
+EGL_PLATFORM_SURFACELESS_MESA = 0x31DD
+
+class OffscreenContext:
+
+    '''
+    An OpenGL 3.3 core context without a window, created through EGL, rendering into
+    a framebuffer object. Works on machines without a display or GPU through Mesa's
+    llvmpipe software rasterizer.
+    '''
+
+    def __init__(self, width: int = 800, height: int = 600):
+
+        '''
+        Creates the context, makes it current and binds a framebuffer of the given size.
+
+        Args:
+            width: Framebuffer width in pixels.
+            height: Framebuffer height in pixels.
+        '''
+
+        if type(platform.PLATFORM).__name__ != "EGLPlatform":
+            raise RuntimeError("headless rendering needs PYOPENGL_PLATFORM=egl, import Headless before OpenGL")
+
+        self.width = width
+        self.height = height
+
+        self.display = self.get_display()
+        self.config = self.choose_config()
+
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        context_attributes = self.get_attributes(
+            EGL.EGL_CONTEXT_MAJOR_VERSION, 3,
+            EGL.EGL_CONTEXT_MINOR_VERSION, 3,
+            EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT
+        )
+        self.context = EGL.eglCreateContext(self.display, self.config, EGL.EGL_NO_CONTEXT, context_attributes)
+        if not self.context:
+            raise RuntimeError("could not create an OpenGL 3.3 core context through EGL")
+
+        # a small pbuffer keeps drivers without surfaceless contexts happy, drawing goes to the framebuffer.
+        self.surface = EGL.eglCreatePbufferSurface(
+            self.display, self.config, self.get_attributes(EGL.EGL_WIDTH, 1, EGL.EGL_HEIGHT, 1)
+        )
+        if not EGL.eglMakeCurrent(self.display, self.surface, self.surface, self.context):
+            raise RuntimeError("could not make the EGL context current")
+
+        self.create_framebuffer()
+
+    @staticmethod
+    def get_attributes(*attributes) -> ctypes.Array:
+
+        '''
+        Returns an EGL_NONE terminated attribute list.
+        '''
+
+        return (EGL.EGLint * (len(attributes) + 1))(*attributes, EGL.EGL_NONE)
+
+    @staticmethod
+    def get_display():
+
+        '''
+        Returns an initialized EGL display, the default one if it works and Mesa's
+        surfaceless platform otherwise.
+        '''
+
+        major, minor = EGL.EGLint(), EGL.EGLint()
+
+        display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        try:
+            if display and EGL.eglInitialize(display, ctypes.pointer(major), ctypes.pointer(minor)):
+                return display
+        except EGL.EGLError:
+            pass
+
+        from OpenGL.EGL.EXT.platform_base import eglGetPlatformDisplayEXT
+
+        display = eglGetPlatformDisplayEXT(EGL_PLATFORM_SURFACELESS_MESA, EGL.EGL_DEFAULT_DISPLAY, None)
+        if not display or not EGL.eglInitialize(display, ctypes.pointer(major), ctypes.pointer(minor)):
+            raise RuntimeError("no EGL display available")
+
+        return display
+
+    def choose_config(self):
+
+        '''
+        Returns an EGL config supporting desktop OpenGL and pbuffers.
+        '''
+
+        attributes = self.get_attributes(
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+            EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_RED_SIZE, 8,
+            EGL.EGL_GREEN_SIZE, 8,
+            EGL.EGL_BLUE_SIZE, 8,
+            EGL.EGL_DEPTH_SIZE, 24
+        )
+
+        config = EGL.EGLConfig()
+        count = EGL.EGLint()
+        if not EGL.eglChooseConfig(self.display, attributes, ctypes.pointer(config), 1, ctypes.pointer(count)) \
+                or count.value == 0:
+            raise RuntimeError("no EGL config supports desktop OpenGL")
+
+        return config
+
+    def create_framebuffer(self):
+
+        '''
+        Creates and binds a framebuffer with color and depth renderbuffers.
+        '''
+
+        self.color_buffer, self.depth_buffer = glGenRenderbuffers(2)
+
+        glBindRenderbuffer(GL_RENDERBUFFER, self.color_buffer)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_RGBA8, self.width, self.height)
+
+        glBindRenderbuffer(GL_RENDERBUFFER, self.depth_buffer)
+        glRenderbufferStorage(GL_RENDERBUFFER, GL_DEPTH_COMPONENT24, self.width, self.height)
+
+        self.framebuffer = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.framebuffer)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_RENDERBUFFER, self.color_buffer)
+        glFramebufferRenderbuffer(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_RENDERBUFFER, self.depth_buffer)
+
+        if glCheckFramebufferStatus(GL_FRAMEBUFFER) != GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError("offscreen framebuffer is incomplete")
+
+        glViewport(0, 0, self.width, self.height)
+
+    def get_renderer(self) -> str:
+
+        '''
+        Returns the GL renderer and version strings.
+        '''
+
+        return f"{glGetString(GL_RENDERER).decode()} / {glGetString(GL_VERSION).decode()}"
+
+    def read_pixels(self) -> np.ndarray:
+
+        '''
+        Reads back the framebuffer.
+
+        Returns:
+            A (height, width, 4) uint8 array, the bottom row first.
+        '''
+
+        glBindFramebuffer(GL_READ_FRAMEBUFFER, self.framebuffer)
+        pixels = glReadPixels(0, 0, self.width, self.height, GL_RGBA, GL_UNSIGNED_BYTE)
+
+        return np.frombuffer(pixels, dtype=np.uint8).reshape(self.height, self.width, 4)
+
+    def release(self):
+
+        '''
+        Deletes the framebuffer and destroys the EGL context.
+        '''
+
+        glDeleteFramebuffers(1, [self.framebuffer])
+        glDeleteRenderbuffers(2, [self.color_buffer, self.depth_buffer])
+
+        EGL.eglMakeCurrent(self.display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+        EGL.eglDestroySurface(self.display, self.surface)
+        EGL.eglDestroyContext(self.display, self.context)
+        EGL.eglTerminate(self.display)
@@ -0,0 +1,386 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+from GLBackend import *
+import numpy as np
+from Culling import extract_frustum_planes
+from Geometry import GeometryRegistry
+from InstancedRenderer import InstancedRenderer
+
+# planes every box is inside of, for drawing without culling.
+NO_PLANES = np.tile(np.array([0, 0, 0, 1], dtype=np.float32), (6, 1))
+
+# command index of rows that are not drawn.
+NO_COMMAND = 0xffffffff
+
+def supports_gpu_driven() -> bool:
+
+    '''
+    Returns True if the context has compute shaders, storage buffers and
+    glMultiDrawElementsIndirect, core since OpenGL 4.3.
+    '''
+
+    return (glGetIntegerv(GL_MAJOR_VERSION), glGetIntegerv(GL_MINOR_VERSION)) >= (4, 3)
+
+class IndirectRenderer:
+
+    '''
+    Draws the scene GPU-driven: the transforms and bounds of all objects live in
+    shader storage buffers, a compute shader culls them against the view frustum
+    and appends the visible ones to the instances of their DrawElementsIndirectCommand,
+    and each texture (the whole scene with an atlas) is drawn with one
+    glMultiDrawElementsIndirect call. The Python work per frame does not depend
+    on the number of objects.
+    '''
+
+    # storage buffer bindings of shaders/cull.glsl.
+    TRANSFORMS, BOUNDS, OBJECT_COMMANDS, COMMANDS, INSTANCES, VISIBILITY, REGIONS, INSTANCE_REGIONS = range(8)
+
+    # threads per work group of shaders/cull.glsl.
+    WORK_GROUP_SIZE = 64
+
+    # DrawElementsIndirectCommand: count, instanceCount, firstIndex, baseVertex, baseInstance.
+    COMMAND_SIZE = 20
+
+    def __init__(self, program, atlas: bool = False, culling: bool = True):
+
+        '''
+        Initializes the renderer, the buffers are created with the first frame.
+
+        Args:
+            program: The ShaderProgram of shaders/cull.glsl, with ATLAS when drawing from an atlas.
+            atlas: Objects are drawn from atlas regions, one call for the whole scene.
+            culling: Cull against the view frustum, otherwise every object is drawn.
+        '''
+
+        self.program = program
+        self.atlas = atlas
+        self.culling = culling
+        self.dirty = True
+
+        self.vao = None
+        self.vbo = None
+        self.ebo = None
+        self.buffers = {}
+
+        # per draw call: (texture, first command, command count).
+        self.draws = []
+
+        # commands with zero instances, uploaded before every culling pass.
+        self.commands = np.zeros((0, 5), dtype=np.uint32)
+        self.object_count = 0
+
+        # statistics.
+        self.draw_calls = 0
+        self.transform_uploads = 0
+
+    def invalidate(self):
+
+        '''
+        Marks the buffers as stale, e.g. after objects were added to the scene.
+        '''
+
+        self.dirty = True
+
+    def create_buffer(self, binding: int, data: np.ndarray):
+
+        '''
+        Replaces the contents of a storage buffer, creating it on first use.
+
+        Args:
+            binding: The buffer's binding point in shaders/cull.glsl.
+            data: The new contents.
+        '''
+
+        if binding not in self.buffers:
+            self.buffers[binding] = glGenBuffers(1)
+
+        # empty buffers cannot be bound, keep a few bytes.
+        data = np.ascontiguousarray(data)
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.buffers[binding])
+        glBufferData(GL_SHADER_STORAGE_BUFFER, max(data.nbytes, 16), data if data.nbytes else None, GL_DYNAMIC_DRAW)
+
+    def build(self, objects: list, transforms):
+
+        '''
+        Merges the meshes of all objects into one vertex and index buffer, creates
+        one draw command per (mesh, texture) and uploads the per-object buffers.
+
+        Args:
+            objects: The scene's render list.
+            transforms: The scene's TransformStore.
+        '''
+
+        # one copy of every mesh in the shared buffers.
+        meshes = {}
+        vertices = []
+        indices = []
+        vertex_count = 0
+        index_count = 0
+        for obj in objects:
+            if id(obj.mesh) not in meshes:
+                meshes[id(obj.mesh)] = (index_count, vertex_count)
+                vertices.append(obj.mesh.vertices)
+                indices.append(obj.mesh.indices)
+                vertex_count += obj.mesh.vertex_count
+                index_count += obj.mesh.index_count
+
+        # commands sorted by texture so each texture's commands are drawn with one call.
+        groups = {}
+        texture_order = {}
+        for obj in objects:
+            texture = texture_order.setdefault(id(obj.texture.source), len(texture_order))
+            groups.setdefault((texture, meshes[id(obj.mesh)]), []).append(obj)
+
+        count = transforms.count
+        object_commands = np.full(count, NO_COMMAND, dtype=np.uint32)
+        regions = np.zeros((count, 5), dtype=np.float32)
+        commands = []
+        self.draws = []
+        base_instance = 0
+        for command, key in enumerate(sorted(groups)):
+            members = groups[key]
+            first_index, base_vertex = key[1]
+            commands.append((members[0].mesh.index_count, 0, first_index, base_vertex, base_instance))
+            base_instance += len(members)
+
+            rows = np.array([obj.index for obj in members], dtype=np.int64)
+            object_commands[rows] = command
+
+            texture = members[0].texture
+            if texture.source is not texture:
+                regions[rows] = [obj.texture.rect + (obj.texture.layer,) for obj in members]
+
+            if self.draws and self.draws[-1][0].source is texture.source:
+                self.draws[-1] = (self.draws[-1][0], self.draws[-1][1], self.draws[-1][2] + 1)
+            else:
+                self.draws.append((texture, command, 1))
+
+        self.commands = np.array(commands, dtype=np.uint32).reshape(-1, 5)
+        self.object_count = count
+
+        self.create_buffer(self.BOUNDS, np.hstack((transforms.bounds_min[:count], transforms.bounds_max[:count]))
+                           .astype(np.float32))
+        self.create_buffer(self.OBJECT_COMMANDS, object_commands)
+        self.create_buffer(self.COMMANDS, self.commands)
+        self.create_buffer(self.TRANSFORMS, np.zeros((count, InstancedRenderer.FLOATS_PER_INSTANCE), dtype=np.float32))
+        self.create_buffer(self.INSTANCES, np.zeros((base_instance, InstancedRenderer.FLOATS_PER_INSTANCE),
+                                                    dtype=np.float32))
+        self.create_buffer(self.VISIBILITY, np.zeros(count, dtype=np.uint32))
+        if self.atlas:
+            self.create_buffer(self.REGIONS, regions)
+            self.create_buffer(self.INSTANCE_REGIONS, np.zeros((base_instance, 5), dtype=np.float32))
+
+        self.create_vertex_array(
+            np.concatenate(vertices).astype(np.float32) if vertices else np.zeros((0, 8), dtype=np.float32),
+            np.concatenate(indices).astype(np.uint32) if indices else np.zeros(0, dtype=np.uint32)
+        )
+
+        self.dirty = False
+
+    def create_vertex_array(self, vertices: np.ndarray, indices: np.ndarray):
+
+        '''
+        Uploads the merged meshes and describes them together with the culled
+        instances, with the attribute locations of the instanced vertex shader.
+
+        Args:
+            vertices: The merged (x, y, z, u, v, nx, ny, nz) vertices.
+            indices: The merged indices, relative to each mesh's first vertex.
+        '''
+
+        if self.vao is None:
+            self.vao = glGenVertexArrays(1)
+            self.vbo = glGenBuffers(1)
+            self.ebo = glGenBuffers(1)
+
+        glBindVertexArray(self.vao)
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBufferData(GL_ARRAY_BUFFER, max(vertices.nbytes, 16), vertices if vertices.nbytes else None, GL_STATIC_DRAW)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+        glBufferData(GL_ELEMENT_ARRAY_BUFFER, max(indices.nbytes, 16), indices if indices.nbytes else None,
+                     GL_STATIC_DRAW)
+
+        stride = GeometryRegistry.FLOATS_PER_VERTEX * 4
+        for location, size, offset in ((0, 3, 0), (1, 2, 12), (2, 3, 20)):
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(offset))
+
+        # the culling writes the instances, each command's baseInstance selects its range.
+        glBindBuffer(GL_ARRAY_BUFFER, self.buffers[self.INSTANCES])
+        stride = InstancedRenderer.FLOATS_PER_INSTANCE * 4
+        for column in range(4):
+            location = InstancedRenderer.MODEL_LOCATION + column
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, 4, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(column * 16))
+            glVertexAttribDivisor(location, 1)
+
+        for column in range(3):
+            location = InstancedRenderer.NORMAL_LOCATION + column
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(64 + column * 12))
+            glVertexAttribDivisor(location, 1)
+
+        if self.atlas:
+            glBindBuffer(GL_ARRAY_BUFFER, self.buffers[self.INSTANCE_REGIONS])
+            location = InstancedRenderer.REGION_LOCATION
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, 4, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(0))
+            glVertexAttribDivisor(location, 1)
+
+            glEnableVertexAttribArray(location + 1)
+            glVertexAttribPointer(location + 1, 1, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(16))
+            glVertexAttribDivisor(location + 1, 1)
+
+    def upload_transforms(self, matrices: np.ndarray, normals: np.ndarray, changed: np.ndarray):
+
+        '''
+        Uploads the rows from the first to the last changed one, all rows after a rebuild.
+
+        Args:
+            matrices: The (N, 4, 4) model matrices of the transform store.
+            normals: The (N, 3, 3) normal matrices of the transform store.
+            changed: Per-row flags of matrices recomputed this frame.
+        '''
+
+        moved = np.flatnonzero(changed[:self.object_count])
+        if len(moved) == 0:
+            return
+
+        first, end = int(moved[0]), int(moved[-1]) + 1
+        data = np.empty((end - first, InstancedRenderer.FLOATS_PER_INSTANCE), dtype=np.float32)
+        data[:, :16] = matrices[first:end].reshape(-1, 16)
+        data[:, 16:] = normals[first:end].reshape(-1, 9)
+
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.buffers[self.TRANSFORMS])
+        glBufferSubData(GL_SHADER_STORAGE_BUFFER, first * data.itemsize * data.shape[1], data.nbytes, data)
+        self.transform_uploads += 1
+
+    def cull(self, clip_mx: np.ndarray):
+
+        '''
+        Runs the culling pass, filling the draw commands and instances.
+
+        Args:
+            clip_mx: The camera's view-projection matrix.
+        '''
+
+        # every frame starts from commands without instances.
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.buffers[self.COMMANDS])
+        glBufferSubData(GL_SHADER_STORAGE_BUFFER, 0, self.commands.nbytes, self.commands)
+
+        self.program.use()
+        planes = extract_frustum_planes(clip_mx) if self.culling else NO_PLANES
+        self.program.set_uniform("planes", planes)
+        self.program.set_uniform("objectCount", self.object_count)
+
+        for binding, buffer in self.buffers.items():
+            glBindBufferBase(GL_SHADER_STORAGE_BUFFER, binding, buffer)
+
+        glDispatchCompute(-(-self.object_count // self.WORK_GROUP_SIZE), 1, 1)
+
+        # the draws read the commands and instances the culling wrote.
+        glMemoryBarrier(GL_COMMAND_BARRIER_BIT | GL_VERTEX_ATTRIB_ARRAY_BARRIER_BIT | GL_SHADER_STORAGE_BARRIER_BIT)
+
+    def draw(self, objects: list, transforms, matrices: np.ndarray, normals: np.ndarray, changed: np.ndarray,
+             clip_mx: np.ndarray, shader) -> int:
+
+        '''
+        Culls and draws all objects.
+
+        Args:
+            objects: The scene's render list.
+            transforms: The scene's TransformStore.
+            matrices: The (N, 4, 4) model matrices of the transform store.
+            normals: The (N, 3, 3) normal matrices of the transform store.
+            changed: Per-row flags of matrices recomputed this frame.
+            clip_mx: The camera's view-projection matrix.
+            shader: The instanced ShaderProgram drawing the objects.
+
+        Returns:
+            The number of draw calls issued.
+        '''
+
+        self.transform_uploads = 0
+        if self.dirty:
+            self.build(objects, transforms)
+            changed = np.ones(self.object_count, dtype=bool)
+
+        self.draw_calls = 0
+        if len(self.commands) == 0:
+            return 0
+
+        self.upload_transforms(matrices, normals, changed)
+        self.cull(clip_mx)
+
+        shader.use()
+        glBindVertexArray(self.vao)
+        glBindBuffer(GL_DRAW_INDIRECT_BUFFER, self.buffers[self.COMMANDS])
+        glActiveTexture(GL_TEXTURE0)
+        for texture, first, count in self.draws:
+            glBindTexture(texture.target, texture.get())
+            glMultiDrawElementsIndirect(GL_TRIANGLES, GL_UNSIGNED_INT, ctypes.c_void_p(first * self.COMMAND_SIZE),
+                                        count, self.COMMAND_SIZE)
+            self.draw_calls += 1
+
+        glBindBuffer(GL_DRAW_INDIRECT_BUFFER, 0)
+
+        return self.draw_calls
+
+    def read_buffer(self, binding: int, dtype, count: int) -> np.ndarray:
+
+        '''
+        Reads back a storage buffer, waiting for the GPU.
+        '''
+
+        glBindBuffer(GL_SHADER_STORAGE_BUFFER, self.buffers[binding])
+        data = glGetBufferSubData(GL_SHADER_STORAGE_BUFFER, 0, count * np.dtype(dtype).itemsize)
+
+        return np.frombuffer(data, dtype=dtype, count=count).copy()
+
+    def read_visible(self) -> np.ndarray:
+
+        '''
+        Returns the (N,) visibility flags the last culling pass wrote, for checks
+        against the CPU culler. Waits for the GPU.
+        '''
+
+        if self.object_count == 0:
+            return np.zeros(0, dtype=bool)
+
+        return self.read_buffer(self.VISIBILITY, np.uint32, self.object_count).astype(bool)
+
+    def read_commands(self) -> np.ndarray:
+
+        '''
+        Returns the (commands, 5) draw commands of the last frame with their
+        instance counts. Waits for the GPU.
+        '''
+
+        if len(self.commands) == 0:
+            return self.commands.copy()
+
+        return self.read_buffer(self.COMMANDS, np.uint32, self.commands.size).reshape(-1, 5)
+
+    def release(self):
+
+        '''
+        Frees the buffers and the vertex array.
+        '''
+
+        if self.buffers:
+            glDeleteBuffers(len(self.buffers), list(self.buffers.values()))
+            self.buffers = {}
+
+        if self.vao is not None:
+            glDeleteBuffers(2, [self.vbo, self.ebo])
+            glDeleteVertexArrays(1, [self.vao])
+            self.vao = None
+
+        self.dirty = True
@@ -0,0 +1,361 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+from GLBackend import *
+import numpy as np
+from RingBuffer import RingBuffer, supports_persistent_mapping
+
+class InstanceGroup:
+
+    '''
+    Objects that share a mesh and a texture, drawn together with one instanced draw call.
+    '''
+
+    def __init__(self, vao: int, texture, index_count: int):
+
+        '''
+        Initializes an empty group and its per-instance buffer.
+
+        Args:
+            vao: Vertex array object of the shared mesh.
+            texture: TextureHandle or AtlasRegion bound while drawing the group.
+            index_count: Number of indices in the shared mesh.
+        '''
+
+        self.vao = vao
+        self.texture = texture
+        self.index_count = index_count
+        self.objects = []
+        self.indices = np.zeros(0, dtype=np.int64)
+        self.visible_indices = np.zeros(0, dtype=np.int64)
+        self.visible_mask = np.zeros(0, dtype=bool)
+        self.instances = np.zeros((0, InstancedRenderer.FLOATS_PER_INSTANCE), dtype=np.float32)
+        self.instance_vbo = glGenBuffers(1)
+        self.upload_pending = True
+
+        # instance data written into the renderer's ring buffer this frame, at these byte offsets.
+        self.streamed = False
+        self.instance_offset = 0
+        self.region_offset = 0
+
+        # (u, v, width, height, layer) of every object when drawing from an atlas.
+        self.regions = None
+        self.region_vbo = None
+
+    def set_regions(self):
+
+        '''
+        Collects the atlas region of every object, static until the grouping changes.
+        '''
+
+        self.regions = np.array(
+            [obj.texture.rect + (obj.texture.layer,) for obj in self.objects],
+            dtype=np.float32
+        )
+
+        if self.region_vbo is None:
+            self.region_vbo = glGenBuffers(1)
+
+    def select(self, changed: np.ndarray, visible: np.ndarray) -> bool:
+
+        '''
+        Picks the group's visible objects.
+
+        Args:
+            changed: Per-row flags of matrices recomputed this frame.
+            visible: Per-row flags of objects inside the view frustum.
+
+        Returns:
+            True if the instance data must be repacked, because any of the visible
+            objects or the visible set changed since the last upload.
+        '''
+
+        mask = visible[self.indices]
+        visible_indices = self.indices[mask]
+
+        if (self.upload_pending or changed[visible_indices].any()
+                or not np.array_equal(visible_indices, self.visible_indices)):
+            self.visible_indices = visible_indices
+            self.visible_mask = mask
+            self.upload_pending = True
+
+        return self.upload_pending
+
+    def get_stream_bytes(self) -> int:
+
+        '''
+        Returns the most ring buffer bytes the group's visible instances take, including alignment.
+        '''
+
+        count = len(self.visible_indices)
+        nbytes = count * InstancedRenderer.FLOATS_PER_INSTANCE * 4 + RingBuffer.ALIGNMENT
+        if self.region_vbo is not None:
+            nbytes += count * 20 + RingBuffer.ALIGNMENT
+
+        return nbytes
+
+    def pack(self, matrices: np.ndarray, normals: np.ndarray, ring: RingBuffer = None):
+
+        '''
+        Gathers the model and normal matrices of the group's visible objects into the
+        contiguous per-instance array if select found them changed. With a ring buffer
+        the array is written straight into this frame's region.
+
+        Args:
+            matrices: The (N, 4, 4) model matrices of the transform store.
+            normals: The (N, 3, 3) normal matrices of the transform store.
+            ring: The renderer's ring buffer, None to upload into the group's own buffer.
+        '''
+
+        if not self.upload_pending:
+            if self.streamed:
+                # the ring region is rewritten a few frames later, data that stopped changing
+                # moves into the group's own buffer.
+                self.instances = self.instances.copy()
+                self.upload_pending = True
+                self.streamed = False
+            return
+
+        shape = (len(self.visible_indices), InstancedRenderer.FLOATS_PER_INSTANCE)
+        if ring is not None:
+            self.instance_offset, self.instances = ring.allocate(shape)
+        else:
+            self.instances = np.empty(shape, dtype=np.float32)
+
+        self.instances[:, :16] = matrices[self.visible_indices].reshape(-1, 16)
+        self.instances[:, 16:] = normals[self.visible_indices].reshape(-1, 9)
+
+        if ring is not None and self.region_vbo is not None:
+            self.region_offset, regions = ring.allocate((len(self.visible_indices), 5))
+            regions[:] = self.regions[self.visible_mask]
+
+        self.streamed = ring is not None
+
+    def draw(self, ring: RingBuffer = None):
+
+        '''
+        Uploads the packed instance data if it changed and draws all visible instances of the group.
+
+        Args:
+            ring: The renderer's ring buffer the data was packed into, if streamed.
+
+        Returns:
+            True if the per-instance data was rewritten.
+        '''
+
+        uploaded = self.upload_pending
+        if len(self.visible_indices) == 0:
+            self.upload_pending = False
+            return uploaded
+
+        # streamed data is already in place, only the group's own buffers need uploads.
+        upload = self.upload_pending and not self.streamed
+        offset = self.instance_offset if self.streamed else 0
+
+        glBindVertexArray(self.vao)
+        glBindBuffer(GL_ARRAY_BUFFER, ring.buffer if self.streamed else self.instance_vbo)
+        if upload:
+            glBufferData(GL_ARRAY_BUFFER, self.instances.nbytes, self.instances, GL_STREAM_DRAW)
+
+        # a mat4 attribute takes four consecutive vec4 locations, a mat3 three vec3 locations.
+        stride = InstancedRenderer.FLOATS_PER_INSTANCE * 4
+        for column in range(4):
+            location = InstancedRenderer.MODEL_LOCATION + column
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, 4, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(offset + column * 16))
+            glVertexAttribDivisor(location, 1)
+
+        for column in range(3):
+            location = InstancedRenderer.NORMAL_LOCATION + column
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, 3, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(offset + 64 + column * 12))
+            glVertexAttribDivisor(location, 1)
+
+        if self.region_vbo is not None:
+            offset = self.region_offset if self.streamed else 0
+            glBindBuffer(GL_ARRAY_BUFFER, ring.buffer if self.streamed else self.region_vbo)
+            if upload:
+                regions = self.regions[self.visible_mask]
+                glBufferData(GL_ARRAY_BUFFER, regions.nbytes, regions, GL_STREAM_DRAW)
+
+            location = InstancedRenderer.REGION_LOCATION
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, 4, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(offset))
+            glVertexAttribDivisor(location, 1)
+
+            glEnableVertexAttribArray(location + 1)
+            glVertexAttribPointer(location + 1, 1, GL_FLOAT, GL_FALSE, 20, ctypes.c_void_p(offset + 16))
+            glVertexAttribDivisor(location + 1, 1)
+
+        self.upload_pending = False
+
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(self.texture.target, self.texture.get())
+
+        glDrawElementsInstanced(GL_TRIANGLES, self.index_count, GL_UNSIGNED_INT, None, len(self.visible_indices))
+
+        return uploaded
+
+    def release(self):
+
+        '''
+        Frees the group's per-instance buffer.
+        '''
+
+        glDeleteBuffers(1, [self.instance_vbo])
+
+        if self.region_vbo is not None:
+            glDeleteBuffers(1, [self.region_vbo])
+
+class InstancedRenderer:
+
+    '''
+    Draws objects grouped by mesh and texture, one glDrawElementsInstanced call per group.
+    '''
+
+    # first attribute location of the per-instance model matrix in vertex.glsl (INSTANCED).
+    MODEL_LOCATION = 3
+
+    # attribute locations of the per-instance atlas rect and layer in vertex.glsl (ATLAS).
+    REGION_LOCATION = 7
+
+    # first attribute location of the per-instance normal matrix.
+    NORMAL_LOCATION = 9
+
+    # model matrix (16 floats) followed by the normal matrix (9 floats).
+    FLOATS_PER_INSTANCE = 25
+
+    def __init__(self, persistent_buffers: bool = True):
+
+        '''
+        Initializes the renderer with no groups.
+
+        Args:
+            persistent_buffers: Stream changing instance data through a persistently
+                mapped ring buffer when the driver supports it.
+        '''
+
+        self.groups = {}
+        self.use_ring = persistent_buffers
+        self.ring = None
+        self.dirty = True
+        self.draw_calls = 0
+        self.triangles = 0
+        self.uploads = 0
+        self.uploads_skipped = 0
+
+    def invalidate(self):
+
+        '''
+        Marks the grouping as stale, e.g. after objects were added to the scene.
+        '''
+
+        self.dirty = True
+
+    def build_groups(self, objects: list):
+
+        '''
+        Sorts the objects into groups keyed by (vao, texture), objects drawn from
+        the same atlas share one group.
+
+        Args:
+            objects: The scene's render list.
+        '''
+
+        for group in self.groups.values():
+            group.objects = []
+
+        for obj in objects:
+            key = (obj.vao, obj.texture.source)
+            group = self.groups.get(key)
+            if group is None:
+                group = InstanceGroup(obj.vao, obj.texture, obj.index_count)
+                self.groups[key] = group
+            group.objects.append(obj)
+
+        for group in self.groups.values():
+            group.indices = np.array([obj.index for obj in group.objects], dtype=np.int64)
+            group.upload_pending = True
+
+            if group.objects and group.texture.source is not group.texture:
+                group.set_regions()
+
+        # drop groups that lost all their objects.
+        for key in [key for key, group in self.groups.items() if not group.objects]:
+            self.groups.pop(key).release()
+
+        self.dirty = False
+
+    def draw(self, objects: list, matrices: np.ndarray, normals: np.ndarray, changed: np.ndarray,
+             visible: np.ndarray) -> int:
+
+        '''
+        Draws all visible objects.
+
+        Args:
+            objects: The scene's render list.
+            matrices: The (N, 4, 4) model matrices of the transform store.
+            normals: The (N, 3, 3) normal matrices of the transform store.
+            changed: Per-row flags of matrices recomputed this frame.
+            visible: Per-row flags of objects inside the view frustum.
+
+        Returns:
+            The number of draw calls issued.
+        '''
+
+        if self.dirty:
+            self.build_groups(objects)
+
+        # the ring buffer needs a context, it is created on the first frame.
+        if self.use_ring and self.ring is None:
+            if supports_persistent_mapping():
+                self.ring = RingBuffer()
+            else:
+                self.use_ring = False
+
+        ring = self.ring
+        for group in self.groups.values():
+            group.select(changed, visible)
+
+        if ring is not None:
+            ring.begin_frame()
+
+            # room for every visible instance, a regrown ring no longer holds last frame's data.
+            resizes = ring.resizes
+            ring.reserve(sum(group.get_stream_bytes() for group in self.groups.values()))
+            if ring.resizes != resizes:
+                for group in self.groups.values():
+                    group.upload_pending = group.upload_pending or group.streamed
+
+        self.uploads = 0
+        self.draw_calls = 0
+        self.triangles = 0
+        for group in self.groups.values():
+            group.pack(matrices, normals, ring)
+            self.uploads += group.draw(ring)
+            self.draw_calls += len(group.visible_indices) > 0
+            self.triangles += group.index_count // 3 * len(group.visible_indices)
+
+        if ring is not None:
+            ring.end_frame()
+
+        self.uploads_skipped = len(self.groups) - self.uploads
+
+        return self.draw_calls
+
+    def release(self):
+
+        '''
+        Frees the groups' buffers and the ring buffer.
+        '''
+
+        self.build_groups([])
+
+        if self.ring is not None:
+            self.ring.release()
+            self.ring = None
@@ -0,0 +1,206 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import numpy as np
+from Culling import compute_aabbs
+
+class LODSelector:
+
+    '''
+    Picks a mesh level of detail and a texture mip level for every object each frame
+    from its projected size on screen, in one vectorized pass over all visible objects.
+
+    A level only changes once the projected size has moved a hysteresis band past
+    the threshold, so objects close to a threshold do not pop between levels.
+    '''
+
+    # projected diameters in pixels below which the next coarser mesh level is used.
+    MESH_THRESHOLDS = (192.0, 64.0, 24.0)
+
+    def __init__(self, thresholds: tuple = MESH_THRESHOLDS, hysteresis: float = 0.15, texture_bias: int = 1,
+                 viewport_height: int = 600):
+
+        '''
+        Initializes the selector.
+
+        Args:
+            thresholds: Projected diameters in pixels, one per mesh level after the first.
+            hysteresis: Fraction the projected size must pass a threshold by before a level changes.
+            texture_bias: Mip levels finer than one texel per pixel to keep, for oblique surfaces.
+            viewport_height: Height of the viewport in pixels.
+        '''
+
+        self.thresholds = np.sort(np.asarray(thresholds, dtype=np.float64))
+        self.hysteresis = hysteresis
+        self.texture_bias = texture_bias
+        self.viewport_height = viewport_height
+        self.dirty = True
+
+        # per object of the render list.
+        self.objects = []
+        self.rows = np.zeros(0, dtype=np.int64)
+        self.level_counts = np.zeros(0, dtype=np.int64)
+        self.levels = np.zeros(0, dtype=np.int64)
+        self.texture_levels = np.zeros(0, dtype=np.int64)
+        self.texture_slots = np.zeros(0, dtype=np.int64)
+
+        # distinct textures that support a base mip level (not atlas regions).
+        self.textures = []
+
+        # statistics of the last selection.
+        self.changes = 0
+        self.texels = 0
+
+    def invalidate(self):
+
+        '''
+        Marks the object arrays as stale, e.g. after objects were added to the scene.
+        '''
+
+        self.dirty = True
+
+    def set_objects(self, objects: list):
+
+        '''
+        Collects the rows, levels and textures of the objects.
+
+        Args:
+            objects: The scene's render list.
+        '''
+
+        self.objects = list(objects)
+        self.rows = np.array([obj.index for obj in objects], dtype=np.int64)
+        self.level_counts = np.array([len(obj.lods) for obj in objects], dtype=np.int64)
+        self.levels = np.array([obj.lod for obj in objects], dtype=np.int64)
+        self.texture_levels = np.zeros(len(objects), dtype=np.int64)
+
+        slots = {}
+        self.texture_slots = np.full(len(objects), -1, dtype=np.int64)
+        for position, obj in enumerate(objects):
+            if obj.texture.source is obj.texture:
+                self.texture_slots[position] = slots.setdefault(obj.texture, len(slots))
+        self.textures = list(slots)
+
+        self.dirty = False
+
+    def get_levels(self, sizes: np.ndarray) -> np.ndarray:
+
+        '''
+        Returns the mesh level of every projected size without hysteresis.
+
+        Args:
+            sizes: Projected diameters in pixels.
+        '''
+
+        return len(self.thresholds) - np.searchsorted(self.thresholds, sizes, side="right")
+
+    def get_texture_levels(self, extents: np.ndarray, sizes: np.ndarray) -> np.ndarray:
+
+        '''
+        Returns the mip level at which a texture's texels match the pixels it covers.
+
+        Args:
+            extents: Texels along the longest side of every texture's base level.
+            sizes: Projected diameters in pixels.
+        '''
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            levels = np.floor(np.log2(extents / sizes)) - self.texture_bias
+
+        return np.nan_to_num(levels, nan=0, posinf=0, neginf=0).astype(np.int64)
+
+    def select(self, objects: list, matrices: np.ndarray, bounds_min: np.ndarray, bounds_max: np.ndarray,
+               eye: np.ndarray, projection: np.ndarray, visible: np.ndarray) -> bool:
+
+        '''
+        Updates the levels of the visible objects and the base mip levels of their textures.
+
+        Args:
+            objects: The scene's render list.
+            matrices: (N, 4, 4) model matrices of the transform store.
+            bounds_min: (N, 3) local box minimums of the objects' meshes.
+            bounds_max: (N, 3) local box maximums of the objects' meshes.
+            eye: The camera position.
+            projection: The camera's projection matrix.
+            visible: Per-row flags of objects inside the view frustum.
+
+        Returns:
+            True if any object switched its mesh, renderers grouping by mesh must rebuild.
+        '''
+
+        if self.dirty:
+            self.set_objects(objects)
+
+        members = np.flatnonzero(visible[self.rows])
+        rows = self.rows[members]
+
+        # diameter in pixels of the sphere around each world-space box, unbounded with the eye inside.
+        centers, half_extents = compute_aabbs(matrices[rows], bounds_min[rows], bounds_max[rows])
+        radii = np.linalg.norm(half_extents, axis=1)
+        distances = np.linalg.norm(centers - eye[:3], axis=1)
+        pixels_per_unit = projection[1, 1] * self.viewport_height / 2
+        with np.errstate(divide="ignore"):
+            sizes = np.where(distances > radii, 2 * radii * pixels_per_unit / distances, np.inf)
+
+        # keep the current level while the size stays within the band around the thresholds.
+        low = sizes * (1 - self.hysteresis)
+        high = sizes * (1 + self.hysteresis)
+
+        current = self.levels[members]
+        levels = np.clip(current, self.get_levels(high), self.get_levels(low))
+        levels = np.minimum(levels, self.level_counts[members] - 1)
+
+        changed = members[levels != current]
+        self.levels[members] = levels
+        for position in changed.tolist():
+            self.objects[position].set_lod(int(self.levels[position]))
+        self.changes = len(changed)
+
+        self.select_textures(members, low, high)
+
+        return self.changes > 0
+
+    def select_textures(self, members: np.ndarray, low: np.ndarray, high: np.ndarray):
+
+        '''
+        Sets every texture's base mip level to the finest level a visible object using it needs.
+
+        Args:
+            members: Positions of the visible objects in the render list.
+            low: Their projected sizes shrunk by the hysteresis band.
+            high: Their sizes grown by the hysteresis band.
+        '''
+
+        self.texels = 0
+        slots = self.texture_slots[members]
+        textured = slots >= 0
+        if not textured.any():
+            return
+
+        # textures can be evicted and reloaded, read their current sizes.
+        sizes_and_levels = np.array([(t.width, t.height, t.level_count) for t in self.textures], dtype=np.int64)
+        slots = slots[textured]
+        members = members[textured]
+        extents = sizes_and_levels[slots, :2].max(axis=1)
+
+        current = self.texture_levels[members]
+        levels = np.clip(current, self.get_texture_levels(extents, high[textured]),
+                         self.get_texture_levels(extents, low[textured]))
+        levels = np.clip(levels, 0, np.maximum(sizes_and_levels[slots, 2] - 1, 0))
+        self.texture_levels[members] = levels
+
+        # a shared texture keeps the finest level any of its visible objects needs.
+        base_levels = np.full(len(self.textures), np.iinfo(np.int64).max)
+        np.minimum.at(base_levels, slots, levels)
+        used = np.flatnonzero(base_levels != np.iinfo(np.int64).max)
+        for slot in used.tolist():
+            self.textures[slot].set_base_level(int(base_levels[slot]))
+
+        # texels of the finest level sampled from each texture in use.
+        base_levels = base_levels[used]
+        self.texels = int(((sizes_and_levels[used, 0] >> base_levels) * (sizes_and_levels[used, 1] >> base_levels)).sum())
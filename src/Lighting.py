@@ -0,0 +1,401 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import time
+import numpy as np
+from GLBackend import *
+
+def get_bounding_spheres(positions: np.ndarray, directions: np.ndarray, ranges: np.ndarray,
+                         cos_outer: np.ndarray) -> tuple:
+
+    '''
+    Computes the smallest spheres around light volumes: the range sphere of point
+    lights and the sphere around the cone of spotlights.
+
+    Args:
+        positions: (L, 3) light positions.
+        directions: (L, 3) unit directions of the spotlights.
+        ranges: (L,) distances at which the lights fade out.
+        cos_outer: (L,) cosines of the outer cone half-angles, below -1 for point lights.
+
+    Returns:
+        (centers, radii) of the spheres.
+    '''
+
+    cos_outer = np.clip(cos_outer, -1.0, 1.0)
+    sin_outer = np.sqrt(1.0 - cos_outer ** 2)
+
+    # a narrow cone fits in the sphere through its apex and rim, a wide one in the sphere around its rim.
+    narrow = cos_outer >= np.sqrt(0.5)
+    with np.errstate(divide="ignore"):
+        offsets = np.where(narrow, ranges / (2 * np.maximum(cos_outer, 1e-6)), ranges * cos_outer)
+    radii = np.where(narrow, offsets, ranges * sin_outer)
+
+    # spheres of cones wider than a half space are the range sphere.
+    wide = cos_outer <= 0
+    offsets = np.where(wide, 0.0, offsets)
+    radii = np.where(wide, ranges, radii)
+
+    return positions + directions * offsets[:, None], radii
+
+def get_tile_ranges(centers: np.ndarray, depths: np.ndarray, radii: np.ndarray, scale: float, tiles: int) -> tuple:
+
+    '''
+    Finds the screen tiles along one axis covered by the projections of view-space spheres.
+
+    The sphere's silhouette is bounded by its tangents through the eye, which lie
+    asin(r / d) either side of the direction to its center.
+
+    Args:
+        centers: (L,) view-space coordinates of the centers along the axis.
+        depths: (L,) distances of the centers in front of the eye.
+        radii: (L,) sphere radii.
+        scale: The projection's scale along the axis (NDC = scale * x / depth).
+        tiles: Number of tiles along the axis.
+
+    Returns:
+        (first tile, last tile, covered flags).
+    '''
+
+    distances = np.hypot(centers, depths)
+    contains_eye = distances <= radii
+
+    angles = np.arctan2(centers, depths)
+    half_angles = np.arcsin(np.clip(radii / np.maximum(distances, 1e-12), 0.0, 1.0))
+    low = angles - half_angles
+    high = angles + half_angles
+
+    # only the half space in front of the eye projects, clamp just inside it.
+    covered = contains_eye | ((low < np.pi / 2) & (high > -np.pi / 2))
+    limit = np.pi / 2 - 1e-6
+    low = np.where(contains_eye, -limit, np.clip(low, -limit, limit))
+    high = np.where(contains_eye, limit, np.clip(high, -limit, limit))
+
+    first = np.floor((scale * np.tan(low) + 1) * 0.5 * tiles)
+    last = np.floor((scale * np.tan(high) + 1) * 0.5 * tiles)
+    covered &= (last >= 0) & (first < tiles)
+
+    return np.clip(first, 0, tiles - 1).astype(np.int64), np.clip(last, 0, tiles - 1).astype(np.int64), covered
+
+class LightStore:
+
+    '''
+    Structure-of-arrays storage of local point and spotlights, one row per light.
+    '''
+
+    def __init__(self, capacity: int = 64):
+
+        '''
+        Initializes an empty store.
+
+        Args:
+            capacity: Initial number of rows, the arrays grow by doubling.
+        '''
+
+        self.count = 0
+        self.positions = np.zeros((capacity, 3), dtype=np.float32)
+        self.colors = np.zeros((capacity, 3), dtype=np.float32)
+        self.directions = np.zeros((capacity, 3), dtype=np.float32)
+        self.ranges = np.zeros(capacity, dtype=np.float32)
+        self.cos_inner = np.zeros(capacity, dtype=np.float32)
+        self.cos_outer = np.zeros(capacity, dtype=np.float32)
+
+        # set when lights were added or changed since the last upload.
+        self.dirty = True
+
+    def reserve(self, capacity: int):
+
+        '''
+        Grows the arrays so that they can hold at least capacity lights.
+        '''
+
+        if capacity <= len(self.ranges):
+            return
+
+        capacity = max(capacity, 2 * len(self.ranges))
+        for name in ("positions", "colors", "directions", "ranges", "cos_inner", "cos_outer"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=np.float32)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def add(self, position, color, direction=(0, -1, 0), range: float = 5.0, angle: float = None,
+            inner_angle: float = None) -> int:
+
+        '''
+        Adds a light.
+
+        Args:
+            position: World-space position.
+            color: Linear RGB color, scaled by the light's intensity.
+            direction: Direction a spotlight points in.
+            range: Distance at which the light has faded out completely.
+            angle: Outer half-angle of a spotlight's cone in degrees, None for a point light.
+            inner_angle: Half-angle in degrees within which a spotlight is at full
+                intensity, defaults to 80% of angle.
+
+        Returns:
+            The row index of the light.
+        '''
+
+        self.reserve(self.count + 1)
+        index = self.count
+        self.count += 1
+
+        direction = np.asarray(direction, dtype=np.float32)
+        self.positions[index] = position
+        self.colors[index] = color
+        self.directions[index] = direction / np.linalg.norm(direction)
+        self.ranges[index] = range
+
+        if angle is None:
+            # a cone that never cuts off.
+            self.cos_outer[index] = -2.0
+            self.cos_inner[index] = -1.0
+        else:
+            inner_angle = angle * 0.8 if inner_angle is None else inner_angle
+            self.cos_outer[index] = np.cos(np.radians(angle))
+            self.cos_inner[index] = np.cos(np.radians(inner_angle))
+
+        self.dirty = True
+
+        return index
+
+    def pack(self) -> np.ndarray:
+
+        '''
+        Packs the lights into four RGBA texels each: (position, range), (color, 0),
+        (direction, cos outer) and (cos inner, 0, 0, 0).
+
+        Returns:
+            (count * 4, 4) float32 texels.
+        '''
+
+        count = self.count
+        texels = np.zeros((count, 4, 4), dtype=np.float32)
+        texels[:, 0, 0:3] = self.positions[:count]
+        texels[:, 0, 3] = self.ranges[:count]
+        texels[:, 1, 0:3] = self.colors[:count]
+        texels[:, 2, 0:3] = self.directions[:count]
+        texels[:, 2, 3] = self.cos_outer[:count]
+        texels[:, 3, 0] = self.cos_inner[:count]
+
+        return texels.reshape(-1, 4)
+
+class ClusteredLighting:
+
+    '''
+    Assigns local lights to the clusters of a view-space froxel grid (screen tiles
+    times exponential depth slices) on the CPU each frame and hands the result to
+    the fragment shader in texture buffers, so each fragment only evaluates the
+    lights whose volume overlaps its cluster.
+    '''
+
+    # first texture unit of the light, cluster and index buffers, unit 0 holds the object's texture.
+    TEXTURE_UNIT = 1
+
+    def __init__(self, store: LightStore = None, tiles: tuple = (16, 12), slices: int = 24,
+                 viewport: tuple = (800, 600), near: float = 0.1, far: float = 10.0):
+
+        '''
+        Initializes the grid and creates its texture buffers.
+
+        Args:
+            store: LightStore holding the lights, defaults to a new one.
+            tiles: Number of screen tiles along x and y.
+            slices: Number of depth slices between near and far.
+            viewport: Size of the viewport in pixels.
+            near: Near plane distance of the projection.
+            far: Far plane distance of the projection.
+        '''
+
+        self.store = store or LightStore()
+        self.tiles = tiles
+        self.slices = slices
+        self.viewport = viewport
+        self.near = near
+        self.far = far
+
+        # slice = log(depth) * scale + bias, so near maps to 0 and far to slices.
+        self.depth_scale = slices / np.log(far / near)
+        self.depth_bias = -np.log(near) * self.depth_scale
+
+        self.cluster_count = tiles[0] * tiles[1] * slices
+        self.max_indices = int(glGetIntegerv(GL_MAX_TEXTURE_BUFFER_SIZE))
+
+        # light texels, (first index, count) per cluster and the light index list.
+        self.buffers = glGenBuffers(3)
+        self.textures = glGenTextures(3)
+        for unit, (buffer, texture, internal_format) in enumerate(zip(self.buffers, self.textures,
+                                                                      (GL_RGBA32F, GL_RG32UI, GL_R32UI))):
+            glBindBuffer(GL_TEXTURE_BUFFER, buffer)
+            glBufferData(GL_TEXTURE_BUFFER, 16, None, GL_STREAM_DRAW)
+            glActiveTexture(GL_TEXTURE0 + self.TEXTURE_UNIT + unit)
+            glBindTexture(GL_TEXTURE_BUFFER, texture)
+            glTexBuffer(GL_TEXTURE_BUFFER, internal_format, buffer)
+        glActiveTexture(GL_TEXTURE0)
+
+        # view matrix of the last assignment, lights are reassigned when it or a light changes.
+        self.view_key = None
+
+        # statistics of the last assignment.
+        self.assignments = 0
+        self.max_per_cluster = 0
+        self.dropped = 0
+        self.assign_seconds = 0.0
+
+    def set_shader_variables(self, shader):
+
+        '''
+        Sets the samplers and grid constants of a program using CLUSTERED_LIGHTS.
+        The program must be in use.
+        '''
+
+        shader.set_uniform("lightData", self.TEXTURE_UNIT)
+        shader.set_uniform("clusterData", self.TEXTURE_UNIT + 1)
+        shader.set_uniform("lightIndices", self.TEXTURE_UNIT + 2)
+        shader.set_uniform("clusterTileSize", (self.viewport[0] / self.tiles[0], self.viewport[1] / self.tiles[1]))
+        shader.set_uniform("clusterCounts", (self.tiles[0], self.tiles[1], self.slices))
+        shader.set_uniform("clusterDepth", (self.depth_scale, self.depth_bias))
+
+    def assign(self, view: np.ndarray, projection: np.ndarray) -> tuple:
+
+        '''
+        Assigns every light to the clusters its bounding sphere overlaps.
+
+        Args:
+            view: The camera's view matrix (row-vector convention).
+            projection: The camera's projection matrix.
+
+        Returns:
+            (per-cluster (first index, count) uint32 pairs, light index list).
+        '''
+
+        store = self.store
+        count = store.count
+        tiles_x, tiles_y = self.tiles
+
+        centers, radii = get_bounding_spheres(store.positions[:count], store.directions[:count],
+                                              store.ranges[:count], store.cos_outer[:count])
+
+        # view space looks down -z.
+        view_centers = centers @ view[:3, :3] + view[3, :3]
+        depths = -view_centers[:, 2]
+
+        first_x, last_x, covered_x = get_tile_ranges(view_centers[:, 0], depths, radii, projection[0, 0], tiles_x)
+        first_y, last_y, covered_y = get_tile_ranges(view_centers[:, 1], depths, radii, projection[1, 1], tiles_y)
+
+        with np.errstate(divide="ignore", invalid="ignore"):
+            first_z = np.floor(np.log(np.maximum(depths - radii, self.near)) * self.depth_scale + self.depth_bias)
+            last_z = np.floor(np.log(np.maximum(depths + radii, self.near)) * self.depth_scale + self.depth_bias)
+        covered_z = (depths + radii > self.near) & (depths - radii < self.far)
+        first_z = np.clip(first_z, 0, self.slices - 1).astype(np.int64)
+        last_z = np.clip(last_z, 0, self.slices - 1).astype(np.int64)
+
+        lights = np.flatnonzero(covered_x & covered_y & covered_z)
+        first_x, last_x = first_x[lights], last_x[lights]
+        first_y, last_y = first_y[lights], last_y[lights]
+        first_z, last_z = first_z[lights], last_z[lights]
+
+        # each light's box is a run of x tiles per covered (y, z) row, expand the rows first.
+        sizes_x = last_x - first_x + 1
+        sizes_y = last_y - first_y + 1
+        row_counts = sizes_y * (last_z - first_z + 1)
+        row_owners = np.repeat(np.arange(len(lights)), row_counts)
+        rows = np.arange(int(row_counts.sum())) - np.repeat(np.cumsum(row_counts) - row_counts, row_counts)
+
+        y = first_y[row_owners] + rows % sizes_y[row_owners]
+        z = first_z[row_owners] + rows // sizes_y[row_owners]
+        row_clusters = (z * tiles_y + y) * tiles_x + first_x[row_owners]
+
+        # then every run, cluster ids are consecutive within it.
+        runs = sizes_x[row_owners]
+        run_starts = np.cumsum(runs) - runs
+        clusters = np.repeat(row_clusters - run_starts, runs) + np.arange(int(runs.sum()))
+        owners = np.repeat(row_owners, runs)
+
+        # group by cluster, lights stay in ascending order within a cluster. stable sorts of
+        # 16-bit keys are radix sorts, several times faster than sorting wider keys.
+        if self.cluster_count <= 1 << 16:
+            clusters = clusters.astype(np.uint16)
+        order = np.argsort(clusters, kind="stable")
+        indices = lights[owners[order]].astype(np.uint32)
+        counts = np.bincount(clusters, minlength=self.cluster_count)
+
+        ranges = np.zeros((self.cluster_count, 2), dtype=np.uint32)
+        ranges[:, 0] = np.cumsum(counts) - counts
+        ranges[:, 1] = counts
+
+        # texture buffers have a size limit, clusters past it lose their lights.
+        self.dropped = max(len(indices) - self.max_indices, 0)
+        if self.dropped:
+            indices = indices[:self.max_indices]
+            ranges[:, 1] = np.clip(self.max_indices - ranges[:, 0].astype(np.int64), 0, counts)
+
+        self.assignments = len(indices)
+        self.max_per_cluster = int(counts.max()) if len(counts) else 0
+
+        return ranges, indices
+
+    def update(self, view: np.ndarray, projection: np.ndarray) -> bool:
+
+        '''
+        Reassigns and uploads the lights if the view or a light changed since the last frame.
+
+        Args:
+            view: The camera's view matrix.
+            projection: The camera's projection matrix.
+
+        Returns:
+            True if the buffers were updated.
+        '''
+
+        view_key = view.tobytes()
+        if view_key == self.view_key and not self.store.dirty:
+            self.assign_seconds = 0.0
+            return False
+
+        start = time.perf_counter()
+
+        if self.store.dirty:
+            self.upload(0, self.store.pack())
+            self.store.dirty = False
+
+        ranges, indices = self.assign(view, projection)
+        self.upload(1, ranges)
+        self.upload(2, indices)
+
+        self.view_key = view_key
+        self.assign_seconds = time.perf_counter() - start
+
+        return True
+
+    def upload(self, slot: int, data: np.ndarray):
+
+        '''
+        Replaces the contents of one texture buffer, orphaning the old storage.
+
+        Args:
+            slot: 0 for the lights, 1 for the cluster ranges, 2 for the index list.
+            data: The new contents.
+        '''
+
+        data = np.ascontiguousarray(data)
+
+        # empty buffers cannot be attached, keep a few bytes.
+        glBindBuffer(GL_TEXTURE_BUFFER, self.buffers[slot])
+        glBufferData(GL_TEXTURE_BUFFER, max(data.nbytes, 16), data if data.nbytes else None, GL_STREAM_DRAW)
+
+    def release(self):
+
+        '''
+        Deletes the texture buffers.
+        '''
+
+        glDeleteTextures(3, self.textures)
+        glDeleteBuffers(3, self.buffers)
@@ -0,0 +1,224 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import numpy as np
+
+# interleaved layout: (x, y, z, u, v, nx, ny, nz)
+FLOATS_PER_VERTEX = 8
+
+def weld_vertices(vertices: np.ndarray, indices: np.ndarray = None) -> tuple:
+
+    '''
+    Merges bitwise identical vertices, keeping the order in which they first appear.
+
+    Args:
+        vertices: (V, F) vertex rows of float32 attributes, or (V,) integer keys that
+            identify each vertex's attributes.
+        indices: Triangle corner indices into vertices, one corner per vertex when None.
+
+    Returns:
+        (unique vertices, uint32 indices into them).
+    '''
+
+    vertices = np.ascontiguousarray(vertices)
+    if vertices.dtype.kind == "f":
+        # adding zero turns -0.0 into 0.0 so both weld.
+        vertices = vertices + vertices.dtype.type(0)
+
+    if indices is None:
+        indices = np.arange(len(vertices), dtype=np.uint32)
+
+    if len(vertices) == 0:
+        return vertices, np.asarray(indices, dtype=np.uint32)
+
+    # compare whole rows as opaque byte strings.
+    rows = vertices
+    if vertices.ndim == 2:
+        rows = vertices.view(np.dtype((np.void, vertices.shape[1] * vertices.itemsize))).ravel()
+    _, first, inverse = np.unique(rows, return_index=True, return_inverse=True)
+
+    # np.unique sorts, renumber by first appearance to keep the mesh's locality.
+    order = np.argsort(first, kind="stable")
+    renumber = np.empty(len(order), dtype=np.uint32)
+    renumber[order] = np.arange(len(order), dtype=np.uint32)
+
+    return vertices[first[order]], renumber[inverse.ravel()][indices]
+
+class Mesh:
+
+    '''
+    Indexed triangle mesh with interleaved vertex data.
+    '''
+
+    def __init__(self, vertices: np.ndarray, indices: np.ndarray = None):
+
+        '''
+        Initializes a mesh.
+
+        Args:
+            vertices: (V, 8) rows of position, texture coordinate and normal.
+            indices: Three indices per triangle, drawn in vertex order when None.
+        '''
+
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32).reshape(-1, FLOATS_PER_VERTEX)
+
+        if indices is None:
+            indices = np.arange(len(self.vertices), dtype=np.uint32)
+        self.indices = np.ascontiguousarray(indices, dtype=np.uint32).ravel()
+
+    @property
+    def vertex_count(self) -> int:
+        return len(self.vertices)
+
+    @property
+    def index_count(self) -> int:
+        return len(self.indices)
+
+    @property
+    def triangle_count(self) -> int:
+        return len(self.indices) // 3
+
+    @property
+    def bounds(self) -> tuple:
+
+        '''
+        Returns the (min, max) corners of the box around the mesh's positions.
+        '''
+
+        if len(self.vertices) == 0:
+            return np.zeros(3, dtype=np.float32), np.zeros(3, dtype=np.float32)
+
+        positions = self.vertices[:, 0:3]
+        return positions.min(axis=0), positions.max(axis=0)
+
+    @staticmethod
+    def from_arrays(positions: np.ndarray, uvs: np.ndarray = None, normals: np.ndarray = None,
+                    indices: np.ndarray = None):
+
+        '''
+        Interleaves separate attribute arrays into a mesh.
+
+        Args:
+            positions: (V, 3) positions.
+            uvs: (V, 2) texture coordinates, zeros when None.
+            normals: (V, 3) normals, computed from the triangles when None.
+            indices: Three indices per triangle, drawn in vertex order when None.
+
+        Returns:
+            The Mesh.
+        '''
+
+        vertices = np.zeros((len(positions), FLOATS_PER_VERTEX), dtype=np.float32)
+        vertices[:, 0:3] = positions
+        if uvs is not None:
+            vertices[:, 3:5] = uvs
+
+        mesh = Mesh(vertices, indices)
+
+        if normals is not None:
+            mesh.vertices[:, 5:8] = normals
+        else:
+            mesh.compute_normals()
+
+        return mesh
+
+    def compute_normals(self):
+
+        '''
+        Sets every vertex normal to the area-weighted sum of the normals of the
+        triangles using it.
+        '''
+
+        triangles = self.indices.reshape(-1, 3)
+        positions = self.vertices[:, 0:3]
+
+        corners = positions[triangles]
+        face_normals = np.cross(corners[:, 1] - corners[:, 0], corners[:, 2] - corners[:, 0])
+
+        normals = np.zeros((len(self.vertices), 3), dtype=np.float32)
+        for corner in range(3):
+            np.add.at(normals, triangles[:, corner], face_normals)
+
+        lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+        self.vertices[:, 5:8] = normals / np.maximum(lengths, 1e-12)
+
+    def weld(self):
+
+        '''
+        Returns a copy of the mesh with duplicate vertices merged.
+        '''
+
+        vertices, indices = weld_vertices(self.vertices, self.indices)
+        return Mesh(vertices, indices)
+
+    def simplify(self, resolution: int):
+
+        '''
+        Returns a coarser copy of the mesh by vertex clustering: vertices in the same
+        cell of a grid over the mesh's bounds merge into their average and triangles
+        that collapse or become duplicates are dropped.
+
+        Args:
+            resolution: Number of grid cells along the longest side of the bounds.
+
+        Returns:
+            The simplified Mesh.
+        '''
+
+        low, high = self.bounds
+        cell_size = max(float((high - low).max()), 1e-12) / resolution
+        cells = np.minimum(((self.vertices[:, 0:3] - low) / cell_size).astype(np.int64), resolution - 1)
+        keys = np.ravel_multi_index(cells.T, (resolution, resolution, resolution))
+        _, clusters = np.unique(keys, return_inverse=True)
+        clusters = clusters.ravel()
+
+        counts = np.bincount(clusters)
+        vertices = np.stack([
+            np.bincount(clusters, weights=self.vertices[:, column]) / counts
+            for column in range(FLOATS_PER_VERTEX)
+        ], axis=1).astype(np.float32)
+
+        normals = vertices[:, 5:8]
+        normals /= np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+
+        triangles = clusters[self.indices].reshape(-1, 3)
+        triangles = triangles[
+            (triangles[:, 0] != triangles[:, 1]) & (triangles[:, 1] != triangles[:, 2]) & (triangles[:, 0] != triangles[:, 2])
+        ]
+
+        # triangles over the same three clusters collapse into one, keep the first.
+        corners = np.ascontiguousarray(np.sort(triangles, axis=1))
+        _, first = np.unique(corners.view(np.dtype((np.void, corners.shape[1] * corners.itemsize))).ravel(),
+                             return_index=True)
+
+        return Mesh(vertices, triangles[np.sort(first)])
+
+    def build_lods(self, max_levels: int = 4) -> list:
+
+        '''
+        Builds a chain of simplified levels of detail, each with at most half the
+        triangles of the previous one.
+
+        Args:
+            max_levels: Maximum number of levels, this mesh included.
+
+        Returns:
+            The levels, finest (this mesh) first.
+        '''
+
+        levels = [self]
+
+        # a surface with V vertices spans about sqrt(V) of them along each side.
+        resolution = int(np.ceil(np.sqrt(self.vertex_count)))
+        while len(levels) < max_levels and resolution > 2:
+            resolution //= 2
+            level = self.simplify(resolution)
+            if 0 < level.triangle_count <= levels[-1].triangle_count // 2:
+                levels.append(level)
+
+        return levels
@@ -0,0 +1,398 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import json
+import mmap
+import os
+import struct
+import numpy as np
+from Mesh import FLOATS_PER_VERTEX, Mesh, weld_vertices
+from TransformStore import TransformStore
+
+# bytes that classify and separate the parts of an OBJ line.
+NEWLINE, RETURN, SPACE, TAB, SLASH = b"\n\r \t/"
+LETTER_V, LETTER_T, LETTER_N, LETTER_F = b"vtnf"
+
+# OBJ line kinds.
+OTHER_LINE, POSITION_LINE, UV_LINE, NORMAL_LINE, FACE_LINE = range(5)
+
+# glTF accessor component types and element sizes.
+COMPONENT_TYPES = {
+    5120: np.int8,
+    5121: np.uint8,
+    5122: np.int16,
+    5123: np.uint16,
+    5125: np.uint32,
+    5126: np.float32,
+}
+TYPE_SIZES = {"SCALAR": 1, "VEC2": 2, "VEC3": 3, "VEC4": 4, "MAT2": 4, "MAT3": 9, "MAT4": 16}
+
+# binary glTF container.
+GLB_MAGIC = b"glTF"
+GLB_HEADER = "<4sII"
+CHUNK_HEADER = "<II"
+JSON_CHUNK = 0x4E4F534A
+BIN_CHUNK = 0x004E4942
+
+# glTF primitive mode of triangle lists.
+TRIANGLES = 4
+
+def map_file(path: str) -> mmap.mmap:
+
+    '''
+    Maps a file into memory read-only, so parsers can view its bytes without reading them into Python objects.
+
+    Args:
+        path: Path to the file.
+
+    Returns:
+        The read-only mapping, closed once no views of it remain.
+    '''
+
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            raise ValueError(f"{path} is empty")
+
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+def parse_numbers(text: np.ndarray, dtype, columns: int = None) -> np.ndarray:
+
+    '''
+    Parses whitespace separated numbers in one vectorized pass.
+
+    Args:
+        text: uint8 array of the characters to parse.
+        dtype: Type of the numbers.
+        columns: Numbers per row, taken from the first line when None.
+
+    Returns:
+        (rows, columns) array of the numbers.
+    '''
+
+    if columns is None:
+        line_end = np.flatnonzero(text == NEWLINE)
+        columns = len(text[:line_end[0] if len(line_end) else len(text)].tobytes().split())
+
+    values = np.fromstring(text.tobytes(), dtype=dtype, sep=" ")
+    if columns == 0 or len(values) % columns:
+        raise ValueError("OBJ rows have differing numbers of values")
+
+    return values.reshape(-1, columns)
+
+def select_lines(data: np.ndarray, labels: np.ndarray, kind: int, prefix: bytes) -> np.ndarray:
+
+    '''
+    Gathers the characters of all lines of one kind, with their prefix blanked out.
+
+    Args:
+        data: uint8 view of the file.
+        labels: The line kind of every character.
+        kind: Kind of the lines to gather.
+        prefix: Prefix letters to replace with spaces.
+
+    Returns:
+        uint8 array of the lines, still separated by newlines.
+    '''
+
+    text = data[labels == kind]
+    for letter in prefix:
+        text[text == letter] = SPACE
+
+    return text
+
+def resolve_indices(indices: np.ndarray, count: int) -> np.ndarray:
+
+    '''
+    Turns 1-based OBJ indices, negative ones counting back from the end, into 0-based ones.
+
+    Args:
+        indices: The OBJ indices.
+        count: Number of elements defined in the file.
+
+    Returns:
+        0-based indices.
+    '''
+
+    return np.where(indices > 0, indices - 1, indices + count)
+
+def load_obj(path: str) -> Mesh:
+
+    '''
+    Loads the triangles of a Wavefront OBJ file.
+
+    The file is classified line by line and every kind of line is parsed in one
+    vectorized pass over a view of the mapped file. Polygons are fan triangulated,
+    texture coordinates are flipped to the top-down image rows used by the textures
+    and normals are computed when the file has none.
+
+    Args:
+        path: Path to the .obj file.
+
+    Returns:
+        The Mesh, one vertex per distinct position, uv and normal combination.
+    '''
+
+    data = np.frombuffer(map_file(path), dtype=np.uint8)
+
+    newlines = np.flatnonzero(data == NEWLINE)
+    starts = np.concatenate(([0], newlines + 1))
+    lengths = np.concatenate((newlines, [len(data)])) - starts
+
+    # kind of every line from its first two characters.
+    last = len(data) - 1
+    first = np.where(lengths > 0, data[np.minimum(starts, last)], 0)
+    second = np.where(lengths > 1, data[np.minimum(starts + 1, last)], 0)
+    blank = (second == SPACE) | (second == TAB)
+
+    kinds = np.full(len(starts), OTHER_LINE, dtype=np.uint8)
+    kinds[(first == LETTER_V) & blank] = POSITION_LINE
+    kinds[(first == LETTER_V) & (second == LETTER_T)] = UV_LINE
+    kinds[(first == LETTER_V) & (second == LETTER_N)] = NORMAL_LINE
+    kinds[(first == LETTER_F) & blank] = FACE_LINE
+
+    # every character takes the kind of its line, the newline included.
+    labels = np.repeat(kinds, lengths + 1)[:len(data)]
+
+    positions = parse_numbers(select_lines(data, labels, POSITION_LINE, b"v"), np.float32)[:, 0:3]
+    uvs = np.zeros((0, 2), dtype=np.float32)
+    normals = np.zeros((0, 3), dtype=np.float32)
+    if (kinds == UV_LINE).any():
+        uvs = parse_numbers(select_lines(data, labels, UV_LINE, b"vt"), np.float32)[:, 0:2]
+    if (kinds == NORMAL_LINE).any():
+        normals = parse_numbers(select_lines(data, labels, NORMAL_LINE, b"vn"), np.float32)[:, 0:3]
+
+    text = select_lines(data, labels, FACE_LINE, b"f")
+    if len(text) == 0:
+        return Mesh(np.zeros((0, FLOATS_PER_VERTEX), dtype=np.float32))
+
+    # corners per face are the tokens per line.
+    newlines = text == NEWLINE
+    separators = (text == SPACE) | (text == TAB) | newlines | (text == RETURN)
+    token_starts = ~separators
+    token_starts[1:] &= separators[:-1]
+
+    line_end = np.flatnonzero(newlines)
+    line_starts = np.concatenate(([0], line_end + 1))
+    line_starts = line_starts[line_starts < len(text)]
+    corner_counts = np.add.reduceat(token_starts.view(np.uint8), line_starts, dtype=np.int64)
+
+    # the first corner tells the format: v, v/vt, v//vn or v/vt/vn.
+    token = text[:line_end[0] if len(line_end) else len(text)].tobytes().split()[0]
+    slashes = token.count(b"/")
+    has_uv = slashes >= 1 and b"//" not in token
+    has_normal = slashes == 2
+
+    text[text == SLASH] = SPACE
+    refs = parse_numbers(text, np.int64, 1 + has_uv + has_normal)
+    if len(refs) != int(corner_counts.sum()):
+        raise ValueError(f"{path} mixes face formats")
+
+    # fan triangulation (0, k + 1, k + 2) of every face.
+    triangle_counts = np.maximum(corner_counts - 2, 0)
+    face_starts = np.cumsum(corner_counts) - corner_counts
+    faces = np.repeat(np.arange(len(corner_counts)), triangle_counts)
+    fans = np.arange(int(triangle_counts.sum())) - np.repeat(np.cumsum(triangle_counts) - triangle_counts, triangle_counts)
+    corners = face_starts[faces, None] + np.stack((np.zeros_like(fans), fans + 1, fans + 2), axis=1)
+
+    # corners referencing the same attributes become one vertex, compared by one
+    # integer key per corner unless the attribute counts are too large to combine.
+    counts = [len(positions)] + [len(uvs)] * has_uv + [len(normals)] * has_normal
+    columns = [resolve_indices(refs[:, column], count) for column, count in enumerate(counts)]
+    if np.prod(counts, dtype=np.float64) < 2 ** 62:
+        keys, indices = weld_vertices(np.ravel_multi_index(columns, counts), corners.ravel())
+        columns = np.unravel_index(keys, counts)
+    else:
+        refs, indices = weld_vertices(np.stack(columns, axis=1), corners.ravel())
+        columns = refs.T
+
+    vertex_uvs = None
+    vertex_normals = None
+    if has_uv:
+        vertex_uvs = uvs[columns[1]]
+        vertex_uvs[:, 1] = 1 - vertex_uvs[:, 1]
+    if has_normal:
+        vertex_normals = normals[columns[-1]]
+
+    return Mesh.from_arrays(positions[columns[0]], vertex_uvs, vertex_normals, indices)
+
+def read_accessor(document: dict, binary: memoryview, index: int) -> np.ndarray:
+
+    '''
+    Views the elements of a glTF accessor in the binary chunk without copying them.
+
+    Args:
+        document: The parsed glTF JSON.
+        binary: The GLB binary chunk.
+        index: Index of the accessor.
+
+    Returns:
+        (count, components) array, a strided view when the buffer view interleaves
+        attributes, converted to floats if the accessor is normalized.
+    '''
+
+    accessor = document["accessors"][index]
+    if "sparse" in accessor or "bufferView" not in accessor:
+        raise ValueError("sparse glTF accessors are not supported")
+
+    view = document["bufferViews"][accessor["bufferView"]]
+    if binary is None or view.get("buffer", 0) != 0:
+        raise ValueError("glTF buffers outside the GLB binary chunk are not supported")
+
+    dtype = np.dtype(COMPONENT_TYPES[accessor["componentType"]]).newbyteorder("<")
+    components = TYPE_SIZES[accessor["type"]]
+    offset = view.get("byteOffset", 0) + accessor.get("byteOffset", 0)
+    stride = view.get("byteStride", dtype.itemsize * components)
+
+    values = np.ndarray((accessor["count"], components), dtype=dtype, buffer=binary, offset=offset,
+                        strides=(stride, dtype.itemsize))
+
+    if accessor.get("normalized") and dtype.kind in "iu":
+        values = np.maximum(values / np.float32(np.iinfo(dtype).max), -1).astype(np.float32)
+
+    return values
+
+def get_node_mx(node: dict) -> np.ndarray:
+
+    '''
+    Computes the local transform of a glTF node.
+
+    Args:
+        node: The node's JSON object.
+
+    Returns:
+        4x4 float32 matrix in the row-vector convention of the transform store.
+    '''
+
+    # glTF stores column-vector matrices column by column, read row by row that is the row-vector matrix.
+    if "matrix" in node:
+        return np.array(node["matrix"], dtype=np.float32).reshape(4, 4)
+
+    x, y, z, w = node.get("rotation", (0, 0, 0, 1))
+    rotation = np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y + z * w), 2 * (x * z - y * w)],
+        [2 * (x * y - z * w), 1 - 2 * (x * x + z * z), 2 * (y * z + x * w)],
+        [2 * (x * z + y * w), 2 * (y * z - x * w), 1 - 2 * (x * x + y * y)]
+    ], dtype=np.float32)
+
+    matrix = np.identity(4, dtype=np.float32)
+    matrix[:3, :3] = np.array(node.get("scale", (1, 1, 1)), dtype=np.float32)[:, None] * rotation
+    matrix[3, :3] = node.get("translation", (0, 0, 0))
+
+    return matrix
+
+def load_glb(path: str) -> Mesh:
+
+    '''
+    Loads the triangles of a binary glTF 2.0 file.
+
+    Vertex attributes and indices are read as views of the mapped binary chunk. The
+    triangle primitives of all meshes in the default scene are transformed by their
+    nodes and merged into one mesh. glTF texture coordinates already start at the top
+    of the image and are used as they are.
+
+    Args:
+        path: Path to the .glb file.
+
+    Returns:
+        The Mesh.
+    '''
+
+    buffer = memoryview(map_file(path))
+    magic, version, length = struct.unpack_from(GLB_HEADER, buffer, 0)
+    if magic != GLB_MAGIC or version != 2:
+        raise ValueError(f"{path} is not a binary glTF 2.0 file")
+
+    document = None
+    binary = None
+    offset = struct.calcsize(GLB_HEADER)
+    while offset < length:
+        chunk_length, chunk_type = struct.unpack_from(CHUNK_HEADER, buffer, offset)
+        chunk = buffer[offset + 8:offset + 8 + chunk_length]
+        if chunk_type == JSON_CHUNK:
+            document = json.loads(bytes(chunk))
+        elif chunk_type == BIN_CHUNK and binary is None:
+            binary = chunk
+        offset += 8 + chunk_length
+
+    if document is None:
+        raise ValueError(f"{path} has no JSON chunk")
+
+    # (mesh, world matrix) of every node with a mesh, all meshes untransformed without scenes.
+    instances = []
+    scenes = document.get("scenes")
+    if scenes:
+        nodes = document.get("nodes", [])
+        stack = [(root, np.identity(4, dtype=np.float32)) for root in scenes[document.get("scene", 0)].get("nodes", [])]
+        while stack:
+            index, parent = stack.pop()
+            node = nodes[index]
+            matrix = get_node_mx(node) @ parent
+            if "mesh" in node:
+                instances.append((node["mesh"], matrix))
+            stack.extend((child, matrix) for child in node.get("children", []))
+    else:
+        instances = [(index, None) for index in range(len(document.get("meshes", [])))]
+
+    vertices = []
+    indices = []
+    vertex_count = 0
+    for mesh_index, matrix in instances:
+        for primitive in document["meshes"][mesh_index]["primitives"]:
+            if primitive.get("mode", TRIANGLES) != TRIANGLES:
+                continue
+
+            attributes = primitive["attributes"]
+            positions = read_accessor(document, binary, attributes["POSITION"])
+            uvs = None
+            normals = None
+            if "TEXCOORD_0" in attributes:
+                uvs = read_accessor(document, binary, attributes["TEXCOORD_0"])
+            if "NORMAL" in attributes:
+                normals = read_accessor(document, binary, attributes["NORMAL"])
+
+            if "indices" in primitive:
+                primitive_indices = read_accessor(document, binary, primitive["indices"]).ravel()
+            else:
+                primitive_indices = np.arange(len(positions), dtype=np.uint32)
+
+            if matrix is not None and not np.array_equal(matrix, np.identity(4)):
+                positions = positions @ matrix[:3, :3] + matrix[3, :3]
+                if normals is not None:
+                    normals = normals @ TransformStore.get_normal_mxs(matrix[None])[0]
+                    normals = normals / np.maximum(np.linalg.norm(normals, axis=1, keepdims=True), 1e-12)
+
+            mesh = Mesh.from_arrays(positions, uvs, normals, primitive_indices)
+            vertices.append(mesh.vertices)
+            indices.append(mesh.indices + np.uint32(vertex_count))
+            vertex_count += mesh.vertex_count
+
+    if not vertices:
+        return Mesh(np.zeros((0, FLOATS_PER_VERTEX), dtype=np.float32))
+
+    return Mesh(np.concatenate(vertices), np.concatenate(indices))
+
+# loaders by file extension.
+LOADERS = {".obj": load_obj, ".glb": load_glb}
+
+def load_mesh(path: str) -> Mesh:
+
+    '''
+    Loads a mesh file, picking the loader by its extension.
+
+    Args:
+        path: Path to an .obj or .glb file.
+
+    Returns:
+        The Mesh.
+    '''
+
+    loader = LOADERS.get(os.path.splitext(path)[1].lower())
+    if loader is None:
+        raise ValueError(f"unsupported mesh format: {path}")
+
+    return loader(path)
@@ -0,0 +1,358 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import numpy as np
+from Culling import compute_aabbs, extract_frustum_planes, classify_boxes
+
+# the whole screen in normalized device coordinates: (left, right, bottom, top).
+FULL_RECT = (-1.0, 1.0, -1.0, 1.0)
+
+def intersect_rects(a: tuple, b: tuple) -> tuple:
+
+    '''
+    Returns the intersection of two screen rectangles, None if it is empty.
+    '''
+
+    rect = (max(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), min(a[3], b[3]))
+    if rect[0] >= rect[1] or rect[2] >= rect[3]:
+        return None
+
+    return rect
+
+def contains_rect(outer: tuple, inner: tuple) -> bool:
+
+    '''
+    Returns True if a screen rectangle lies within another.
+    '''
+
+    return outer[0] <= inner[0] and inner[1] <= outer[1] and outer[2] <= inner[2] and inner[3] <= outer[3]
+
+def project_polygon(corners: np.ndarray, clip_mx: np.ndarray, min_w: float = 1e-5) -> tuple:
+
+    '''
+    Finds the screen rectangle around a convex polygon, clipped against the plane
+    just in front of the eye so corners behind the camera do not flip over.
+
+    Args:
+        corners: (K, 3) world-space corners in order around the polygon.
+        clip_mx: The camera's view-projection matrix.
+        min_w: Smallest clip-space w kept.
+
+    Returns:
+        (left, right, bottom, top) in normalized device coordinates, None if the
+        polygon is entirely behind the eye.
+    '''
+
+    points = np.hstack((corners, np.ones((len(corners), 1)))) @ clip_mx
+
+    # Sutherland-Hodgman against w >= min_w.
+    clipped = []
+    for index in range(len(points)):
+        current = points[index]
+        following = points[(index + 1) % len(points)]
+        if current[3] >= min_w:
+            clipped.append(current)
+        if (current[3] >= min_w) != (following[3] >= min_w):
+            t = (min_w - current[3]) / (following[3] - current[3])
+            clipped.append(current + t * (following - current))
+
+    if not clipped:
+        return None
+
+    clipped = np.array(clipped)
+    ndc = clipped[:, 0:2] / clipped[:, 3:4]
+
+    return (float(ndc[:, 0].min()), float(ndc[:, 0].max()), float(ndc[:, 1].min()), float(ndc[:, 1].max()))
+
+class PortalGraph:
+
+    '''
+    Partition of a scene into cells (rooms, axis-aligned boxes) linked by portals
+    (doorways, convex polygons), with the traversal that finds the cells visible
+    from a camera. Needs no GL context.
+    '''
+
+    def __init__(self):
+
+        '''
+        Initializes an empty graph.
+        '''
+
+        self.cell_min = np.zeros((0, 3), dtype=np.float64)
+        self.cell_max = np.zeros((0, 3), dtype=np.float64)
+        self.names = []
+
+        # per portal: the two cells it links and its corners.
+        self.portals = []
+
+        # per cell: indices of its portals, in the order they were added.
+        self.cell_portals = []
+
+    @property
+    def cell_count(self) -> int:
+        return len(self.names)
+
+    def add_cell(self, box_min, box_max, name: str = None) -> int:
+
+        '''
+        Adds a cell.
+
+        Args:
+            box_min: Minimum corner of the cell's box.
+            box_max: Maximum corner of the cell's box.
+            name: Optional name, e.g. of the room.
+
+        Returns:
+            The cell index.
+        '''
+
+        self.cell_min = np.vstack((self.cell_min, np.asarray(box_min, dtype=np.float64)))
+        self.cell_max = np.vstack((self.cell_max, np.asarray(box_max, dtype=np.float64)))
+        self.names.append(name if name is not None else f"cell {len(self.names)}")
+        self.cell_portals.append([])
+
+        return len(self.names) - 1
+
+    def add_portal(self, cell_a: int, cell_b: int, corners) -> int:
+
+        '''
+        Links two cells through a portal, visible from both sides.
+
+        Args:
+            cell_a: Index of one cell.
+            cell_b: Index of the other cell.
+            corners: (K, 3) world-space corners of the opening, in order around it.
+
+        Returns:
+            The portal index.
+        '''
+
+        corners = np.asarray(corners, dtype=np.float64).reshape(-1, 3)
+        if len(corners) < 3:
+            raise ValueError("a portal needs at least three corners")
+
+        index = len(self.portals)
+        self.portals.append((cell_a, cell_b, corners))
+        self.cell_portals[cell_a].append(index)
+        self.cell_portals[cell_b].append(index)
+
+        return index
+
+    def find_cell(self, point) -> int:
+
+        '''
+        Returns the first cell containing a point, -1 if no cell does.
+        '''
+
+        point = np.asarray(point, dtype=np.float64)[:3]
+        inside = np.flatnonzero(((self.cell_min <= point) & (point <= self.cell_max)).all(axis=1))
+
+        return int(inside[0]) if len(inside) else -1
+
+    def get_overlaps(self, box_min: np.ndarray, box_max: np.ndarray) -> np.ndarray:
+
+        '''
+        Finds the cells every box overlaps, objects spanning a doorway belong to both rooms.
+
+        Args:
+            box_min: (N, 3) box minimums.
+            box_max: (N, 3) box maximums.
+
+        Returns:
+            (N, cells) boolean overlap flags.
+        '''
+
+        return ((box_min[:, None, :] <= self.cell_max[None]) & (self.cell_min[None] <= box_max[:, None, :])).all(axis=2)
+
+    def is_in_portal(self, portal: int, eye: np.ndarray, margin: float) -> bool:
+
+        '''
+        Returns True if the eye is within margin of a portal's opening, where the
+        opening projects edge-on and its screen rectangle says nothing.
+        '''
+
+        _, _, corners = self.portals[portal]
+        normal = np.cross(corners[1] - corners[0], corners[2] - corners[0])
+        normal /= np.linalg.norm(normal)
+
+        if abs(np.dot(eye - corners[0], normal)) > margin:
+            return False
+
+        return bool(((corners.min(axis=0) - margin <= eye) & (eye <= corners.max(axis=0) + margin)).all())
+
+    def traverse(self, eye, clip_mx: np.ndarray, margin: float = 0.1) -> list:
+
+        '''
+        Walks the portals from the eye's cell depth first, narrowing the screen
+        rectangle to each portal it passes through. Portals are followed in the
+        order they were added, so the result only depends on the inputs.
+
+        Args:
+            eye: World-space camera position.
+            clip_mx: The camera's view-projection matrix.
+            margin: Distance from a portal within which the eye counts as standing
+                in the doorway, about the near plane distance.
+
+        Returns:
+            Per cell the bounding rectangle of the screen regions it is seen through,
+            None for cells that are not visible; None instead of the list when the
+            eye is outside every cell.
+        '''
+
+        eye = np.asarray(eye, dtype=np.float64)[:3]
+        start = self.find_cell(eye)
+        if start < 0:
+            return None
+
+        clip_mx = np.asarray(clip_mx, dtype=np.float64)
+        rects = [None] * self.cell_count
+        projected = {}
+
+        # (cell, rectangle it is seen through, cells on the path to it).
+        stack = [(start, FULL_RECT, (start,))]
+        while stack:
+            cell, rect, path = stack.pop()
+
+            # a cell seen again through a part of the screen it was already seen through adds nothing.
+            seen = rects[cell]
+            if seen is not None and contains_rect(seen, rect):
+                continue
+            rects[cell] = rect if seen is None else (min(seen[0], rect[0]), max(seen[1], rect[1]),
+                                                     min(seen[2], rect[2]), max(seen[3], rect[3]))
+
+            # pushed in reverse so portals are walked in the order they were added.
+            for portal in reversed(self.cell_portals[cell]):
+                cell_a, cell_b, corners = self.portals[portal]
+                neighbor = cell_b if cell_a == cell else cell_a
+                if neighbor in path:
+                    continue
+
+                if self.is_in_portal(portal, eye, margin):
+                    portal_rect = rect
+                else:
+                    if portal not in projected:
+                        projected[portal] = project_polygon(corners, clip_mx)
+                    if projected[portal] is None:
+                        continue
+                    portal_rect = intersect_rects(rect, projected[portal])
+
+                if portal_rect is not None:
+                    stack.append((neighbor, portal_rect, path + (neighbor,)))
+
+        return rects
+
+class PortalCuller:
+
+    '''
+    Rejects objects whose cells are not visible through the portals from the camera's
+    cell, and objects outside the part of the frustum their cell is seen through.
+    Objects outside every cell are left to the frustum culler.
+    '''
+
+    def __init__(self, graph: PortalGraph):
+
+        '''
+        Initializes the culler.
+
+        Args:
+            graph: The scene's cells and portals.
+        '''
+
+        self.graph = graph
+
+        # world-space boxes and cell overlaps of the transform store's rows.
+        self.box_min = np.zeros((0, 3), dtype=np.float32)
+        self.box_max = np.zeros((0, 3), dtype=np.float32)
+        self.overlaps = np.zeros((0, graph.cell_count), dtype=bool)
+
+        # statistics of the last cull.
+        self.cells_visible = 0
+        self.cells_rejected = 0
+        self.objects_rejected = 0
+
+    def update(self, matrices: np.ndarray, changed: np.ndarray, local_min: np.ndarray, local_max: np.ndarray):
+
+        '''
+        Recomputes the boxes and cells of rows that moved or were added.
+
+        Args:
+            matrices: (N, 4, 4) model matrices of the transform store.
+            changed: (N,) flags of matrices that changed this frame.
+            local_min: (N, 3) local box minimums of the objects' meshes.
+            local_max: (N, 3) local box maximums of the objects' meshes.
+        '''
+
+        count = len(matrices)
+        if count != len(self.box_min) or self.overlaps.shape[1] != self.graph.cell_count:
+            rows = np.arange(count)
+            self.box_min = np.zeros((count, 3), dtype=np.float32)
+            self.box_max = np.zeros((count, 3), dtype=np.float32)
+            self.overlaps = np.zeros((count, self.graph.cell_count), dtype=bool)
+        else:
+            rows = np.flatnonzero(changed[:count])
+
+        if len(rows) == 0:
+            return
+
+        centers, half_extents = compute_aabbs(matrices[rows], local_min[rows], local_max[rows])
+        self.box_min[rows] = centers - half_extents
+        self.box_max[rows] = centers + half_extents
+        self.overlaps[rows] = self.graph.get_overlaps(self.box_min[rows], self.box_max[rows])
+
+    def cull(self, matrices: np.ndarray, changed: np.ndarray, clip_mx: np.ndarray, eye: np.ndarray,
+             visible: np.ndarray, local_min: np.ndarray, local_max: np.ndarray) -> np.ndarray:
+
+        '''
+        Narrows the frustum culler's result to the objects seen through the portals.
+
+        Args:
+            matrices: (N, 4, 4) model matrices of the transform store.
+            changed: (N,) flags of matrices that changed this frame.
+            clip_mx: The camera's view-projection matrix.
+            eye: The camera position.
+            visible: (N,) flags of the objects inside the view frustum.
+            local_min: (N, 3) local box minimums of the objects' meshes.
+            local_max: (N, 3) local box maximums of the objects' meshes.
+
+        Returns:
+            (N,) boolean visibility flags.
+        '''
+
+        self.update(matrices, changed, local_min, local_max)
+
+        rects = self.graph.traverse(eye, clip_mx)
+        if rects is None:
+            # outside every cell there are no walls to hide anything.
+            self.cells_visible = self.graph.cell_count
+            self.cells_rejected = 0
+            self.objects_rejected = 0
+            return visible
+
+        count = len(visible)
+        in_cells = self.overlaps.any(axis=1)
+        seen = ~in_cells
+
+        # an object is seen if it is inside the frustum through any visible cell it overlaps.
+        cells = [cell for cell, rect in enumerate(rects) if rect is not None]
+        for cell in cells:
+            rows = np.flatnonzero(self.overlaps[:, cell] & visible[:count] & ~seen)
+            if len(rows) == 0:
+                continue
+
+            centers = (self.box_min[rows] + self.box_max[rows]) * 0.5
+            half_extents = (self.box_max[rows] - self.box_min[rows]) * 0.5
+            outside, _ = classify_boxes(extract_frustum_planes(clip_mx, rects[cell]), centers, half_extents)
+            seen[rows[~outside]] = True
+
+        result = visible[:count] & seen
+
+        self.cells_visible = len(cells)
+        self.cells_rejected = self.graph.cell_count - len(cells)
+        self.objects_rejected = int((visible[:count] & ~result).sum())
+
+        return result
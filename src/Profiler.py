@@ -0,0 +1,403 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+from collections import Counter
+import csv
+import json
+import os
+import time
+import numpy as np
+from GLBackend import *
+
+class GLCallCounter:
+
+    '''
+    Counts GL calls by function name by wrapping the gl* functions that modules
+    imported with "from GLBackend import *".
+    '''
+
+    def __init__(self):
+
+        '''
+        Initializes an uninstalled counter.
+        '''
+
+        self.counts = Counter()
+        self.originals = []
+
+    def install(self, modules: list):
+
+        '''
+        Replaces the gl* functions in the globals of the given modules with counting wrappers.
+
+        Args:
+            modules: Modules whose GL calls should be counted.
+        '''
+
+        for module in modules:
+            for name, function in list(vars(module).items()):
+                if name.startswith("gl") and callable(function) and not hasattr(function, "counted"):
+                    self.originals.append((module, name, function))
+                    setattr(module, name, self.wrap(name, function))
+
+    def wrap(self, name: str, function):
+
+        '''
+        Returns a wrapper of a GL function that counts its calls.
+        '''
+
+        counts = self.counts
+
+        def counted(*args, **kwargs):
+            counts[name] += 1
+            return function(*args, **kwargs)
+
+        counted.counted = True
+        return counted
+
+    def uninstall(self):
+
+        '''
+        Restores the original GL functions.
+        '''
+
+        for module, name, function in self.originals:
+            setattr(module, name, function)
+
+        self.originals = []
+
+    def take(self) -> Counter:
+
+        '''
+        Returns the counts since the last call and resets them.
+        '''
+
+        counts = Counter(self.counts)
+        self.counts.clear()
+
+        return counts
+
+class GPUTimer:
+
+    '''
+    Measures GPU time with GL_TIME_ELAPSED queries. Several queries are kept in
+    flight so reading a result never waits for the GPU, results therefore arrive
+    a few frames late.
+    '''
+
+    def __init__(self, latency: int = 4):
+
+        '''
+        Initializes the timer, the query objects are created on first use.
+
+        Args:
+            latency: Number of queries in flight.
+        '''
+
+        self.latency = latency
+        self.queries = []
+        self.pending = []
+        self.active = False
+        self.available = None
+
+    def create_queries(self):
+
+        '''
+        Creates the query objects, disabling the timer when timer queries are not available.
+        '''
+
+        try:
+            self.queries = [int(query) for query in np.atleast_1d(glGenQueries(self.latency))]
+            self.available = True
+        except Exception:
+            # timer queries need GL 3.3 or ARB_timer_query.
+            self.available = False
+
+    def begin(self, tag):
+
+        '''
+        Starts timing the GPU work of a frame, skipped if every query is still in flight.
+
+        Args:
+            tag: Returned together with the frame's result.
+        '''
+
+        if self.available is None:
+            self.create_queries()
+
+        if not self.available or len(self.pending) == len(self.queries):
+            return
+
+        query = self.queries[len(self.pending)]
+        glBeginQuery(GL_TIME_ELAPSED, query)
+        self.pending.append((query, tag))
+        self.active = True
+
+    def end(self):
+
+        '''
+        Stops timing the current frame.
+        '''
+
+        if self.active:
+            glEndQuery(GL_TIME_ELAPSED)
+            self.active = False
+
+    def collect(self) -> list:
+
+        '''
+        Returns (tag, milliseconds) of the oldest finished queries.
+        '''
+
+        times = []
+        while self.pending and not self.active:
+            query, tag = self.pending[0]
+            if not glGetQueryObjectiv(query, GL_QUERY_RESULT_AVAILABLE):
+                break
+
+            # 32-bit nanoseconds cover frames of up to four seconds.
+            times.append((tag, int(glGetQueryObjectuiv(query, GL_QUERY_RESULT)) / 1e6))
+
+            # recycle the query at the back of the list.
+            self.pending.pop(0)
+            self.queries.remove(query)
+            self.queries.append(query)
+
+        return times
+
+    def release(self):
+
+        '''
+        Deletes the query objects.
+        '''
+
+        if self.available and self.queries:
+            glDeleteQueries(len(self.queries), self.queries)
+
+        self.queries = []
+        self.pending = []
+
+class FrameProfiler:
+
+    '''
+    Records the CPU time of every phase of a frame, the GPU time of the frame and
+    the GL calls it made into a ring buffer of the last frames, and summarizes them
+    as percentiles.
+    '''
+
+    PHASES = ("events", "update", "textures", "camera", "display", "swap", "sleep")
+
+    def __init__(self, history: int = 600, gpu_timing: bool = True, count_gl_calls: bool = True):
+
+        '''
+        Initializes the profiler.
+
+        Args:
+            history: Number of frames kept in the ring buffer.
+            gpu_timing: Time GPU work with GL_TIME_ELAPSED queries, needs a GL context.
+            count_gl_calls: Count GL calls by function once install is called.
+        '''
+
+        self.history = history
+        self.columns = self.PHASES + ("frame", "gpu")
+
+        # milliseconds per frame and column, NaN where nothing was measured.
+        self.samples = np.full((history, len(self.columns)), np.nan)
+        self.frame = 0
+        self.row = None
+
+        self.phase = None
+        self.phase_start = 0.0
+        self.frame_start = 0.0
+
+        self.gpu_timer = GPUTimer() if gpu_timing else None
+
+        self.gl_calls = GLCallCounter() if count_gl_calls else None
+        self.gl_call_totals = Counter()
+        self.gl_calls_last_frame = Counter()
+
+    def install(self, modules: list):
+
+        '''
+        Starts counting the GL calls of the given modules.
+
+        Args:
+            modules: Modules that call GL through "from GLBackend import *".
+        '''
+
+        if self.gl_calls is not None:
+            self.gl_calls.install(modules)
+
+    def begin_frame(self):
+
+        '''
+        Starts a frame, reusing the oldest row of the ring buffer.
+        '''
+
+        self.row = self.frame % self.history
+        self.samples[self.row] = np.nan
+
+        # calls made between frames, such as loading objects, are not attributed to a frame.
+        if self.gl_calls is not None:
+            self.gl_calls.take()
+
+        if self.gpu_timer is not None:
+            self.gpu_timer.begin(self.frame)
+
+        self.frame_start = time.perf_counter()
+
+    def begin_phase(self, name: str):
+
+        '''
+        Starts timing a phase, ending the previous one.
+
+        Args:
+            name: One of PHASES.
+        '''
+
+        now = time.perf_counter()
+        self.end_phase(now)
+
+        self.phase = self.columns.index(name)
+        self.phase_start = now
+
+    def end_phase(self, now: float = None):
+
+        '''
+        Stops timing the current phase.
+        '''
+
+        if self.phase is None:
+            return
+
+        if now is None:
+            now = time.perf_counter()
+
+        self.samples[self.row, self.phase] = (now - self.phase_start) * 1000.0
+        self.phase = None
+
+    def end_frame(self):
+
+        '''
+        Ends the frame and collects finished GPU timings.
+        '''
+
+        now = time.perf_counter()
+        self.end_phase(now)
+        self.samples[self.row, self.columns.index("frame")] = (now - self.frame_start) * 1000.0
+
+        if self.gpu_timer is not None:
+            self.gpu_timer.end()
+
+            # results arrive late, drop those whose row was already reused.
+            gpu = self.columns.index("gpu")
+            for frame, milliseconds in self.gpu_timer.collect():
+                if self.frame - frame < self.history:
+                    self.samples[frame % self.history, gpu] = milliseconds
+
+        if self.gl_calls is not None:
+            self.gl_calls_last_frame = self.gl_calls.take()
+            self.gl_call_totals.update(self.gl_calls_last_frame)
+
+        self.frame += 1
+
+    def get_samples(self) -> np.ndarray:
+
+        '''
+        Returns the recorded rows, oldest first.
+        '''
+
+        if self.frame < self.history:
+            return self.samples[:self.frame]
+
+        return np.roll(self.samples, -(self.frame % self.history), axis=0)
+
+    def summary(self) -> dict:
+
+        '''
+        Summarizes the frames in the ring buffer.
+
+        Returns:
+            A dict with the frame count, p50/p95/p99/mean milliseconds of every
+            measured column and the GL calls per frame by function.
+        '''
+
+        samples = self.get_samples()
+        phases = {}
+        for column, name in enumerate(self.columns):
+            values = samples[:, column]
+            values = values[~np.isnan(values)]
+            if len(values) == 0:
+                continue
+
+            p50, p95, p99 = np.percentile(values, [50, 95, 99])
+            phases[name] = {
+                "p50": float(p50),
+                "p95": float(p95),
+                "p99": float(p99),
+                "mean": float(values.mean()),
+            }
+
+        frames = max(self.frame, 1)
+        return {
+            "frames": len(samples),
+            "phases": phases,
+            "gl_calls_per_frame": {
+                name: count / frames for name, count in self.gl_call_totals.most_common()
+            },
+        }
+
+    def export(self, path: str):
+
+        '''
+        Writes the summary to a file, as CSV (one row per phase) or JSON depending
+        on the extension.
+
+        Args:
+            path: Output path ending in .csv or .json.
+        '''
+
+        summary = self.summary()
+
+        if os.path.splitext(path)[1].lower() == ".csv":
+            with open(path, "w", newline="") as f:
+                writer = csv.writer(f)
+                writer.writerow(["phase", "p50_ms", "p95_ms", "p99_ms", "mean_ms"])
+                for name, stats in summary["phases"].items():
+                    writer.writerow([name, stats["p50"], stats["p95"], stats["p99"], stats["mean"]])
+            return
+
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2)
+
+    def format_overlay(self) -> str:
+
+        '''
+        Returns a one-line summary for the window title.
+        '''
+
+        phases = self.summary()["phases"]
+        parts = [
+            f"{name} {stats['p50']:.2f}/{stats['p99']:.2f}"
+            for name, stats in phases.items()
+        ]
+
+        calls = sum(self.gl_calls_last_frame.values())
+        return f"p50/p99 ms: {' '.join(parts)} | GL calls {calls}"
+
+    def release(self):
+
+        '''
+        Restores the GL functions and deletes the GPU queries.
+        '''
+
+        if self.gl_calls is not None:
+            self.gl_calls.uninstall()
+
+        if self.gpu_timer is not None:
+            self.gpu_timer.release()
@@ -0,0 +1,241 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import time
+import numpy as np
+from GLBackend import *
+
+class StateTracker:
+
+    '''
+    Mirrors the bound program, vertex array and textures and drops binds that would
+    not change the GL state.
+    '''
+
+    def __init__(self):
+
+        '''
+        Initializes the tracker with unknown state.
+        '''
+
+        self.program = None
+        self.vao = None
+        self.active_unit = None
+        self.textures = {}
+
+        # binds asked for and binds sent to GL.
+        self.requested = 0
+        self.issued = 0
+
+    def reset(self):
+
+        '''
+        Forgets the mirrored state, e.g. after code outside the tracker changed bindings.
+        '''
+
+        self.program = None
+        self.vao = None
+        self.active_unit = None
+        self.textures = {}
+
+    def reset_counters(self):
+
+        '''
+        Resets the bind counters.
+        '''
+
+        self.requested = 0
+        self.issued = 0
+
+    def use_program(self, program):
+
+        '''
+        Makes a ShaderProgram current unless it already is.
+        '''
+
+        self.requested += 1
+        if program is self.program:
+            return
+
+        program.use()
+        self.program = program
+        self.issued += 1
+
+    def bind_vertex_array(self, vao: int):
+
+        '''
+        Binds a vertex array object unless it is already bound.
+        '''
+
+        self.requested += 1
+        if vao == self.vao:
+            return
+
+        glBindVertexArray(vao)
+        self.vao = vao
+        self.issued += 1
+
+    def bind_texture(self, target, texture: int, unit: int = 0):
+
+        '''
+        Binds a texture to a texture unit unless it is already bound there.
+
+        Args:
+            target: Texture target, e.g. GL_TEXTURE_2D.
+            texture: GL texture name.
+            unit: Texture unit index.
+        '''
+
+        self.requested += 1
+        if self.textures.get((unit, target)) == texture:
+            return
+
+        if unit != self.active_unit:
+            glActiveTexture(GL_TEXTURE0 + unit)
+            self.active_unit = unit
+
+        glBindTexture(target, texture)
+        self.textures[(unit, target)] = texture
+        self.issued += 1
+
+class RenderQueue:
+
+    '''
+    Collects draw commands and orders them by a packed 64-bit key so commands that
+    share a program, vertex array and texture are adjacent, front to back within a
+    state.
+
+    Key layout, most significant first:
+        program (10 bits) | vertex array (14 bits) | texture (20 bits) | depth (20 bits)
+    GL names wider than their field only weaken the grouping, the state tracker still
+    compares the real names.
+    '''
+
+    PROGRAM_BITS = 10
+    VAO_BITS = 14
+    TEXTURE_BITS = 20
+    DEPTH_BITS = 20
+
+    def __init__(self, capacity: int = 1024, far: float = 10.0):
+
+        '''
+        Initializes an empty queue.
+
+        Args:
+            capacity: Initial number of commands, the key buffer grows by doubling.
+            far: Depth mapped to the largest depth key.
+        '''
+
+        self.far = far
+        self.items = []
+        self.count = 0
+        self.keys = np.zeros(capacity, dtype=np.uint64)
+
+        # statistics of the last sort.
+        self.sort_seconds = 0.0
+
+    def clear(self):
+
+        '''
+        Empties the queue, keeping its key buffer.
+        '''
+
+        self.items = []
+        self.count = 0
+
+    def reserve(self, capacity: int):
+
+        '''
+        Grows the key buffer to hold at least capacity commands.
+        '''
+
+        if capacity <= len(self.keys):
+            return
+
+        size = len(self.keys)
+        while size < capacity:
+            size *= 2
+
+        keys = np.zeros(size, dtype=np.uint64)
+        keys[:self.count] = self.keys[:self.count]
+        self.keys = keys
+
+    def pack_keys(self, programs, vaos, textures, depths: np.ndarray) -> np.ndarray:
+
+        '''
+        Packs sort keys.
+
+        Args:
+            programs: GL program names, an int or an array.
+            vaos: GL vertex array names.
+            textures: GL texture names.
+            depths: Distances from the camera.
+
+        Returns:
+            The uint64 keys.
+        '''
+
+        depth_max = (1 << self.DEPTH_BITS) - 1
+        depth_keys = np.clip(np.asarray(depths) / self.far * depth_max, 0, depth_max).astype(np.uint64)
+
+        texture_shift = self.DEPTH_BITS
+        vao_shift = texture_shift + self.TEXTURE_BITS
+        program_shift = vao_shift + self.VAO_BITS
+
+        keys = depth_keys
+        keys |= (np.asarray(textures, dtype=np.uint64) & np.uint64((1 << self.TEXTURE_BITS) - 1)) << np.uint64(texture_shift)
+        keys |= (np.asarray(vaos, dtype=np.uint64) & np.uint64((1 << self.VAO_BITS) - 1)) << np.uint64(vao_shift)
+        keys |= (np.asarray(programs, dtype=np.uint64) & np.uint64((1 << self.PROGRAM_BITS) - 1)) << np.uint64(program_shift)
+
+        return keys
+
+    def submit(self, items: list, programs, vaos, textures, depths):
+
+        '''
+        Adds draw commands.
+
+        Args:
+            items: The objects to draw, one per command.
+            programs: GL program name(s) of the commands.
+            vaos: GL vertex array names of the commands.
+            textures: GL texture names of the commands.
+            depths: Distances of the commands from the camera.
+        '''
+
+        count = len(items)
+        if count == 0:
+            return
+
+        self.reserve(self.count + count)
+        self.keys[self.count:self.count + count] = self.pack_keys(programs, vaos, textures, depths)
+        self.items.extend(items)
+        self.count += count
+
+    def sort(self) -> np.ndarray:
+
+        '''
+        Orders the commands by key.
+
+        Returns:
+            Indices into the submitted items, in draw order.
+        '''
+
+        start = time.perf_counter()
+        order = np.argsort(self.keys[:self.count], kind="stable")
+        self.sort_seconds = time.perf_counter() - start
+
+        return order
+
+    def get_sorted_items(self) -> list:
+
+        '''
+        Returns the submitted items in draw order.
+        '''
+
+        items = self.items
+        return [items[index] for index in self.sort()]
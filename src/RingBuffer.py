@@ -0,0 +1,257 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import time
+import ctypes
+import numpy as np
+from GLBackend import *
+
+def supports_persistent_mapping() -> bool:
+
+    '''
+    Returns True if the context has glBufferStorage, core since OpenGL 4.4.
+    '''
+
+    if (glGetIntegerv(GL_MAJOR_VERSION), glGetIntegerv(GL_MINOR_VERSION)) >= (4, 4):
+        return True
+
+    extensions = {glGetStringi(GL_EXTENSIONS, index).decode() for index in range(glGetIntegerv(GL_NUM_EXTENSIONS))}
+    return "GL_ARB_buffer_storage" in extensions
+
+class RingBuffer:
+
+    '''
+    A buffer allocated once with glBufferStorage and mapped persistently and coherently,
+    split into one region per frame in flight. Every frame writes its data straight
+    into the mapping through NumPy views, no copies and no reallocations; a fence per
+    region keeps the CPU from overwriting data the GPU has not read yet.
+
+    Per frame: begin_frame, reserve, allocate (any number of times), draw, end_frame.
+    '''
+
+    # frames in flight, one region each.
+    FRAMES = 3
+
+    # default byte alignment of allocations, enough for any vertex attribute.
+    ALIGNMENT = 16
+
+    # nanoseconds waited per glClientWaitSync call.
+    WAIT_TIMEOUT_NS = 1000000
+
+    def __init__(self, target=GL_ARRAY_BUFFER, frame_size: int = 1 << 20, frames: int = FRAMES):
+
+        '''
+        Creates and maps the buffer.
+
+        Args:
+            target: Binding point the buffer is created on.
+            frame_size: Bytes per frame region, grown by reserve.
+            frames: Number of regions.
+        '''
+
+        self.target = target
+        self.frames = frames
+        self.frame_size = 0
+        self.buffer = None
+        self.view = None
+
+        self.frame = 0
+        self.offset = 0
+        self.fences = [None] * frames
+
+        # counters, waits are fences that were not signaled yet when their region came around.
+        self.waits = 0
+        self.stall_seconds = 0.0
+        self.frame_waits = 0
+        self.frame_stall_seconds = 0.0
+        self.bytes_written = 0
+        self.resizes = 0
+
+        self.create(frame_size)
+
+    @property
+    def region_start(self) -> int:
+        return self.frame * self.frame_size
+
+    def create(self, frame_size: int):
+
+        '''
+        Allocates and maps the storage of all regions.
+
+        Args:
+            frame_size: Bytes per frame region.
+        '''
+
+        flags = GL_MAP_WRITE_BIT | GL_MAP_PERSISTENT_BIT | GL_MAP_COHERENT_BIT
+        size = frame_size * self.frames
+
+        self.buffer = glGenBuffers(1)
+        glBindBuffer(self.target, self.buffer)
+        glBufferStorage(self.target, size, None, flags)
+        pointer = glMapBufferRange(self.target, 0, size, flags)
+        if not pointer:
+            glDeleteBuffers(1, [self.buffer])
+            self.buffer = None
+            raise RuntimeError("persistent buffer mapping failed")
+
+        self.frame_size = frame_size
+        self.view = np.ctypeslib.as_array((ctypes.c_ubyte * size).from_address(pointer))
+
+    def destroy(self):
+
+        '''
+        Unmaps and deletes the storage, the GPU must be done with every region.
+        '''
+
+        for index, fence in enumerate(self.fences):
+            if fence is not None:
+                glDeleteSync(fence)
+                self.fences[index] = None
+
+        if self.buffer is not None:
+            self.view = None
+            glBindBuffer(self.target, self.buffer)
+            glUnmapBuffer(self.target)
+            glDeleteBuffers(1, [self.buffer])
+            self.buffer = None
+
+    def wait(self, index: int):
+
+        '''
+        Waits until the GPU has finished the commands of the frame that last used a region.
+
+        Args:
+            index: The region.
+        '''
+
+        fence = self.fences[index]
+        if fence is None:
+            return
+
+        # a fence that already passed costs no wait.
+        status = glClientWaitSync(fence, 0, 0)
+        if status == GL_TIMEOUT_EXPIRED:
+            start = time.perf_counter()
+            while status == GL_TIMEOUT_EXPIRED:
+                status = glClientWaitSync(fence, GL_SYNC_FLUSH_COMMANDS_BIT, self.WAIT_TIMEOUT_NS)
+
+            stall = time.perf_counter() - start
+            self.waits += 1
+            self.frame_waits += 1
+            self.stall_seconds += stall
+            self.frame_stall_seconds += stall
+
+        glDeleteSync(fence)
+        self.fences[index] = None
+
+    def begin_frame(self):
+
+        '''
+        Moves to the next region, waiting for the GPU if it is still reading it.
+        '''
+
+        self.frame_waits = 0
+        self.frame_stall_seconds = 0.0
+
+        self.frame = (self.frame + 1) % self.frames
+        self.offset = 0
+        self.wait(self.frame)
+
+    def reserve(self, nbytes: int):
+
+        '''
+        Makes sure the current frame can allocate a number of bytes, growing every
+        region if needed. Growing waits for all frames in flight, so it must happen
+        before the frame's first allocation.
+
+        Args:
+            nbytes: Bytes the frame will allocate, including alignment padding.
+        '''
+
+        if nbytes <= self.frame_size:
+            return
+
+        if self.offset:
+            raise RuntimeError("reserve must be called before the frame's first allocation")
+
+        for index in range(self.frames):
+            self.wait(index)
+
+        frame_size = self.frame_size
+        while frame_size < nbytes:
+            frame_size *= 2
+
+        self.destroy()
+        self.create(frame_size)
+        self.resizes += 1
+
+    def allocate(self, shape, dtype=np.float32, alignment: int = ALIGNMENT) -> tuple:
+
+        '''
+        Allocates an array in the current frame's region.
+
+        Args:
+            shape: Shape of the array.
+            dtype: Element type.
+            alignment: Byte alignment of the array's start, e.g. the uniform
+                buffer offset alignment for uniform blocks.
+
+        Returns:
+            (byte offset into the buffer, writable array mapped into it).
+        '''
+
+        dtype = np.dtype(dtype)
+        nbytes = int(np.prod(shape)) * dtype.itemsize
+
+        offset = self.offset + -self.offset % alignment
+        if offset + nbytes > self.frame_size:
+            raise MemoryError(f"ring buffer frame region of {self.frame_size} bytes is full")
+
+        self.offset = offset + nbytes
+        self.bytes_written += nbytes
+
+        start = self.region_start + offset
+        return start, self.view[start:start + nbytes].view(dtype).reshape(shape)
+
+    def end_frame(self):
+
+        '''
+        Fences the commands issued this frame, the region is reused once they finished.
+        '''
+
+        self.fences[self.frame] = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+
+    def release(self):
+
+        '''
+        Waits for the frames in flight and frees the buffer.
+        '''
+
+        for index in range(self.frames):
+            self.wait(index)
+
+        self.destroy()
+
+    def stats(self) -> dict:
+
+        '''
+        Returns the ring counters.
+
+        Returns:
+            A dict with the region size, fence waits and time stalled on them, bytes
+            written and regrowths.
+        '''
+
+        return {
+            "frame_size": self.frame_size,
+            "frames": self.frames,
+            "waits": self.waits,
+            "stall_ms": self.stall_seconds * 1000.0,
+            "bytes_written": self.bytes_written,
+            "resizes": self.resizes,
+        }
@@ -6,26 +6,211 @@ Mail: william_abrahamsson@outlook.com
 Digital Museum
 '''
 
-from OpenGL.GL import *
-from OpenGL.GL.shaders import compileProgram, compileShader
-from sdl2 import *
-from sdl2.video import *
+from GLBackend import *
+from OpenGL import platform
+from ShaderProgram import ShaderProgram
+try:
+    from sdl2 import *
+    from sdl2.video import *
+except ImportError:
+    # headless runs do not need the SDL2 library.
+    SDL_Init = None
 from Camera import Camera
+from InstancedRenderer import InstancedRenderer
+from RenderQueue import RenderQueue, StateTracker
+from Culling import FrustumCuller
+from StaticBatcher import StaticBatcher
+from LevelOfDetail import LODSelector
+from Lighting import ClusteredLighting
+from Portals import PortalCuller
+from IndirectRenderer import IndirectRenderer, supports_gpu_driven
+import TransformStore
+import TextureManager
+import ShaderManager
+from AssetLoader import AssetLoader
+import sys
+import time
 import numpy as np
 
 class Scene:
 
-    def __init__(self):
+    # modules whose GL calls are counted while profiling.
+    PROFILED_MODULES = ("Scene", "Camera", "Cube", "Geometry", "InstancedRenderer", "StaticBatcher",
+                        "ShaderProgram", "ShaderManager", "RenderQueue", "TextureManager", "TextureAtlas", "AssetLoader")
+
+    # longest frame time simulated after a stall, in seconds.
+    MAX_FRAME_TIME = 0.25
+
+    # how long an idle on-demand loop sleeps waiting for input, in milliseconds.
+    IDLE_TIMEOUT_MS = 100
+
+    def __init__(self, instanced: bool = False, async_textures: bool = False, atlas=None, culling: bool = True,
+                 profiler=None, overlay: bool = False, headless: bool = False, tick_rate: float = 60.0,
+                 vsync: bool = True, target_fps: float = None, on_demand: bool = False,
+                 static_batching: bool = False, lod: bool = False, clustered_lights: bool = False,
+                 portals=None, persistent_buffers: bool = True, gpu_driven: bool = False):
         
         '''
         Initializes the scene, setting up the SDL window, OpenGL context,
         shaders, and camera.
+
+        Args:
+            instanced: Draw objects that share a mesh and texture with one
+                instanced draw call per group instead of one call per object.
+            async_textures: Decode textures on background threads, objects are
+                drawn with a placeholder texture until theirs is uploaded.
+            atlas: A built TextureAtlas holding every texture of the scene, objects
+                then refer to atlas regions and each mesh is drawn with one bind.
+                Implies instanced.
+            culling: Skip objects whose bounding box is outside the camera's view frustum.
+            profiler: A FrameProfiler recording the phases of every frame of run.
+            overlay: Show the profiler's percentiles in the window title.
+            headless: Render into an offscreen framebuffer through EGL instead of a window.
+                PyOpenGL picks its platform on its first import, so Headless has to be
+                imported before Scene (or PYOPENGL_PLATFORM=egl set), otherwise a
+                RuntimeError is raised.
+            tick_rate: Simulation ticks per second, angular velocities are in degrees per tick.
+            vsync: Wait for the display's vertical refresh when swapping.
+            target_fps: Sleep to cap the frame rate, for use without vsync.
+            on_demand: Only render after input or while something animates or loads,
+                sleeping otherwise.
+            static_batching: Bake objects that do not rotate into one world-space
+                vertex buffer per texture (or atlas), drawn with one call each.
+            lod: Pick mesh levels of detail and texture mip levels from each object's
+                projected size on screen.
+            clustered_lights: Shade the local lights added with add_light, each fragment
+                only evaluating the lights assigned to its view-space cluster.
+            portals: A PortalGraph of the scene's rooms and doorways, objects in rooms
+                not seen through the doorways from the camera's room are not drawn.
+            persistent_buffers: Stream changing instance data through a persistently
+                mapped, triple-buffered ring buffer (OpenGL 4.4) instead of reallocating
+                each group's buffer.
+            gpu_driven: Cull on the GPU with a compute shader and draw every texture's
+                objects (the whole scene with an atlas) with one glMultiDrawElementsIndirect
+                call (OpenGL 4.3, falls back to instanced drawing). Implies instanced,
+                cannot be combined with static batching, LOD or portals.
         '''
 
+        if gpu_driven and (static_batching or lod or portals is not None):
+            raise ValueError("gpu_driven cannot be combined with static batching, LOD or portals")
+
+        self.start_time = time.perf_counter()
+        self.time_to_first_frame = None
+
         self.objects = []
         self.rotation_angle_degrees = 0.0
+        self.atlas = atlas
+        self.instanced = instanced or atlas is not None or gpu_driven
+        self.renderer = InstancedRenderer(persistent_buffers)
+        self.queue = RenderQueue()
+        self.state = StateTracker()
+        self.draw_calls = 0
+        self.visible_count = 0
+        self.transforms = TransformStore.store
+        self.textures = TextureManager.textures
+        self.shaders = ShaderManager.shaders
+        self.culler = FrustumCuller() if culling else None
+        self.batcher = StaticBatcher() if static_batching else None
+        self.lod = LODSelector() if lod else None
+        self.portal_culler = PortalCuller(portals) if portals is not None else None
+        self.triangles = 0
+
+        # the loader belongs to the scene, the manager it is installed on is shared.
+        self.loader = AssetLoader() if async_textures else None
+        self.textures.loader = self.loader
+
+        self.profiler = profiler
+        self.overlay = overlay
+        self.overlay_time = 0.0
+        if self.profiler is not None:
+            self.profiler.install([sys.modules[name] for name in self.PROFILED_MODULES if name in sys.modules])
+
+        # fixed-timestep simulation and frame pacing.
+        self.tick_rate = tick_rate
+        self.vsync = vsync
+        self.target_fps = target_fps
+        self.on_demand = on_demand
+        self.redraw = True
+        self.ticks = 0
+        self.frames_rendered = 0
+
+        # per-frame model matrix upload statistics.
+        self.last_model_index = None
+        self.model_uploads = 0
+        self.model_uploads_skipped = 0
 
         # setup.
+        self.window = None
+        self.offscreen = None
+        if headless:
+            # importing Headless this late cannot switch PyOpenGL to EGL any more.
+            if type(platform.PLATFORM).__name__ != "EGLPlatform":
+                raise RuntimeError("headless=True needs PyOpenGL's EGL platform, import Headless before Scene "
+                                   "or set PYOPENGL_PLATFORM=egl")
+
+            from Headless import OffscreenContext
+            self.offscreen = OffscreenContext(800, 600)
+        else:
+            self.create_window()
+
+        # time of the last simulated frame, see get_time.
+        self.clock = self.get_time()
+
+        # set background.
+        glClearColor(0, 0, 0, 1)
+        glEnable(GL_DEPTH_TEST)
+
+        self.vao = glGenVertexArrays(1)
+        glBindVertexArray(self.vao)
+
+        # load shaders, the variant is picked by defines.
+        defines = {}
+        if self.instanced:
+            defines["INSTANCED"] = None
+        if self.atlas is not None:
+            defines["ATLAS"] = None
+        if clustered_lights:
+            defines["CLUSTERED_LIGHTS"] = None
+
+        start = time.perf_counter()
+        self.shader = self.create_shader(
+            vertex_filepath="shaders/vertex.glsl",
+            fragment_filepath="shaders/fragment.glsl",
+            defines=defines
+        )
+        self.shader_seconds = time.perf_counter() - start
+
+        if self.atlas is not None:
+            self.atlas.upload()
+            self.textures.atlas = self.atlas
+
+        # use the shaders.
+        self.shader.use()
+
+        self.lighting = ClusteredLighting() if clustered_lights else None
+
+        # culling moves to the GPU, the CPU culler is not needed.
+        self.indirect = None
+        if gpu_driven and supports_gpu_driven():
+            program = self.shaders.get_compute_program("shaders/cull.glsl",
+                                                       {"ATLAS": None} if self.atlas is not None else None)
+            self.indirect = IndirectRenderer(program, self.atlas is not None, self.culler is not None)
+            self.culler = None
+            self.shader.use()
+
+        self.set_shader_variables()
+        
+        self.camera = Camera(self.shader)
+        
+    def create_window(self):
+
+        '''
+        Creates the SDL window and its OpenGL 3.3 core context.
+        '''
+
+        if SDL_Init is None:
+            raise RuntimeError("the SDL2 library is not available, import Headless first and use headless=True")
+
         SDL_Init(SDL_INIT_VIDEO)
         
         SDL_GL_SetAttribute(SDL_GL_CONTEXT_MAJOR_VERSION, 3)
@@ -46,118 +231,513 @@ class Scene:
         )
         
         self.gl_context = SDL_GL_CreateContext(self.window)
+        SDL_GL_SetSwapInterval(1 if self.vsync else 0)
 
-        # timer.
-        self.clock = SDL_GetTicks()
-
-        # set background.
-        glClearColor(0, 0, 0, 1)
-        glEnable(GL_DEPTH_TEST)
-
-        self.vao = glGenVertexArrays(1)
-        glBindVertexArray(self.vao)
+    def get_time(self) -> float:
 
-        # load shaders.
-        self.shader = self.create_shader(
-            vertex_filepath="shaders/vertex.glsl",
-            fragment_filepath="shaders/fragment.glsl"
-        )
+        '''
+        Returns the time in seconds from SDL's high resolution performance counter,
+        or from perf_counter when rendering offscreen.
+        '''
 
-        # use the shaders.
-        glUseProgram(self.shader)
+        if self.window is not None:
+            return SDL_GetPerformanceCounter() / SDL_GetPerformanceFrequency()
 
-        self.set_shader_variables()
-        
-        self.camera = Camera(self.shader)
+        return time.perf_counter()
 
-        glUniform1i(self.texUniform, 0)
-        glUniform3f(self.lightPosLocation, 0.0, 5.0, 0.0)
-        
     def set_shader_variables(self):
         
         '''
         Set the shader variables that are used when sending data to
-        the shaders.
+        the shaders. Locations come from the program's reflection, projection
+        and view are in the camera's uniform buffer.
         '''
         
         # shader variables
-        self.texUniform = glGetUniformLocation(self.shader, "imageTexture")
-        self.viewMatrixLocation = glGetUniformLocation(self.shader, "view")
-        self.modelMatrixLocation = glGetUniformLocation(self.shader, "model")
-        self.lightPosLocation = glGetUniformLocation(self.shader, "lightPos")
+        self.shader.set_uniform("imageTexture", 0)
+        self.shader.set_uniform("lightPos", (0.0, 5.0, 0.0))
+
+        if self.lighting is not None:
+            self.lighting.set_shader_variables(self.shader)
     
-    def create_shader(self, vertex_filepath: str, fragment_filepath: str) -> int:
+    def create_shader(self, vertex_filepath: str, fragment_filepath: str, defines: dict = None) -> ShaderProgram:
 
         '''
-        Compiles vertex and fragment shaders from file paths, linking them into a
-        shader program.
+        Gets a shader program variant from the shader manager, which loads it from
+        the binary cache or compiles and links it.
 
         Args:
             vertex_filepath: The file path to the vertex shader source code.
             fragment_filepath: The file path to the fragment shader source code.
+            defines: Macro name -> value inserted into both stages.
 
         Returns:
-            The compiled shader program ID.
+            The linked and reflected ShaderProgram.
         '''
-        
-        with open(vertex_filepath, 'r') as f:
-            vertex_src = f.readlines()
 
-        with open(fragment_filepath, 'r') as f:
-            fragment_src = f.readlines()
-
-        return compileProgram(
-            compileShader(vertex_src, GL_VERTEX_SHADER), 
-            compileShader(fragment_src, GL_FRAGMENT_SHADER)
-        )
+        return self.shaders.get_program(vertex_filepath, fragment_filepath, defines)
     
+    def add_light(self, position, color, direction=(0, -1, 0), range: float = 5.0, angle: float = None,
+                  inner_angle: float = None) -> int:
+
+        '''
+        Adds a local point light or spotlight, shaded on top of the main light.
+
+        Args:
+            position: World-space position.
+            color: RGB color times intensity.
+            direction: Direction a spotlight points in.
+            range: Distance at which the light has faded out.
+            angle: Outer half-angle of a spotlight's cone in degrees, None for a point light.
+            inner_angle: Half-angle of a spotlight's fully lit core, defaults to 80% of angle.
+
+        Returns:
+            The row index of the light.
+        '''
+
+        if self.lighting is None:
+            raise ValueError("local lights need a scene created with clustered_lights=True")
+
+        self.redraw = True
+        return self.lighting.store.add(position, color, direction, range, angle, inner_angle)
+
+    def set_portals(self, portals):
+
+        '''
+        Replaces the scene's rooms and doorways.
+
+        Args:
+            portals: A PortalGraph, None to draw every room.
+        '''
+
+        self.portal_culler = PortalCuller(portals) if portals is not None else None
+        self.redraw = True
+
     def add_object(self, obj):
         
         '''
         Adds an object (Cube) to the scene's render list.
 
         Args:
-            obj: The object to be added, expected to have a display method.
+            obj: The object to be added, expected to have a draw method and
+                a row index in the scene's transform store.
         '''
         
         self.objects.append(obj)
+        self.invalidate()
+
+    def add_objects(self, objects: list):
+
+        '''
+        Adds many objects at once, invalidating the renderer a single time.
+
+        Args:
+            objects: The objects to be added.
+        '''
+
+        self.objects.extend(objects)
+        self.invalidate()
+
+    def invalidate(self):
+
+        '''
+        Marks the renderers' grouping of the objects as stale and requests a redraw.
+        '''
+
+        self.renderer.invalidate()
+        if self.indirect is not None:
+            self.indirect.invalidate()
+        if self.batcher is not None:
+            self.batcher.invalidate()
+        if self.lod is not None:
+            self.lod.invalidate()
+        self.redraw = True
+
+    def update(self):
+
+        '''
+        Advances the simulation by one fixed tick.
+        '''
 
-    def display(self):
+        self.transforms.advance()
+        self.ticks += 1
+
+    def display(self, alpha: float = 0.0):
         
         '''
         Clears the screen and renders all objects in the scene, updating
         the view and model matrices.
+
+        Args:
+            alpha: Fraction of a tick elapsed since the last update, rotations are
+                interpolated by it.
         '''
         
         glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-        for index, obj in enumerate(self.objects):
-            # activate correct texture according to index (GL_TEXTURE0, GL_TEXTURE1 ...)
-            obj.display(self.shader)
+        self.shader.reset_counters()
+        self.state.reset_counters()
+
+        # compute all model matrices in one batch.
+        matrices = self.transforms.model_matrices(alpha)
+        normals = self.transforms.get_normal_matrices()
+
+        count = len(matrices)
+        clip_mx = self.camera.get_view_projection_mx()
+
+        # culling and draw calls are left to the GPU.
+        if self.indirect is not None:
+            if self.lighting is not None:
+                self.lighting.update(self.camera.get_rotation_mx(), self.camera.projection_transform)
+
+            self.draw_calls = self.indirect.draw(self.objects, self.transforms, matrices, normals,
+                                                 self.transforms.changed, clip_mx, self.shader)
+            self.model_uploads = self.indirect.transform_uploads
+            self.model_uploads_skipped = 0
+            return
+
+        if self.culler is not None:
+            visible = self.culler.cull(matrices, self.transforms.changed, clip_mx,
+                                       self.transforms.bounds_min[:count], self.transforms.bounds_max[:count])
+        else:
+            visible = np.ones(count, dtype=bool)
+
+        # of those, only objects seen through the doorways from the camera's room.
+        if self.portal_culler is not None:
+            visible = self.portal_culler.cull(matrices, self.transforms.changed, clip_mx, self.camera.get_position(),
+                                              visible, self.transforms.bounds_min[:count],
+                                              self.transforms.bounds_max[:count])
+
+        # the store is shared, only this scene's rows count (not freed or other scenes' rows).
+        indices = np.fromiter((obj.index for obj in self.objects), dtype=np.int64, count=len(self.objects))
+        self.visible_count = int(visible[indices].sum())
+
+        changed = self.transforms.changed
+
+        if self.lighting is not None:
+            self.lighting.update(self.camera.get_rotation_mx(), self.camera.projection_transform)
+
+        # objects that switched meshes move to other instance groups and batches.
+        if self.lod is not None:
+            if self.lod.select(self.objects, matrices, self.transforms.bounds_min, self.transforms.bounds_max,
+                               self.camera.get_position(), self.camera.projection_transform, visible):
+                self.renderer.invalidate()
+                if self.batcher is not None:
+                    self.batcher.invalidate()
+
+        # static objects are drawn from their batches, the rest one by one or instanced.
+        objects = self.objects
+        batch_calls = 0
+        if self.batcher is not None:
+            if self.batcher.update(self.objects, self.transforms, matrices, changed):
+                self.renderer.invalidate()
+            objects = self.batcher.dynamic_objects
+
+        if self.instanced:
+            if self.batcher is not None:
+                batch_calls = self.batcher.draw(self.shader, visible)
+            self.draw_calls = batch_calls + self.renderer.draw(objects, matrices, normals, changed, visible)
+            self.triangles = self.renderer.triangles + (self.batcher.triangles if self.batcher is not None else 0)
+            self.model_uploads = self.renderer.uploads
+            self.model_uploads_skipped = self.renderer.uploads_skipped
+            return
+
+        self.model_uploads = 0
+        self.model_uploads_skipped = 0
+
+        # queue the visible objects, sorted by state and front to back.
+        self.queue.clear()
+        objects = [obj for obj in objects if visible[obj.index]]
+        if objects:
+            indices = np.fromiter((obj.index for obj in objects), dtype=np.int64, count=len(objects))
+            vaos = [obj.vao for obj in objects]
+            textures = [obj.texture.get() for obj in objects]
+
+            # the camera only rotates around the origin, depth is the distance of the object's origin.
+            depths = np.linalg.norm(matrices[indices, 3, :3], axis=1)
+            self.queue.submit(objects, self.shader.program, vaos, textures, depths)
+
+        # other code binds behind the tracker's back between frames.
+        self.state.reset()
+        self.state.use_program(self.shader)
+
+        if self.batcher is not None:
+            batch_calls = self.batcher.draw(self.shader, visible, self.state)
+
+            # the batches left the identity in the model uniform.
+            self.last_model_index = None
+
+        self.draw_calls = batch_calls
+        self.triangles = self.batcher.triangles if self.batcher is not None else 0
+        for obj in self.queue.get_sorted_items():
+            self.draw_calls += 1
+            self.triangles += obj.index_count // 3
+
+            # the model uniform still holds the matrix if this object uploaded last and is unchanged.
+            if obj.index == self.last_model_index and not changed[obj.index]:
+                obj.draw(self.shader, state=self.state)
+                self.model_uploads_skipped += 1
+            else:
+                obj.draw(self.shader, matrices[obj.index], self.state, normals[obj.index])
+                self.model_uploads += 1
+
+            self.last_model_index = obj.index
+
+    def get_frame_stats(self) -> dict:
+
+        '''
+        Returns the statistics of the last displayed frame.
+
+        Returns:
+            A dict with draw calls, culling results over the scene's objects, model
+            matrix cache hits/misses, uploads, uniform calls, state binds before and
+            after filtering, and the
+            triangles drawn and texels sampled (with LOD), the assignment of local
+            lights to clusters (with clustered lights), the rooms and objects
+            rejected by portals and the fence waits of the instance ring buffer.
+            GPU-driven scenes read the culling results back, waiting for the GPU.
+        '''
+
+        portals = self.portal_culler
+        ring = self.renderer.ring
+        visible_objects = self.visible_count
+
+        if self.indirect is not None:
+            commands = self.indirect.read_commands().astype(np.int64)
+            visible_objects = int(commands[:, 1].sum())
+            self.triangles = int((commands[:, 0] // 3 * commands[:, 1]).sum())
+
+        return {
+            "draw_calls": self.draw_calls,
+            "visible_objects": visible_objects,
+            "total_objects": len(self.objects),
+            "matrix_cache_hits": self.transforms.cache_hits,
+            "matrix_cache_misses": self.transforms.cache_misses,
+            "model_uploads": self.model_uploads,
+            "model_uploads_skipped": self.model_uploads_skipped,
+            "uniform_calls": self.shader.uniform_calls,
+            "uniform_calls_skipped": self.shader.uniform_calls_skipped,
+            "camera_buffer_updates": self.camera.buffer_updates,
+            "binds_requested": self.state.requested,
+            "binds_issued": self.state.issued,
+            "sort_ms": self.queue.sort_seconds * 1000.0,
+            "static_batches": len(self.batcher.batches) if self.batcher else 0,
+            "static_objects": self.batcher.get_static_count() if self.batcher else 0,
+            "static_vertices_baked": self.batcher.vertices_baked if self.batcher else 0,
+            "triangles": self.triangles,
+            "texels": self.lod.texels if self.lod else 0,
+            "lod_changes": self.lod.changes if self.lod else 0,
+            "lights": self.lighting.store.count if self.lighting else 0,
+            "light_assignments": self.lighting.assignments if self.lighting else 0,
+            "max_lights_per_cluster": self.lighting.max_per_cluster if self.lighting else 0,
+            "light_assign_ms": self.lighting.assign_seconds * 1000.0 if self.lighting else 0.0,
+            "cells_visible": portals.cells_visible if portals else 0,
+            "cells_rejected": portals.cells_rejected if portals else 0,
+            "portal_rejected_objects": portals.objects_rejected if portals else 0,
+            "ring_waits": ring.frame_waits if ring else 0,
+            "ring_stall_ms": ring.frame_stall_seconds * 1000.0 if ring else 0.0,
+            "ticks": self.ticks,
+            "frames_rendered": self.frames_rendered,
+        }
+
+    def close(self):
+
+        '''
+        Releases the profiler and the scene's objects, stops the texture loader,
+        destroys the OpenGL context and the SDL window or offscreen framebuffer.
+        '''
+
+        if self.profiler is not None:
+            self.profiler.release()
+
+        # GL objects die with the context, give the shared meshes and textures back first.
+        for obj in self.objects:
+            obj.release()
+        self.objects = []
+        self.renderer.release()
+        if self.indirect is not None:
+            self.indirect.release()
+        if self.batcher is not None:
+            self.batcher.release()
+        if self.loader is not None:
+            self.loader.shutdown()
+            self.textures.loader = None
+        self.textures.clear()
+        if self.atlas is not None:
+            # the manager is shared, later scenes without an atlas load their own textures.
+            self.atlas.release()
+            self.textures.atlas = None
+        self.shaders.clear()
+        if self.lighting is not None:
+            self.lighting.release()
+
+        if self.offscreen is not None:
+            self.offscreen.release()
+            return
+
+        SDL_GL_DeleteContext(self.gl_context)
+        SDL_DestroyWindow(self.window)
+
+    def present(self):
+
+        '''
+        Shows the rendered frame, waiting for the GPU to finish when rendering offscreen
+        so frame times include the GPU work.
+        '''
+
+        if self.offscreen is not None:
+            glFinish()
+        else:
+            SDL_GL_SwapWindow(self.window)
+
+    def process_events(self, event) -> bool:
+
+        '''
+        Handles the pending window events.
+
+        Args:
+            event: The SDL_Event to poll into, None when rendering offscreen.
+
+        Returns:
+            False once the window was closed.
+        '''
+
+        running = True
+
+        # keyboard interaction (a: left, d: right)
+        while event is not None and SDL_PollEvent(ctypes.byref(event)) != 0:
+            if event.type == SDL_QUIT:
+                running = False
+            elif event.type == SDL_KEYDOWN:
+                if event.key.keysym.sym == SDLK_a:
+                    self.camera.rotate("left")
+                if event.key.keysym.sym == SDLK_d:
+                    self.camera.rotate("right")
+                self.redraw = True
+            elif event.type == SDL_WINDOWEVENT:
+                self.redraw = True
 
-    def run(self):
+        return running
+
+    def needs_redraw(self) -> bool:
+
+        '''
+        Returns True if the next frame would differ from the last one.
+        '''
+
+        loader = self.loader
+        return (self.redraw or self.transforms.is_animating()
+                or (loader is not None and (loader.pending > 0 or len(loader.ready) > 0)))
+
+    def run(self, frames: int = None, camera_path=None):
         
         '''
         Enters the main event loop, handling keyboard input and updating
         the scene continuously.
+
+        The simulation advances in fixed ticks of 1 / tick_rate seconds, independent
+        of the frame rate, and frames are rendered interpolated between the last two
+        ticks. Runs with a frame count advance exactly one tick per frame so they
+        are reproducible.
+
+        Args:
+            frames: Stop after this many frames instead of when the window is closed.
+            camera_path: Function of the frame number returning the camera's rotation
+                in degrees, for reproducible runs.
         '''
         
         running = True
-        event = SDL_Event()
-        while running:
-
-            # keyboard interaction (a: left, d: right)
-            while SDL_PollEvent(ctypes.byref(event)) != 0:
-                if event.type == SDL_QUIT:
-                    running = False
-                elif event.type == SDL_KEYDOWN:
-                    if event.key.keysym.sym == SDLK_a:
-                        self.camera.rotate("left")
-                    if event.key.keysym.sym == SDLK_d:
-                        self.camera.rotate("right")
-                        
-            # update cubes.
-            self.display()
+        event = SDL_Event() if self.window is not None else None
+        profiler = self.profiler
+        frame = 0
+
+        tick = 1.0 / self.tick_rate
+        accumulator = 0.0
+        self.clock = self.get_time()
+
+        while running and (frames is None or frame < frames):
 
+            # on demand, sleep until input arrives while nothing changes.
+            if self.on_demand and event is not None and not self.needs_redraw():
+                SDL_WaitEventTimeout(None, self.IDLE_TIMEOUT_MS)
+                running = self.process_events(event)
+
+                # idle time is not simulated.
+                self.clock = self.get_time()
+                continue
+
+            frame_start = time.perf_counter()
+            if profiler is not None:
+                profiler.begin_frame()
+                profiler.begin_phase("events")
+
+            if camera_path is not None:
+                self.camera.rotation_angle_degrees = camera_path(frame)
+            frame += 1
+
+            running = self.process_events(event)
+
+            # advance the simulation by whole ticks, clamped after stalls.
+            if profiler is not None:
+                profiler.begin_phase("update")
+            now = self.get_time()
+            accumulator += tick if frames is not None else min(now - self.clock, self.MAX_FRAME_TIME)
+            self.clock = now
+
+            while accumulator >= tick:
+                self.update()
+                accumulator -= tick
+
+            # upload textures decoded in the background.
+            if profiler is not None:
+                profiler.begin_phase("textures")
+            if self.loader is not None:
+                self.loader.pump()
+
+            # upload the view before drawing, culling and LOD already use the current one.
+            if profiler is not None:
+                profiler.begin_phase("camera")
             self.camera.start()
 
-            SDL_GL_SwapWindow(self.window)
+            # update cubes.
+            if profiler is not None:
+                profiler.begin_phase("display")
+            self.display(accumulator / tick)
+
+            if profiler is not None:
+                profiler.begin_phase("swap")
+            self.present()
+
+            self.redraw = False
+            self.frames_rendered += 1
+
+            # without vsync, sleep away the rest of the frame at the target rate.
+            if profiler is not None:
+                profiler.begin_phase("sleep")
+            if self.target_fps:
+                remaining = frame_start + 1.0 / self.target_fps - time.perf_counter()
+                if remaining > 0:
+                    time.sleep(remaining)
+
+            if profiler is not None:
+                profiler.end_frame()
+                if self.overlay and self.window is not None:
+                    self.update_overlay()
+
+            if self.time_to_first_frame is None:
+                self.time_to_first_frame = time.perf_counter() - self.start_time
+
+    def update_overlay(self, interval: float = 0.5):
+
+        '''
+        Shows the profiler summary in the window title, at most once per interval.
+
+        Args:
+            interval: Seconds between title updates.
+        '''
+
+        now = time.perf_counter()
+        if now - self.overlay_time < interval:
+            return
+
+        self.overlay_time = now
+        SDL_SetWindowTitle(self.window, self.profiler.format_overlay().encode())
@@ -0,0 +1,357 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import json
+import os
+import struct
+import tempfile
+import numpy as np
+
+class SceneData:
+
+    '''
+    A compiled scene mapped from disk: packed transforms, texture and mesh indices
+    into a deduplicated string table, and lights.
+    '''
+
+    def __init__(self, transforms: np.ndarray, texture_ids: np.ndarray, mesh_ids: np.ndarray,
+                 lights: np.ndarray, cells: np.ndarray, portals: np.ndarray, strings: list, directory: str):
+
+        '''
+        Initializes scene data.
+
+        Args:
+            transforms: (N, 12) float32 rows of position, angles, scale and angular velocity.
+            texture_ids: (N,) string table index of every object's texture path.
+            mesh_ids: (N,) string table index of every object's mesh name or model path.
+            lights: (L, 12) float32 rows of light position, color, direction, range, cone
+                angle and inner cone angle.
+            cells: (C, 6) float32 rows of room box minimum and maximum.
+            portals: (P, 14) float32 rows of the two rooms a doorway links and its four corners.
+            strings: The string table.
+            directory: Directory relative texture and model paths are resolved against.
+        '''
+
+        self.transforms = transforms
+        self.texture_ids = texture_ids
+        self.mesh_ids = mesh_ids
+        self.lights = lights
+        self.cells = cells
+        self.portals = portals
+        self.strings = strings
+        self.directory = directory
+
+    @property
+    def count(self) -> int:
+        return len(self.transforms)
+
+    def get_path(self, string_id: int) -> str:
+
+        '''
+        Returns a texture or model path from the string table, resolved against the scene's directory.
+        '''
+
+        return os.path.normpath(os.path.join(self.directory, self.strings[string_id]))
+
+    def instantiate(self, scene) -> list:
+
+        '''
+        Adds the objects to a scene: the transforms are copied into the transform
+        store in one batch and every unique mesh and texture is acquired once, with
+        one reference per object.
+
+        Args:
+            scene: The Scene to fill.
+
+        Returns:
+            The created objects.
+        '''
+
+        import Geometry
+        import MeshLoader
+        from Cube import Cube
+
+        indices = scene.transforms.allocate_many(
+            self.transforms[:, 0:3], self.transforms[:, 3:6],
+            self.transforms[:, 6:9], self.transforms[:, 9:12]
+        )
+
+        objects = []
+        for mesh_id in np.unique(self.mesh_ids).tolist():
+            rows = np.flatnonzero(self.mesh_ids == mesh_id)
+
+            # any mesh other than the built-in cube is a model file.
+            if self.strings[mesh_id] == "cube":
+                mesh = Geometry.registry.acquire("cube", Cube.build_mesh, references=len(rows))
+            else:
+                path = self.get_path(mesh_id)
+                mesh = Geometry.registry.acquire_lods(path, lambda: MeshLoader.load_mesh(path).build_lods(),
+                                                      references=len(rows))
+                scene.transforms.bounds_min[indices[rows]] = mesh[0].bounds[0]
+                scene.transforms.bounds_max[indices[rows]] = mesh[0].bounds[1]
+
+            # one acquire per unique texture, referenced by every object using it.
+            texture_ids, inverse, counts = np.unique(self.texture_ids[rows], return_inverse=True, return_counts=True)
+            paths = [self.get_path(texture_id) for texture_id in texture_ids.tolist()]
+            handles = [
+                scene.textures.acquire(path, references=count)
+                for path, count in zip(paths, counts.tolist())
+            ]
+
+            inverse = inverse.tolist()
+            objects += Cube.create_many(
+                indices[rows],
+                [paths[texture] for texture in inverse],
+                [handles[texture] for texture in inverse],
+                mesh,
+                scene.transforms,
+                scene.textures
+            )
+
+        scene.add_objects(objects)
+
+        if len(self.lights):
+            scene.shader.set_uniform("lightPos", self.lights[0, :3])
+
+        # the first light is the main light, the others are local lights shaded by clusters.
+        if scene.lighting is not None:
+            for light in self.lights[1:].tolist():
+                scene.add_light(light[0:3], light[3:6], light[6:9], light[9],
+                                light[10] or None, light[11] or None)
+
+        if len(self.cells):
+            from Portals import PortalGraph
+
+            graph = PortalGraph()
+            for cell in self.cells.tolist():
+                graph.add_cell(cell[0:3], cell[3:6])
+            for portal in self.portals.tolist():
+                graph.add_portal(int(portal[0]), int(portal[1]), np.reshape(portal[2:14], (4, 3)))
+
+            scene.set_portals(graph)
+
+        return objects
+
+class SceneFile:
+
+    '''
+    Compiles JSON scene descriptions into a binary form that is memory-mapped at load.
+
+    JSON format, paths relative to the scene file:
+
+        {
+            "lights": [
+                {"position": [0, 5, 0], "color": [1, 1, 1]},
+                {"position": [0, 3, -3], "color": [2, 2, 1.5], "direction": [0, -1, -1],
+                 "range": 5, "angle": 30, "inner_angle": 20}
+            ],
+            "objects": [
+                {"position": [0, 0, 0], "angles": [0, 0, 0], "scale": [1, 1, 1],
+                 "angular_velocity": [0, 0, 0], "texture": "textures/walls/white.png",
+                 "mesh": "cube"}
+            ],
+            "cells": [
+                {"min": [-5, -5, -5], "max": [5, 5, 5]},
+                {"min": [5, -5, -5], "max": [15, 5, 5]}
+            ],
+            "portals": [
+                {"cells": [0, 1], "corners": [[5, -5, -1], [5, -5, 1], [5, -1, 1], [5, -1, -1]]}
+            ]
+        }
+
+    "mesh" is "cube" or the path of an .obj or .glb model. The first light is the
+    main light, the others are local point lights (without "angle") or spotlights,
+    drawn by scenes with clustered lights. "cells" are the boxes of the rooms and
+    "portals" the doorways linking them, given by the indices of the two rooms and
+    the four corners of the opening in order around it.
+
+    Binary layout: header, section offsets, then 64-byte aligned sections of
+    transforms (N x 12 float32), texture ids (N uint32), mesh ids (N uint32),
+    lights (L x 12 float32), cells (C x 6 float32), portals (P x 14 float32),
+    string offsets ((S + 1) uint32) and UTF-8 string data.
+    '''
+
+    SUFFIX = ".dmscene"
+    MAGIC = b"DMSCENE3"
+
+    # magic, object, light, string, cell and portal counts, then eight section offsets.
+    HEADER = struct.Struct("<8sIIIII8Q")
+    ALIGNMENT = 64
+
+    @staticmethod
+    def get_compiled_path(path: str) -> str:
+
+        '''
+        Returns the path of the compiled file next to a JSON scene.
+        '''
+
+        return os.path.splitext(path)[0] + SceneFile.SUFFIX
+
+    @staticmethod
+    def compile(json_path: str, output_path: str = None) -> str:
+
+        '''
+        Compiles a JSON scene.
+
+        Args:
+            json_path: Path to the JSON scene.
+            output_path: Path of the compiled file, defaults to next to the JSON file.
+
+        Returns:
+            The path of the compiled file.
+        '''
+
+        with open(json_path, "r") as f:
+            description = json.load(f)
+
+        objects = description.get("objects", [])
+        lights = description.get("lights", [])
+        cells = description.get("cells", [])
+        portals = description.get("portals", [])
+
+        # the string table holds every distinct texture path and mesh name once.
+        strings = {}
+        def intern(string: str) -> int:
+            return strings.setdefault(string, len(strings))
+
+        count = len(objects)
+        transforms = np.zeros((count, 12), dtype=np.float32)
+        transforms[:, 6:9] = 1
+        texture_ids = np.zeros(count, dtype=np.uint32)
+        mesh_ids = np.zeros(count, dtype=np.uint32)
+
+        for row, obj in enumerate(objects):
+            transforms[row, 0:3] = obj.get("position", (0, 0, 0))
+            transforms[row, 3:6] = obj.get("angles", (0, 0, 0))
+            transforms[row, 6:9] = obj.get("scale", (1, 1, 1))
+            transforms[row, 9:12] = obj.get("angular_velocity", (0, 0, 0))
+            texture_ids[row] = intern(obj["texture"])
+            mesh_ids[row] = intern(obj.get("mesh", "cube"))
+
+        # an angle of 0 marks a point light, an inner angle of 0 the default core.
+        light_rows = np.array(
+            [tuple(light.get("position", (0, 0, 0))) + tuple(light.get("color", (1, 1, 1)))
+             + tuple(light.get("direction", (0, -1, 0)))
+             + (light.get("range", 5.0), light.get("angle", 0.0), light.get("inner_angle", 0.0))
+             for light in lights],
+            dtype=np.float32
+        ).reshape(-1, 12)
+
+        cell_rows = np.array(
+            [tuple(cell["min"]) + tuple(cell["max"]) for cell in cells],
+            dtype=np.float32
+        ).reshape(-1, 6)
+
+        portal_rows = np.array(
+            [tuple(portal["cells"]) + tuple(np.ravel(portal["corners"]).tolist()) for portal in portals],
+            dtype=np.float32
+        ).reshape(-1, 14)
+
+        encoded = [string.encode() for string in strings]
+        string_offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+        string_offsets[1:] = np.cumsum([len(string) for string in encoded])
+        string_data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+
+        sections = [transforms, texture_ids, mesh_ids, light_rows, cell_rows, portal_rows, string_offsets, string_data]
+
+        offsets = []
+        offset = SceneFile.HEADER.size
+        for section in sections:
+            offset += -offset % SceneFile.ALIGNMENT
+            offsets.append(offset)
+            offset += section.nbytes
+
+        output_path = output_path or SceneFile.get_compiled_path(json_path)
+        directory = os.path.dirname(os.path.abspath(output_path))
+
+        # written atomically so a running loader never maps a partial file.
+        descriptor, temporary_path = tempfile.mkstemp(dir=directory)
+        with os.fdopen(descriptor, "wb") as f:
+            f.write(SceneFile.HEADER.pack(SceneFile.MAGIC, count, len(light_rows), len(encoded),
+                                          len(cell_rows), len(portal_rows), *offsets))
+            for section, offset in zip(sections, offsets):
+                f.write(bytes(offset - f.tell()))
+                f.write(np.ascontiguousarray(section).tobytes())
+
+        os.chmod(temporary_path, 0o644)
+        os.replace(temporary_path, output_path)
+
+        return output_path
+
+    @staticmethod
+    def is_current(path: str) -> bool:
+
+        '''
+        Returns True if a compiled file was written by this version of the format.
+        '''
+
+        with open(path, "rb") as f:
+            return f.read(len(SceneFile.MAGIC)) == SceneFile.MAGIC
+
+    @staticmethod
+    def load(path: str) -> SceneData:
+
+        '''
+        Maps a compiled scene. A JSON scene is compiled first if its compiled file
+        is missing, older or of an older format.
+
+        Args:
+            path: Path to a .json or compiled scene.
+
+        Returns:
+            The SceneData, its arrays are views into the mapping.
+        '''
+
+        if path.lower().endswith(".json"):
+            compiled_path = SceneFile.get_compiled_path(path)
+            if (not os.path.exists(compiled_path) or os.path.getmtime(compiled_path) < os.path.getmtime(path)
+                    or not SceneFile.is_current(compiled_path)):
+                SceneFile.compile(path, compiled_path)
+            path = compiled_path
+
+        mapping = np.memmap(path, dtype=np.uint8, mode="r")
+
+        magic, count, light_count, string_count, cell_count, portal_count, *offsets = \
+            SceneFile.HEADER.unpack_from(mapping, 0)
+        if magic != SceneFile.MAGIC:
+            raise ValueError(f"{path} is not a compiled scene")
+
+        def section(index: int, dtype, length: int) -> np.ndarray:
+            return np.frombuffer(mapping, dtype=dtype, count=length, offset=offsets[index])
+
+        string_offsets = section(6, np.uint32, string_count + 1)
+        string_data = section(7, np.uint8, int(string_offsets[-1])).tobytes()
+        strings = [
+            string_data[start:end].decode()
+            for start, end in zip(string_offsets[:-1].tolist(), string_offsets[1:].tolist())
+        ]
+
+        return SceneData(
+            section(0, np.float32, count * 12).reshape(count, 12),
+            section(1, np.uint32, count),
+            section(2, np.uint32, count),
+            section(3, np.float32, light_count * 12).reshape(light_count, 12),
+            section(4, np.float32, cell_count * 6).reshape(cell_count, 6),
+            section(5, np.float32, portal_count * 14).reshape(portal_count, 14),
+            strings,
+            os.path.dirname(os.path.abspath(path))
+        )
+
+if __name__ == "__main__":
+
+    # offline build: python3 SceneFile.py scenes/museum.json
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Compile JSON scenes into memory-mappable binaries.")
+    parser.add_argument("scenes", nargs="+")
+
+    args = parser.parse_args()
+    for path in args.scenes:
+        data = SceneFile.load(SceneFile.compile(path))
+        print(f"{path}: {data.count} objects, {len(data.lights)} lights, {len(data.cells)} cells, "
+              f"{len(data.portals)} portals, {len(data.strings)} strings")
@@ -0,0 +1,134 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import hashlib
+import os
+import struct
+import tempfile
+
+class ShaderCache:
+
+    '''
+    Stores linked program binaries in a cache directory, one file per program.
+
+    A cache file is keyed by a hash of the preprocessed sources and the driver that
+    produced the binary, so edited shaders, other defines and driver updates all
+    miss the cache instead of loading a stale binary.
+    '''
+
+    SUFFIX = ".shadercache"
+    MAGIC = b"DMSHDC01"
+
+    # magic, key digest, binary format, binary length.
+    HEADER = struct.Struct("<8s32sII")
+
+    def __init__(self, directory: str = "shaders/cache", write: bool = True):
+
+        '''
+        Initializes the cache.
+
+        Args:
+            directory: Directory holding the cache files, created on the first write.
+            write: Write cache files for programs that are not cached yet.
+        '''
+
+        self.directory = directory
+        self.write = write
+
+    def get_key(self, sources: list, driver: str) -> bytes:
+
+        '''
+        Hashes the preprocessed stage sources together with the driver string.
+
+        Args:
+            sources: Source of every stage, defines already inserted.
+            driver: Vendor, renderer and version of the GL implementation.
+        '''
+
+        digest = hashlib.sha256(driver.encode())
+        for source in sources:
+            # the length separates the stages, so moving text between them changes the key.
+            digest.update(struct.pack("<Q", len(source)))
+            digest.update(source.encode())
+
+        return digest.digest()
+
+    def get_cache_path(self, key: bytes) -> str:
+
+        '''
+        Returns the path of the cache file of a key.
+        '''
+
+        return os.path.join(self.directory, key.hex()[:32] + self.SUFFIX)
+
+    def read(self, key: bytes) -> tuple:
+
+        '''
+        Reads the binary of a program.
+
+        Args:
+            key: Key digest of the program.
+
+        Returns:
+            (binary format, binary bytes), or None if the file is missing or stale.
+        '''
+
+        try:
+            with open(self.get_cache_path(key), "rb") as f:
+                data = f.read()
+        except OSError:
+            return None
+
+        if len(data) < self.HEADER.size:
+            return None
+
+        magic, digest, binary_format, length = self.HEADER.unpack_from(data, 0)
+        if magic != self.MAGIC or digest != key or len(data) != self.HEADER.size + length:
+            return None
+
+        return binary_format, data[self.HEADER.size:]
+
+    def store(self, key: bytes, binary_format: int, binary: bytes):
+
+        '''
+        Writes a cache file, atomically so concurrent runs never see partial files.
+
+        Args:
+            key: Key digest of the program.
+            binary_format: Format enum returned by glGetProgramBinary.
+            binary: The program binary.
+        '''
+
+        if not self.write:
+            return
+
+        temporary_path = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            descriptor, temporary_path = tempfile.mkstemp(dir=self.directory)
+            with os.fdopen(descriptor, "wb") as f:
+                f.write(self.HEADER.pack(self.MAGIC, key, binary_format, len(binary)))
+                f.write(binary)
+
+            os.chmod(temporary_path, 0o644)
+            os.replace(temporary_path, self.get_cache_path(key))
+        except OSError:
+            # a read-only shader directory only costs the cache, not the program.
+            if temporary_path is not None and os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+    def remove(self, key: bytes):
+
+        '''
+        Deletes the cache file of a key, e.g. after the driver rejected its binary.
+        '''
+
+        try:
+            os.remove(self.get_cache_path(key))
+        except OSError:
+            pass
@@ -0,0 +1,301 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import os
+import time
+import ctypes
+from GLBackend import *
+from OpenGL.GL.shaders import compileShader
+from ShaderCache import ShaderCache
+from ShaderProgram import ShaderProgram
+
+def insert_defines(source: str, defines: dict) -> str:
+
+    '''
+    Inserts #define lines after a shader's #version directive.
+
+    Args:
+        source: GLSL source, starting with its #version line.
+        defines: Macro name -> value, None for a macro without value.
+
+    Returns:
+        The source of the variant.
+    '''
+
+    if not defines:
+        return source
+
+    lines = [f"#define {name}" if value is None else f"#define {name} {value}"
+             for name, value in sorted(defines.items())]
+
+    # the directive must stay first, everything else may follow the defines.
+    version_end = source.find("\n") + 1 if source.lstrip().startswith("#version") else 0
+    return source[:version_end] + "\n".join(lines) + "\n" + source[version_end:]
+
+class ShaderManager:
+
+    '''
+    Builds shader program variants from #define permutations, one program per
+    source files and defines, and keeps their linked binaries in a ShaderCache so
+    later runs load them with glProgramBinary instead of compiling.
+    '''
+
+    def __init__(self, cache: ShaderCache = None, use_cache: bool = True):
+
+        '''
+        Initializes an empty manager.
+
+        Args:
+            cache: ShaderCache storing the program binaries, defaults to shaders/cache.
+            use_cache: Load and store program binaries, disable to always compile.
+        '''
+
+        self.cache = cache or ShaderCache()
+        self.use_cache = use_cache
+
+        # (source paths, defines) -> ShaderProgram of the current context.
+        self.programs = {}
+        self.driver = None
+
+        # counters, hits are programs loaded from binaries, stale ones were rejected by the driver.
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.compile_seconds = 0.0
+        self.load_seconds = 0.0
+
+    def get_program(self, vertex_filepath: str, fragment_filepath: str, defines: dict = None) -> ShaderProgram:
+
+        '''
+        Returns the program of a variant, loading or compiling it on first use.
+
+        Args:
+            vertex_filepath: The file path to the vertex shader source code.
+            fragment_filepath: The file path to the fragment shader source code.
+            defines: Macro name -> value inserted into both stages, None for a macro without value.
+
+        Returns:
+            The linked and reflected ShaderProgram.
+        '''
+
+        return self.get_stages([(GL_VERTEX_SHADER, vertex_filepath), (GL_FRAGMENT_SHADER, fragment_filepath)],
+                               defines)
+
+    def get_compute_program(self, compute_filepath: str, defines: dict = None) -> ShaderProgram:
+
+        '''
+        Returns the program of a compute shader variant, loading or compiling it on first use.
+
+        Args:
+            compute_filepath: The file path to the compute shader source code.
+            defines: Macro name -> value, None for a macro without value.
+
+        Returns:
+            The linked and reflected ShaderProgram.
+        '''
+
+        return self.get_stages([(GL_COMPUTE_SHADER, compute_filepath)], defines)
+
+    def get_stages(self, stages: list, defines: dict = None) -> ShaderProgram:
+
+        '''
+        Returns the program linked from a list of shader stages.
+
+        Args:
+            stages: (shader type, file path) of every stage.
+            defines: Macro name -> value inserted into every stage.
+
+        Returns:
+            The linked and reflected ShaderProgram.
+        '''
+
+        defines = dict(defines or {})
+        key = (tuple(os.path.abspath(filepath) for _, filepath in stages), tuple(sorted(defines.items())))
+
+        shader = self.programs.get(key)
+        if shader is None:
+            sources = []
+            for shader_type, filepath in stages:
+                with open(filepath, 'r') as f:
+                    sources.append((shader_type, insert_defines(f.read(), defines)))
+
+            shader = ShaderProgram(self.build(sources))
+            self.programs[key] = shader
+
+        return shader
+
+    def get_driver(self) -> str:
+
+        '''
+        Returns the vendor, renderer and version of the current context, binaries of
+        one driver are not valid for another.
+        '''
+
+        if self.driver is None:
+            self.driver = "\n".join(glGetString(name).decode() for name in (GL_VENDOR, GL_RENDERER, GL_VERSION))
+
+        return self.driver
+
+    def supports_binaries(self) -> bool:
+
+        '''
+        Returns True if the driver can save and load program binaries.
+        '''
+
+        return self.use_cache and glGetIntegerv(GL_NUM_PROGRAM_BINARY_FORMATS) > 0
+
+    def build(self, sources: list) -> int:
+
+        '''
+        Loads a program from its cached binary, or compiles and caches it.
+
+        Args:
+            sources: (shader type, preprocessed source) of every stage.
+
+        Returns:
+            The GL program name.
+        '''
+
+        if not self.supports_binaries():
+            return self.compile(sources)
+
+        key = self.cache.get_key([source for _, source in sources], self.get_driver())
+
+        cached = self.cache.read(key)
+        if cached is not None:
+            program = self.load_binary(*cached)
+            if program is not None:
+                self.hits += 1
+                return program
+
+            # the driver rejects binaries it no longer understands, recompile.
+            self.stale += 1
+            self.cache.remove(key)
+
+        self.misses += 1
+        program = self.compile(sources)
+
+        binary = self.get_binary(program)
+        if binary is not None:
+            self.cache.store(key, *binary)
+
+        return program
+
+    def compile(self, sources: list) -> int:
+
+        '''
+        Compiles and links a program, marking its binary as retrievable.
+
+        Args:
+            sources: (shader type, preprocessed source) of every stage.
+
+        Returns:
+            The GL program name.
+        '''
+
+        start = time.perf_counter()
+
+        shaders = [compileShader(source, shader_type) for shader_type, source in sources]
+
+        program = glCreateProgram()
+        for shader in shaders:
+            glAttachShader(program, shader)
+        glProgramParameteri(program, GL_PROGRAM_BINARY_RETRIEVABLE_HINT, GL_TRUE)
+        glLinkProgram(program)
+
+        linked = glGetProgramiv(program, GL_LINK_STATUS)
+        log = glGetProgramInfoLog(program)
+
+        # the program keeps its code, the shader objects are not needed after linking.
+        for shader in shaders:
+            glDetachShader(program, shader)
+            glDeleteShader(shader)
+
+        if not linked:
+            glDeleteProgram(program)
+            raise RuntimeError(f"shader link failure: {log.decode() if isinstance(log, bytes) else log}")
+
+        self.compile_seconds += time.perf_counter() - start
+
+        return program
+
+    def load_binary(self, binary_format: int, binary: bytes) -> int:
+
+        '''
+        Creates a program from a binary.
+
+        Returns:
+            The GL program name, or None if the driver rejected the binary.
+        '''
+
+        start = time.perf_counter()
+
+        program = glCreateProgram()
+        glProgramBinary(program, binary_format, binary, len(binary))
+        if not glGetProgramiv(program, GL_LINK_STATUS):
+            glDeleteProgram(program)
+            return None
+
+        self.load_seconds += time.perf_counter() - start
+
+        return program
+
+    def get_binary(self, program: int) -> tuple:
+
+        '''
+        Reads back a linked program's binary.
+
+        Returns:
+            (binary format, binary bytes), or None if the driver returned none.
+        '''
+
+        length = glGetProgramiv(program, GL_PROGRAM_BINARY_LENGTH)
+        if length <= 0:
+            return None
+
+        binary = (ctypes.c_ubyte * length)()
+        written = GLsizei()
+        binary_format = GLenum()
+        glGetProgramBinary(program, length, ctypes.byref(written), ctypes.byref(binary_format), binary)
+
+        return binary_format.value, bytes(binary)[:written.value]
+
+    def clear(self):
+
+        '''
+        Deletes every program, e.g. before the GL context is destroyed. Programs
+        are rebuilt (from the cache) on their next use.
+        '''
+
+        for shader in self.programs.values():
+            glDeleteProgram(shader.program)
+
+        self.programs = {}
+        self.driver = None
+
+    def stats(self) -> dict:
+
+        '''
+        Returns the manager counters.
+
+        Returns:
+            A dict with binary cache hits/misses/stale binaries and the time spent
+            compiling and loading programs.
+        '''
+
+        return {
+            "programs": len(self.programs),
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "compile_ms": self.compile_seconds * 1000.0,
+            "load_ms": self.load_seconds * 1000.0,
+        }
+
+# manager shared by all scenes.
+shaders = ShaderManager()
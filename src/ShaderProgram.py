@@ -0,0 +1,156 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import numpy as np
+from GLBackend import *
+
+# binding points of the uniform blocks shared by every program.
+BLOCK_BINDINGS = {
+    "Camera": 0,
+}
+
+class ShaderProgram:
+
+    '''
+    A linked shader program whose active uniforms, attributes and uniform blocks are
+    looked up once at link time. Uniforms are set through cached setters that skip
+    uploads of unchanged values.
+    '''
+
+    def __init__(self, program: int):
+
+        '''
+        Reflects the interface of a linked program, see ShaderManager for building one.
+
+        Args:
+            program: The GL program name.
+        '''
+
+        self.program = program
+
+        # name -> (location, GL type).
+        self.uniforms = {}
+        self.attributes = {}
+
+        # name -> binding point.
+        self.blocks = {}
+
+        # last value set per uniform (bytes for vectors and matrices) and per-frame counters.
+        self.values = {}
+        self.uniform_calls = 0
+        self.uniform_calls_skipped = 0
+
+        self.reflect()
+
+    def reflect(self):
+
+        '''
+        Looks up the active uniforms and attributes and binds the known uniform blocks.
+        '''
+
+        for index in range(glGetProgramiv(self.program, GL_ACTIVE_UNIFORMS)):
+            name, _, uniform_type = glGetActiveUniform(self.program, index)
+            name = name.decode().removesuffix("[0]")
+
+            # members of uniform blocks have no location.
+            location = glGetUniformLocation(self.program, name)
+            if location >= 0:
+                self.uniforms[name] = (location, int(uniform_type))
+
+        for index in range(glGetProgramiv(self.program, GL_ACTIVE_ATTRIBUTES)):
+            name, _, attribute_type = glGetActiveAttrib(self.program, index)
+            name = name.decode()
+            self.attributes[name] = (glGetAttribLocation(self.program, name), int(attribute_type))
+
+        for name, binding in BLOCK_BINDINGS.items():
+            index = glGetUniformBlockIndex(self.program, name)
+            if index != GL_INVALID_INDEX:
+                glUniformBlockBinding(self.program, index, binding)
+                self.blocks[name] = binding
+
+    def use(self):
+
+        '''
+        Makes the program current.
+        '''
+
+        glUseProgram(self.program)
+
+    def get_location(self, name: str) -> int:
+
+        '''
+        Returns the cached location of a uniform, -1 if it is not active.
+        '''
+
+        return self.uniforms.get(name, (-1, None))[0]
+
+    def set_uniform(self, name: str, value) -> bool:
+
+        '''
+        Uploads a uniform unless it already holds the value. The program must be in use.
+
+        Args:
+            name: Uniform name, uniforms the compiler removed are ignored.
+            value: Scalar, vec2, vec3, ivec3, 3x3 or 4x4 matrix (row-vector convention, uploaded as is),
+                or (K, 4) array of a vec4 array uniform.
+
+        Returns:
+            True if a GL call was made.
+        '''
+
+        uniform = self.uniforms.get(name)
+        if uniform is None:
+            return False
+
+        location, uniform_type = uniform
+
+        # vectors and matrices are compared by their float32 bytes, cheaper than np.array_equal.
+        if uniform_type in (GL_FLOAT_MAT4, GL_FLOAT_MAT3, GL_FLOAT_VEC4, GL_FLOAT_VEC3, GL_FLOAT_VEC2):
+            value = np.ascontiguousarray(value, dtype=np.float32)
+            key = value.tobytes()
+        elif uniform_type == GL_INT_VEC3:
+            value = np.ascontiguousarray(value, dtype=np.int32)
+            key = value.tobytes()
+        else:
+            key = value
+
+        if self.values.get(name) == key:
+            self.uniform_calls_skipped += 1
+            return False
+
+        if uniform_type == GL_FLOAT_MAT4:
+            glUniformMatrix4fv(location, 1, GL_FALSE, value)
+        elif uniform_type == GL_FLOAT_MAT3:
+            glUniformMatrix3fv(location, 1, GL_FALSE, value)
+        elif uniform_type == GL_FLOAT_VEC4:
+            glUniform4fv(location, value.size // 4, value)
+        elif uniform_type == GL_FLOAT_VEC3:
+            glUniform3fv(location, 1, value)
+        elif uniform_type == GL_FLOAT_VEC2:
+            glUniform2fv(location, 1, value)
+        elif uniform_type == GL_INT_VEC3:
+            glUniform3iv(location, 1, value)
+        elif uniform_type == GL_FLOAT:
+            glUniform1f(location, value)
+        else:
+            # ints, bools and samplers.
+            glUniform1i(location, value)
+
+        self.values[name] = key
+        self.uniform_calls += 1
+
+        return True
+
+    def reset_counters(self):
+
+        '''
+        Resets the per-frame uniform call counters.
+        '''
+
+        self.uniform_calls = 0
+        self.uniform_calls_skipped = 0
@@ -0,0 +1,414 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+from GLBackend import *
+import numpy as np
+from InstancedRenderer import InstancedRenderer
+from TransformStore import TransformStore
+
+IDENTITY = np.identity(4, dtype=np.float32)
+
+class StaticBatch:
+
+    '''
+    Objects that share a texture (or an atlas) baked into one world-space vertex
+    buffer with one index buffer, drawn with one call and an identity model matrix.
+    '''
+
+    # (x, y, z, u, v, nx, ny, nz) followed by the atlas rect and layer when drawing from an atlas.
+    FLOATS_PER_VERTEX = 8
+    ATLAS_FLOATS_PER_VERTEX = 13
+
+    def __init__(self, texture):
+
+        '''
+        Initializes an empty batch and its vertex array.
+
+        Args:
+            texture: TextureHandle or AtlasRegion bound while drawing the batch.
+        '''
+
+        self.texture = texture
+        self.atlas = texture.source is not texture
+        self.floats_per_vertex = self.ATLAS_FLOATS_PER_VERTEX if self.atlas else self.FLOATS_PER_VERTEX
+
+        self.objects = []
+        self.indices = np.zeros(0, dtype=np.int64)
+
+        # sorted (row, vao) pairs of the baked objects.
+        self.contents = []
+
+        # (mesh, first object, end object, first vertex) runs of objects sharing a mesh.
+        self.segments = []
+        self.vertices = np.zeros((0, self.floats_per_vertex), dtype=np.float32)
+        self.vertex_count = 0
+
+        # mesh indices of every object, offset to the object's baked vertices.
+        self.elements = np.zeros(0, dtype=np.uint32)
+
+        self.vao = glGenVertexArrays(1)
+        self.vbo = glGenBuffers(1)
+        self.ebo = glGenBuffers(1)
+        self.create_vertex_array()
+
+    def create_vertex_array(self):
+
+        '''
+        Describes the baked vertex layout, with the same attribute locations as the meshes.
+        '''
+
+        stride = self.floats_per_vertex * 4
+
+        glBindVertexArray(self.vao)
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.ebo)
+
+        for location, size, offset in ((0, 3, 0), (1, 2, 12), (2, 3, 20)):
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, size, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(offset))
+
+        # the atlas region is per vertex here instead of per instance.
+        if self.atlas:
+            location = InstancedRenderer.REGION_LOCATION
+            glEnableVertexAttribArray(location)
+            glVertexAttribPointer(location, 4, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(32))
+            glEnableVertexAttribArray(location + 1)
+            glVertexAttribPointer(location + 1, 1, GL_FLOAT, GL_FALSE, stride, ctypes.c_void_p(48))
+
+    def set_objects(self, objects: list):
+
+        '''
+        Replaces the batch's objects, ordered so objects sharing a mesh are adjacent.
+
+        Args:
+            objects: The static objects using the batch's texture.
+        '''
+
+        self.objects = sorted(objects, key=lambda obj: obj.vao)
+        self.indices = np.array([obj.index for obj in self.objects], dtype=np.int64)
+        self.contents = sorted((obj.index, obj.vao) for obj in objects)
+
+        self.segments = []
+        elements = []
+        first_vertex = 0
+        start = 0
+        for end in range(1, len(self.objects) + 1):
+            if end == len(self.objects) or self.objects[end].vao != self.objects[start].vao:
+                mesh = self.objects[start].mesh
+                self.segments.append((mesh, start, end, first_vertex))
+
+                offsets = first_vertex + np.arange(end - start, dtype=np.uint32) * mesh.vertex_count
+                elements.append((mesh.indices + offsets[:, None]).ravel())
+
+                first_vertex += (end - start) * mesh.vertex_count
+                start = end
+
+        self.vertex_count = first_vertex
+        self.elements = np.concatenate(elements).astype(np.uint32) if elements else np.zeros(0, dtype=np.uint32)
+
+    def bake(self, matrices: np.ndarray, members: np.ndarray = None) -> tuple:
+
+        '''
+        Transforms the mesh vertices of the batch's objects into world space.
+
+        Args:
+            matrices: The (N, 4, 4) model matrices of the transform store.
+            members: Positions of the objects to bake within the batch, all when None.
+
+        Returns:
+            The first and end vertex of the baked range.
+        '''
+
+        if members is None:
+            self.vertices = np.zeros((self.vertex_count, self.floats_per_vertex), dtype=np.float32)
+            members = np.arange(len(self.objects))
+
+        first = self.vertex_count
+        end = 0
+        for mesh, start, stop, first_vertex in self.segments:
+            selected = members[(members >= start) & (members < stop)]
+            if len(selected) == 0:
+                continue
+
+            model = matrices[self.indices[selected]]
+            normal = TransformStore.get_normal_mxs(model)
+            source = mesh.vertices
+
+            # (objects, vertices, floats) view of the segment's vertices.
+            count = mesh.vertex_count
+            baked = np.empty((len(selected), count, self.floats_per_vertex), dtype=np.float32)
+            baked[:, :, 0:3] = np.einsum("vi,kij->kvj", source[:, 0:3], model[:, :3, :3]) + model[:, None, 3, :3]
+            baked[:, :, 3:5] = source[:, 3:5]
+            baked[:, :, 5:8] = np.einsum("vi,kij->kvj", source[:, 5:8], normal)
+
+            if self.atlas:
+                regions = np.array(
+                    [self.objects[member].texture.rect + (self.objects[member].texture.layer,) for member in selected],
+                    dtype=np.float32
+                )
+                baked[:, :, 8:13] = regions[:, None, :]
+
+            rows = first_vertex + (selected - start)[:, None] * count + np.arange(count)
+            self.vertices[rows] = baked
+
+            first = min(first, int(rows[0, 0]))
+            end = max(end, int(rows[-1, -1]) + 1)
+
+        return first, end
+
+    def upload(self, first: int = None, end: int = None):
+
+        '''
+        Uploads the baked vertices, only the given range when the buffer size is unchanged.
+        The indices only change with the objects and are uploaded with the whole buffer.
+
+        Args:
+            first: First vertex of the range to update.
+            end: End vertex of the range to update.
+        '''
+
+        glBindBuffer(GL_ARRAY_BUFFER, self.vbo)
+
+        if first is None:
+            glBufferData(GL_ARRAY_BUFFER, self.vertices.nbytes, self.vertices, GL_STATIC_DRAW)
+
+            glBindVertexArray(self.vao)
+            glBufferData(GL_ELEMENT_ARRAY_BUFFER, self.elements.nbytes, self.elements, GL_STATIC_DRAW)
+            return
+
+        data = self.vertices[first:end]
+        glBufferSubData(GL_ARRAY_BUFFER, first * self.floats_per_vertex * 4, data.nbytes, data)
+
+    def draw(self, state=None):
+
+        '''
+        Draws the batch with one call, the program's model matrix must be the identity.
+
+        Args:
+            state: Optional StateTracker that drops redundant binds.
+        '''
+
+        if state is not None:
+            state.bind_vertex_array(self.vao)
+            state.bind_texture(self.texture.target, self.texture.get())
+        else:
+            glBindVertexArray(self.vao)
+            glActiveTexture(GL_TEXTURE0)
+            glBindTexture(self.texture.target, self.texture.get())
+
+        glDrawElements(GL_TRIANGLES, len(self.elements), GL_UNSIGNED_INT, None)
+
+    def release(self):
+
+        '''
+        Frees the batch's buffers and vertex array.
+        '''
+
+        glDeleteBuffers(2, [self.vbo, self.ebo])
+        glDeleteVertexArrays(1, [self.vao])
+
+class StaticBatcher:
+
+    '''
+    Merges the geometry of objects that do not rotate into one pre-transformed vertex
+    buffer per texture (or atlas), so they cost one draw call per batch and no
+    per-object matrix uploads.
+
+    Batches are rebuilt when their set of objects changes, objects that move without
+    rotating only have their own vertices re-baked.
+    '''
+
+    def __init__(self):
+
+        '''
+        Initializes the batcher with no batches.
+        '''
+
+        self.batches = {}
+        self.dirty = True
+
+        # per transform store row, True for objects drawn by a batch.
+        self.static_mask = np.zeros(0, dtype=bool)
+        self.object_indices = np.zeros(0, dtype=np.int64)
+        self.dynamic_objects = []
+
+        # statistics of the last update and draw.
+        self.rebuilds = 0
+        self.vertices_baked = 0
+        self.draw_calls = 0
+        self.triangles = 0
+
+    def invalidate(self):
+
+        '''
+        Marks the static set as stale, e.g. after objects were added to the scene.
+        '''
+
+        self.dirty = True
+
+    def build_batches(self, objects: list, store: TransformStore, matrices: np.ndarray, rotating: np.ndarray):
+
+        '''
+        Sorts the non-rotating objects into batches keyed by texture source and
+        rebuilds the batches whose objects changed.
+
+        Args:
+            objects: The scene's render list.
+            store: The transform store holding the objects' rows.
+            matrices: The (N, 4, 4) model matrices of the store.
+            rotating: Per-row flags of objects with a nonzero angular velocity.
+
+        Returns:
+            The keys of the batches that were rebuilt.
+        '''
+
+        self.object_indices = np.array([obj.index for obj in objects], dtype=np.int64)
+        self.static_mask = np.zeros(store.count, dtype=bool)
+        self.dynamic_objects = []
+
+        members = {}
+        rebuilt = set()
+        for obj in objects:
+            if rotating[obj.index]:
+                self.dynamic_objects.append(obj)
+            else:
+                members.setdefault(obj.texture.source, []).append(obj)
+                self.static_mask[obj.index] = True
+
+        for key, batch_objects in members.items():
+            batch = self.batches.get(key)
+            if batch is None:
+                batch = StaticBatch(batch_objects[0].texture)
+                self.batches[key] = batch
+
+            # objects switching their level of detail change the mesh to bake.
+            if batch.objects and sorted((obj.index, obj.vao) for obj in batch_objects) == batch.contents:
+                continue
+
+            batch.set_objects(batch_objects)
+            batch.bake(matrices)
+            batch.upload()
+            rebuilt.add(key)
+            self.rebuilds += 1
+            self.vertices_baked += batch.vertex_count
+
+        # drop batches that lost all their objects.
+        for key in [key for key in self.batches if key not in members]:
+            self.batches.pop(key).release()
+
+        self.dirty = False
+
+        return rebuilt
+
+    def update(self, objects: list, store: TransformStore, matrices: np.ndarray, changed: np.ndarray) -> bool:
+
+        '''
+        Brings the batches up to date with the transform store.
+
+        Args:
+            objects: The scene's render list.
+            store: The transform store holding the objects' rows.
+            matrices: The (N, 4, 4) model matrices of the store.
+            changed: Per-row flags of matrices recomputed this frame.
+
+        Returns:
+            True if the set of dynamic objects changed, renderers grouping them must rebuild.
+        '''
+
+        self.rebuilds = 0
+        self.vertices_baked = 0
+
+        rotating = store.angular_velocities[:store.count].any(axis=1)
+
+        # objects that started or stopped rotating move between the static and dynamic sets.
+        if not self.dirty and len(self.static_mask) == store.count:
+            static = self.static_mask[self.object_indices]
+            self.dirty = not np.array_equal(static, ~rotating[self.object_indices])
+
+        dynamic_changed = self.dirty
+        rebuilt = set()
+        if self.dirty:
+            rebuilt = self.build_batches(objects, store, matrices, rotating)
+
+        # static objects that were moved, scaled or turned in place, rebuilt batches
+        # were baked from this frame's matrices already.
+        moved = self.static_mask & changed[:store.count]
+        if moved.any():
+            for key, batch in self.batches.items():
+                if key in rebuilt:
+                    continue
+
+                members = np.flatnonzero(moved[batch.indices])
+                if len(members) == 0:
+                    continue
+
+                first, end = batch.bake(matrices, members)
+                batch.upload(first, end)
+                self.vertices_baked += end - first
+
+        return dynamic_changed
+
+    def draw(self, shader, visible: np.ndarray, state=None) -> int:
+
+        '''
+        Draws every batch with a visible object.
+
+        Args:
+            shader: The ShaderProgram in use.
+            visible: Per-row flags of objects inside the view frustum.
+            state: Optional StateTracker that drops redundant binds.
+
+        Returns:
+            The number of draw calls issued.
+        '''
+
+        # the baked vertices are in world space, instanced programs read the model and
+        # normal matrices from attributes that are constant when no array is enabled.
+        attribute = shader.attributes.get("instanceModel")
+        if attribute is not None:
+            for column in range(4):
+                glVertexAttrib4fv(attribute[0] + column, IDENTITY[column])
+
+            location = shader.attributes["instanceNormalMatrix"][0]
+            for column in range(3):
+                glVertexAttrib3fv(location + column, IDENTITY[column, :3])
+        else:
+            shader.set_uniform("model", IDENTITY)
+            shader.set_uniform("normalMatrix", IDENTITY[:3, :3])
+
+        self.draw_calls = 0
+        self.triangles = 0
+        for batch in self.batches.values():
+            if visible[batch.indices].any():
+                batch.draw(state)
+                self.draw_calls += 1
+                self.triangles += len(batch.elements) // 3
+
+        return self.draw_calls
+
+    def get_static_count(self) -> int:
+
+        '''
+        Returns the number of objects drawn by batches.
+        '''
+
+        return int(self.static_mask.sum())
+
+    def release(self):
+
+        '''
+        Frees all batches.
+        '''
+
+        for batch in self.batches.values():
+            batch.release()
+
+        self.batches = {}
+        self.static_mask = np.zeros(0, dtype=bool)
+        self.dynamic_objects = []
+        self.dirty = True
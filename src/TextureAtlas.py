@@ -0,0 +1,347 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import argparse
+import json
+import os
+import numpy as np
+from GLBackend import *
+from PIL import Image
+
+def pack_rectangles(sizes: list, page_size: int, padding: int = 0) -> list:
+
+    '''
+    Packs rectangles into square pages with a first-fit shelf packer.
+
+    Rectangles are placed tallest first, each on the first shelf of any page that
+    still has room, opening a new shelf or a new page when none does.
+
+    Args:
+        sizes: (width, height) of every rectangle, each at most page_size.
+        page_size: Edge length of a page.
+        padding: Gap kept around every rectangle.
+
+    Returns:
+        (page, x, y) for every rectangle, in the order of sizes.
+    '''
+
+    placements = [None] * len(sizes)
+
+    # every page is [height used by shelves, list of shelves as [y, height, x used]].
+    pages = []
+
+    order = sorted(range(len(sizes)), key=lambda index: (-sizes[index][1], -sizes[index][0]))
+    for index in order:
+        width = sizes[index][0] + 2 * padding
+        height = sizes[index][1] + 2 * padding
+
+        if width > page_size or height > page_size:
+            raise ValueError(f"rectangle {sizes[index]} does not fit a {page_size} page")
+
+        placement = None
+        for page_index, (_, shelves) in enumerate(pages):
+            for shelf in shelves:
+                if height <= shelf[1] and shelf[2] + width <= page_size:
+                    placement = (page_index, shelf[2], shelf[0])
+                    shelf[2] += width
+                    break
+            if placement is not None:
+                break
+
+        if placement is None:
+            for page_index, page in enumerate(pages):
+                if page[0] + height <= page_size:
+                    page[1].append([page[0], height, width])
+                    placement = (page_index, 0, page[0])
+                    page[0] += height
+                    break
+
+        if placement is None:
+            pages.append([height, [[0, height, width]]])
+            placement = (len(pages) - 1, 0, 0)
+
+        page_index, x, y = placement
+        placements[index] = (page_index, x + padding, y + padding)
+
+    return placements
+
+class AtlasRegion:
+
+    '''
+    The place of one image inside a texture atlas, used in place of a TextureHandle.
+    '''
+
+    def __init__(self, atlas, layer: int, rect: tuple):
+
+        '''
+        Initializes a region.
+
+        Args:
+            atlas: The TextureAtlas containing the image.
+            layer: Array texture layer of the image.
+            rect: (u, v, width, height) of the image in texture coordinates.
+        '''
+
+        self.atlas = atlas
+        self.layer = layer
+        self.rect = rect
+        self.target = GL_TEXTURE_2D_ARRAY
+
+    @property
+    def source(self):
+        return self.atlas
+
+    def get(self) -> int:
+
+        '''
+        Returns the GL name of the atlas array texture.
+        '''
+
+        return self.atlas.texture
+
+    def release(self):
+
+        '''
+        Regions live as long as their atlas, nothing to release.
+        '''
+
+class TextureAtlas:
+
+    '''
+    Packs many images into the layers of one GL_TEXTURE_2D_ARRAY so objects refer
+    to their texture by layer and UV rectangle and can be drawn with a single bind.
+    '''
+
+    def __init__(self, page_size: int = 2048, padding: int = 2):
+
+        '''
+        Initializes an empty atlas.
+
+        Args:
+            page_size: Edge length of every layer.
+            padding: Pixels kept free around every image against filtering bleed.
+        '''
+
+        self.page_size = page_size
+        self.padding = padding
+        self.paths = []
+        self.regions = {}
+        self.pages = []
+        self.texture = None
+
+    def add_image(self, path: str):
+
+        '''
+        Adds an image file to be packed by the next build.
+
+        Args:
+            path: Path to the image file.
+        '''
+
+        path = os.path.abspath(path)
+        if path not in self.paths:
+            self.paths.append(path)
+
+    def add_directory(self, directory: str, extensions: tuple = (".png", ".jpg", ".jpeg")):
+
+        '''
+        Adds every image file in a directory.
+
+        Args:
+            directory: Directory to scan.
+            extensions: File extensions treated as images.
+        '''
+
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith(extensions):
+                self.add_image(os.path.join(directory, name))
+
+    def build(self):
+
+        '''
+        Decodes, packs and composes all added images into layer pixel arrays.
+        Does not need a GL context.
+        '''
+
+        limit = self.page_size - 2 * self.padding
+        images = []
+        for path in self.paths:
+            image = Image.open(path).convert("RGBA")
+
+            # images larger than a layer are scaled down to fit.
+            if image.width > limit or image.height > limit:
+                image.thumbnail((limit, limit))
+
+            images.append(image)
+
+        placements = pack_rectangles([image.size for image in images], self.page_size, self.padding)
+
+        layer_count = max((page for page, _, _ in placements), default=-1) + 1
+        self.pages = [np.zeros((self.page_size, self.page_size, 4), dtype=np.uint8) for _ in range(layer_count)]
+        self.regions = {}
+
+        for path, image, (layer, x, y) in zip(self.paths, images, placements):
+            self.pages[layer][y:y + image.height, x:x + image.width] = np.asarray(image)
+            self.regions[path] = AtlasRegion(self, layer, (
+                x / self.page_size,
+                y / self.page_size,
+                image.width / self.page_size,
+                image.height / self.page_size
+            ))
+
+    def get_efficiency(self) -> float:
+
+        '''
+        Returns the fraction of layer area covered by images.
+        '''
+
+        if not self.pages:
+            return 0.0
+
+        used = sum(region.rect[2] * region.rect[3] for region in self.regions.values())
+        return used / len(self.pages)
+
+    def report(self) -> dict:
+
+        '''
+        Returns packing statistics.
+
+        Returns:
+            A dict with image and layer counts, layer size and packing efficiency.
+        '''
+
+        return {
+            "images": len(self.regions),
+            "layers": len(self.pages),
+            "page_size": self.page_size,
+            "efficiency": self.get_efficiency(),
+        }
+
+    def get_region(self, path: str) -> AtlasRegion:
+
+        '''
+        Returns the region of an image.
+
+        Args:
+            path: Path to the image file.
+
+        Returns:
+            The AtlasRegion of the image, or None if it is not in the atlas.
+        '''
+
+        return self.regions.get(os.path.abspath(path))
+
+    def save(self, directory: str):
+
+        '''
+        Writes the layers as PNG files and the regions as atlas.json (offline build).
+
+        Args:
+            directory: Output directory.
+        '''
+
+        os.makedirs(directory, exist_ok=True)
+
+        for layer, pixels in enumerate(self.pages):
+            Image.fromarray(pixels).save(os.path.join(directory, f"layer_{layer}.png"))
+
+        description = {
+            "page_size": self.page_size,
+            "padding": self.padding,
+            "layers": len(self.pages),
+            "regions": {
+                os.path.relpath(path, directory): {"layer": region.layer, "rect": region.rect}
+                for path, region in self.regions.items()
+            },
+        }
+
+        with open(os.path.join(directory, "atlas.json"), "w") as f:
+            json.dump(description, f, indent=2)
+
+    @staticmethod
+    def load(directory: str):
+
+        '''
+        Loads an atlas written by save.
+
+        Args:
+            directory: Directory containing atlas.json and the layer images.
+
+        Returns:
+            The TextureAtlas, ready to upload.
+        '''
+
+        with open(os.path.join(directory, "atlas.json"), "r") as f:
+            description = json.load(f)
+
+        atlas = TextureAtlas(description["page_size"], description["padding"])
+        atlas.pages = [
+            np.asarray(Image.open(os.path.join(directory, f"layer_{layer}.png")).convert("RGBA"))
+            for layer in range(description["layers"])
+        ]
+
+        for path, region in description["regions"].items():
+            path = os.path.abspath(os.path.join(directory, path))
+            atlas.paths.append(path)
+            atlas.regions[path] = AtlasRegion(atlas, region["layer"], tuple(region["rect"]))
+
+        return atlas
+
+    def upload(self) -> int:
+
+        '''
+        Creates the GL_TEXTURE_2D_ARRAY holding all layers.
+
+        Returns:
+            The GL texture name.
+        '''
+
+        pixels = np.ascontiguousarray(np.stack(self.pages))
+
+        self.texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D_ARRAY, self.texture)
+
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D_ARRAY, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+
+        glTexImage3D(GL_TEXTURE_2D_ARRAY, 0, GL_RGBA, self.page_size, self.page_size,
+                     len(self.pages), 0, GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+
+        return self.texture
+
+    def release(self):
+
+        '''
+        Deletes the array texture, e.g. before the GL context is destroyed. The pages
+        are kept, so the atlas can be uploaded again.
+        '''
+
+        if self.texture is not None:
+            glDeleteTextures(1, [self.texture])
+            self.texture = None
+
+if __name__ == "__main__":
+
+    # offline build: python3 TextureAtlas.py textures/frames textures/walls textures/paintings -o atlas
+    parser = argparse.ArgumentParser(description="Pack texture directories into an array texture atlas.")
+    parser.add_argument("directories", nargs="+")
+    parser.add_argument("-o", "--output", default="atlas")
+    parser.add_argument("--page-size", type=int, default=2048)
+    parser.add_argument("--padding", type=int, default=2)
+
+    args = parser.parse_args()
+
+    atlas = TextureAtlas(args.page_size, args.padding)
+    for directory in args.directories:
+        atlas.add_directory(directory)
+
+    atlas.build()
+    atlas.save(args.output)
+    print(atlas.report())
@@ -0,0 +1,254 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import hashlib
+import io
+import os
+import struct
+import tempfile
+import time
+import numpy as np
+from PIL import Image
+
+class TextureData:
+
+    '''
+    Decoded or memory-mapped pixels of a texture's mip chain, plus load statistics.
+    '''
+
+    def __init__(self, levels: list, bytes_read: int, decode_seconds: float, from_cache: bool):
+
+        '''
+        Initializes texture data.
+
+        Args:
+            levels: (height, width, 4) uint8 RGBA arrays, the base level first.
+            bytes_read: Bytes read from disk to produce the data.
+            decode_seconds: Time spent hashing, decoding and building the mip chain.
+            from_cache: True if the levels were mapped from a cache file.
+        '''
+
+        self.levels = levels
+        self.bytes_read = bytes_read
+        self.decode_seconds = decode_seconds
+        self.from_cache = from_cache
+
+    @property
+    def width(self) -> int:
+        return self.levels[0].shape[1]
+
+    @property
+    def height(self) -> int:
+        return self.levels[0].shape[0]
+
+    @property
+    def nbytes(self) -> int:
+        return sum(level.nbytes for level in self.levels)
+
+def build_mip_chain(image: Image.Image, max_size: int = None, mipmaps: bool = True) -> list:
+
+    '''
+    Downscales an image to at most max_size and builds its box-filtered mip chain.
+
+    Args:
+        image: RGBA image.
+        max_size: Maximum edge length of the base level, None keeps the full size.
+        mipmaps: Build all levels down to 1x1, otherwise only the base level.
+
+    Returns:
+        (height, width, 4) uint8 arrays, the base level first.
+    '''
+
+    if max_size is not None and max(image.size) > max_size:
+        image = image.copy()
+        image.thumbnail((max_size, max_size), Image.LANCZOS)
+
+    levels = [np.asarray(image)]
+    while mipmaps and (image.width > 1 or image.height > 1):
+        image = image.resize((max(1, image.width // 2), max(1, image.height // 2)), Image.BOX)
+        levels.append(np.asarray(image))
+
+    return levels
+
+class TextureCache:
+
+    '''
+    Preprocesses textures into binary cache files next to their source images.
+
+    A cache file holds the whole mip chain as raw RGBA and is keyed by a hash of
+    the source file's content and the preprocessing settings. Later loads map it
+    with np.memmap and upload straight from the mapping, skipping PIL entirely.
+    '''
+
+    SUFFIX = ".texcache"
+    MAGIC = b"DMTEXC01"
+
+    # magic, key digest, level count, then (width, height, offset) per level.
+    HEADER = struct.Struct("<8s32sI")
+    LEVEL = struct.Struct("<IIQ")
+    ALIGNMENT = 64
+
+    def __init__(self, max_size: int = None, mipmaps: bool = True, write: bool = True):
+
+        '''
+        Initializes the cache.
+
+        Args:
+            max_size: Maximum edge length of the base level.
+            mipmaps: Store a full mip chain, disable to generate mipmaps on the GPU instead.
+            write: Write cache files for textures that are not cached yet.
+        '''
+
+        self.max_size = max_size
+        self.mipmaps = mipmaps
+        self.write = write
+
+    def get_cache_path(self, path: str) -> str:
+
+        '''
+        Returns the path of the cache file next to a source image.
+        '''
+
+        return path + self.SUFFIX
+
+    def get_key(self, source: bytes) -> bytes:
+
+        '''
+        Hashes the source content together with the preprocessing settings.
+        '''
+
+        settings = f"{self.max_size}:{self.mipmaps}".encode()
+        return hashlib.sha256(source + settings).digest()
+
+    def load(self, path: str) -> TextureData:
+
+        '''
+        Loads a texture, from its cache file when it is up to date.
+
+        Args:
+            path: Path to the source image.
+
+        Returns:
+            The TextureData of the texture.
+        '''
+
+        start = time.perf_counter()
+
+        with open(path, "rb") as f:
+            source = f.read()
+
+        key = self.get_key(source)
+        cache_path = self.get_cache_path(path)
+
+        levels = self.read(cache_path, key)
+        if levels is not None:
+            return TextureData(levels, len(source) + sum(level.nbytes for level in levels),
+                               time.perf_counter() - start, True)
+
+        image = Image.open(io.BytesIO(source)).convert("RGBA")
+        levels = build_mip_chain(image, self.max_size, self.mipmaps)
+
+        if self.write:
+            self.store(cache_path, key, levels)
+
+        return TextureData(levels, len(source), time.perf_counter() - start, False)
+
+    def read(self, cache_path: str, key: bytes) -> list:
+
+        '''
+        Maps the levels of a cache file.
+
+        Args:
+            cache_path: Path to the cache file.
+            key: Expected key digest.
+
+        Returns:
+            The mapped levels, or None if the file is missing, stale or truncated
+            (e.g. by a killed run or a full disk), so it is decoded and rewritten.
+        '''
+
+        # np.memmap cannot map empty files.
+        if not os.path.exists(cache_path) or os.path.getsize(cache_path) < self.HEADER.size:
+            return None
+
+        mapping = np.memmap(cache_path, dtype=np.uint8, mode="r")
+
+        magic, digest, count = self.HEADER.unpack_from(mapping, 0)
+        if magic != self.MAGIC or digest != key:
+            return None
+
+        if self.HEADER.size + count * self.LEVEL.size > len(mapping):
+            return None
+
+        levels = []
+        for level in range(count):
+            width, height, offset = self.LEVEL.unpack_from(mapping, self.HEADER.size + level * self.LEVEL.size)
+            if offset + width * height * 4 > len(mapping):
+                return None
+
+            levels.append(mapping[offset:offset + width * height * 4].reshape(height, width, 4))
+
+        return levels
+
+    def store(self, cache_path: str, key: bytes, levels: list):
+
+        '''
+        Writes a cache file, atomically so concurrent loaders never see partial files.
+
+        Args:
+            cache_path: Path to the cache file.
+            key: Key digest of the source.
+            levels: The mip chain.
+        '''
+
+        table_end = self.HEADER.size + len(levels) * self.LEVEL.size
+
+        offsets = []
+        offset = table_end
+        for level in levels:
+            offset += -offset % self.ALIGNMENT
+            offsets.append(offset)
+            offset += level.nbytes
+
+        temporary_path = None
+        try:
+            descriptor, temporary_path = tempfile.mkstemp(dir=os.path.dirname(cache_path) or ".")
+            with os.fdopen(descriptor, "wb") as f:
+                f.write(self.HEADER.pack(self.MAGIC, key, len(levels)))
+                for level, offset in zip(levels, offsets):
+                    f.write(self.LEVEL.pack(level.shape[1], level.shape[0], offset))
+
+                for level, offset in zip(levels, offsets):
+                    f.write(bytes(offset - f.tell()))
+                    f.write(np.ascontiguousarray(level).tobytes())
+
+            os.chmod(temporary_path, 0o644)
+            os.replace(temporary_path, cache_path)
+        except OSError:
+            # a read-only texture directory only costs the cache, not the texture.
+            if temporary_path is not None and os.path.exists(temporary_path):
+                os.remove(temporary_path)
+
+if __name__ == "__main__":
+
+    # offline preprocessing: python3 TextureCache.py textures/frames textures/walls textures/paintings
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Write texture cache files next to images.")
+    parser.add_argument("directories", nargs="+")
+    parser.add_argument("--max-size", type=int)
+
+    args = parser.parse_args()
+    cache = TextureCache(max_size=args.max_size)
+
+    for directory in args.directories:
+        for name in sorted(os.listdir(directory)):
+            if name.lower().endswith((".png", ".jpg", ".jpeg")):
+                data = cache.load(os.path.join(directory, name))
+                print(f"{name}: {len(data.levels)} levels, {data.nbytes} bytes, "
+                      f"{data.decode_seconds * 1000:.1f} ms, cached: {data.from_cache}")
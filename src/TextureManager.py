@@ -0,0 +1,382 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+from collections import OrderedDict
+import os
+from GLBackend import *
+from TextureCache import TextureCache
+
+class TextureHandle:
+
+    '''
+    Shared, reference-counted handle to a texture owned by a TextureManager.
+    '''
+
+    def __init__(self, manager, key: tuple):
+
+        '''
+        Initializes a handle that is not yet resident on the GPU.
+
+        Args:
+            manager: The TextureManager that owns the texture.
+            key: (path, min filter, mag filter, wrap s, wrap t) of the texture.
+        '''
+
+        self.manager = manager
+        self.key = key
+        self.path = key[0]
+        self.texture = None
+        self.target = GL_TEXTURE_2D
+        self.loading = False
+        self.nbytes = 0
+        self.ref_count = 0
+
+        # size and mip levels of the resident texture, the finest level sampled.
+        self.width = 0
+        self.height = 0
+        self.level_count = 0
+        self.base_level = 0
+
+    @property
+    def source(self):
+        return self
+
+    def get(self) -> int:
+
+        '''
+        Returns the GL texture name, reloading the texture if it was evicted.
+
+        Returns:
+            The GL texture name, or the placeholder while the texture is loading.
+        '''
+
+        return self.manager.get(self)
+
+    def set_base_level(self, level: int):
+
+        '''
+        Limits sampling to mip level and coarser, leaves the texture bound to the active unit.
+
+        Args:
+            level: The finest mip level that may be sampled.
+        '''
+
+        if level == self.base_level or self.texture is None:
+            return
+
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_BASE_LEVEL, level)
+        self.base_level = level
+
+    def release(self):
+
+        '''
+        Gives this reference back to the manager.
+        '''
+
+        self.manager.release(self)
+
+class TextureManager:
+
+    '''
+    Loads each texture once per path and sampler settings, hands out reference-counted
+    handles and keeps the resident textures under a GPU memory budget with LRU eviction.
+    '''
+
+    def __init__(self, budget_bytes: int = 1024 * 1024 * 1024, loader=None, cache: TextureCache = None,
+                 gpu_mipmaps: bool = False):
+
+        '''
+        Initializes an empty manager.
+
+        Args:
+            budget_bytes: Maximum number of bytes of resident texture data.
+            loader: Optional AssetLoader, textures then load in the background
+                and the placeholder texture is used until they arrive.
+            cache: TextureCache used to load images, defaults to one with full mip chains.
+            gpu_mipmaps: Generate mipmaps with glGenerateMipmap for textures loaded
+                without a mip chain.
+        '''
+
+        self.budget_bytes = budget_bytes
+        self.loader = loader
+        self.cache = cache or TextureCache()
+        self.gpu_mipmaps = gpu_mipmaps
+        self.atlas = None
+        self.placeholder = None
+        self.handles = {}
+
+        # resident textures, least recently used first.
+        self.resident = OrderedDict()
+        self.resident_bytes = 0
+
+        # counters, hits are acquires served by a resident texture, misses are loads.
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        # bytes read, decode time and cache use of every loaded texture, by path.
+        self.load_stats = {}
+
+    def acquire(self, path: str, min_filter=GL_LINEAR_MIPMAP_LINEAR, mag_filter=GL_LINEAR,
+                wrap_s=GL_REPEAT, wrap_t=GL_REPEAT, references: int = 1) -> TextureHandle:
+
+        '''
+        Returns a handle to the texture for path and sampler settings, loading it on first use.
+
+        Args:
+            path: Path to the texture image file.
+            min_filter: Minification filter.
+            mag_filter: Magnification filter.
+            wrap_s: Wrap mode along s.
+            wrap_t: Wrap mode along t.
+            references: Number of references to take at once, for batched loading.
+
+        Returns:
+            The shared TextureHandle, with its reference count incremented, or the
+            image's AtlasRegion when an atlas is in use.
+        '''
+
+        if self.atlas is not None:
+            region = self.atlas.get_region(path)
+            if region is None:
+                raise ValueError(f"texture {path} is not part of the texture atlas")
+            return region
+
+        key = (os.path.abspath(path), int(min_filter), int(mag_filter), int(wrap_s), int(wrap_t))
+
+        handle = self.handles.get(key)
+        if handle is None:
+            handle = TextureHandle(self, key)
+            self.handles[key] = handle
+        elif handle.texture is not None:
+            # a deduplicated texture that did not have to be loaded again.
+            self.hits += 1
+
+        handle.ref_count += references
+        self.get(handle)
+
+        return handle
+
+    def get(self, handle: TextureHandle) -> int:
+
+        '''
+        Marks a texture as used and makes sure it is resident.
+
+        Args:
+            handle: The texture handle.
+
+        Returns:
+            The GL texture name, or the placeholder while the texture is loading.
+        '''
+
+        if handle.texture is None:
+            if not handle.loading:
+                self.misses += 1
+                self.load(handle)
+
+            if handle.texture is None:
+                return self.get_placeholder()
+        else:
+            self.resident.move_to_end(handle.key)
+
+        return handle.texture
+
+    def get_placeholder(self) -> int:
+
+        '''
+        Returns a 1x1 grey texture drawn while real textures are loading.
+
+        Returns:
+            The GL texture name of the placeholder.
+        '''
+
+        if self.placeholder is None:
+            self.placeholder = glGenTextures(1)
+            glBindTexture(GL_TEXTURE_2D, self.placeholder)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            glTexImage2D(GL_TEXTURE_2D, 0, GL_RGBA, 1, 1, 0, GL_RGBA, GL_UNSIGNED_BYTE, bytes([160, 160, 160, 255]))
+
+        return self.placeholder
+
+    def load(self, handle: TextureHandle):
+
+        '''
+        Loads a texture from its image file, in the background if a loader is set.
+
+        Args:
+            handle: The texture handle to make resident.
+        '''
+
+        if self.loader is not None:
+            handle.loading = True
+            self.loader.request(handle)
+            return
+
+        self.upload(handle, self.cache.load(handle.path))
+
+    def upload(self, handle: TextureHandle, data, offsets: list = None):
+
+        '''
+        Creates the GL texture of a handle and evicts others if the budget is exceeded.
+
+        Args:
+            handle: The texture handle to make resident.
+            data: The TextureData returned by the texture cache.
+            offsets: Offsets of the levels in the bound pixel unpack buffer, None
+                to upload from the arrays in data.
+        '''
+
+        handle.loading = False
+        self.load_stats[handle.path] = {
+            "bytes_read": data.bytes_read,
+            "decode_seconds": data.decode_seconds,
+            "from_cache": data.from_cache,
+        }
+
+        # the last reference was released while the texture was loading.
+        if self.handles.get(handle.key) is not handle:
+            return
+
+        path, min_filter, mag_filter, wrap_s, wrap_t = handle.key
+
+        texture = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, texture)
+
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, min_filter)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, mag_filter)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, wrap_s)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, wrap_t)
+
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, len(data.levels) - 1)
+
+        for level, pixels in enumerate(data.levels):
+            if offsets is not None:
+                pixels = ctypes.c_void_p(offsets[level])
+
+            glTexImage2D(GL_TEXTURE_2D, level, GL_RGBA, data.levels[level].shape[1],
+                         data.levels[level].shape[0], 0, GL_RGBA, GL_UNSIGNED_BYTE, pixels)
+
+        handle.texture = texture
+        handle.nbytes = data.nbytes
+        handle.width = data.width
+        handle.height = data.height
+        handle.level_count = len(data.levels)
+        handle.base_level = 0
+
+        if self.gpu_mipmaps and len(data.levels) == 1:
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAX_LEVEL, 1000)
+            glGenerateMipmap(GL_TEXTURE_2D)
+
+            # a full chain adds about a third to the base level.
+            handle.nbytes = data.nbytes * 4 // 3
+            handle.level_count = max(data.width, data.height).bit_length()
+
+        self.resident[handle.key] = handle
+        self.resident_bytes += handle.nbytes
+
+        self.enforce_budget(keep=handle)
+
+    def enforce_budget(self, keep: TextureHandle = None):
+
+        '''
+        Evicts least recently used textures until the resident bytes fit the budget.
+
+        Args:
+            keep: A texture that must stay resident, e.g. the one just loaded.
+        '''
+
+        for key in list(self.resident):
+            if self.resident_bytes <= self.budget_bytes:
+                break
+
+            handle = self.resident[key]
+            if handle is not keep:
+                self.evict(handle)
+
+    def evict(self, handle: TextureHandle):
+
+        '''
+        Frees a texture's GPU memory, the texture is reloaded on its next use.
+
+        Args:
+            handle: The resident texture handle.
+        '''
+
+        glDeleteTextures(1, [handle.texture])
+
+        del self.resident[handle.key]
+        self.resident_bytes -= handle.nbytes
+        handle.texture = None
+        self.evictions += 1
+
+        if handle.ref_count == 0:
+            del self.handles[handle.key]
+
+    def clear(self):
+
+        '''
+        Frees every resident texture and the placeholder, e.g. before the GL context
+        is destroyed. Textures still referenced are reloaded on their next use.
+        '''
+
+        for handle in list(self.resident.values()):
+            self.evict(handle)
+
+        if self.placeholder is not None:
+            glDeleteTextures(1, [self.placeholder])
+            self.placeholder = None
+
+    def release(self, handle: TextureHandle):
+
+        '''
+        Drops one reference to a texture. Unreferenced textures stay cached until evicted.
+
+        Args:
+            handle: The handle previously returned by acquire.
+        '''
+
+        handle.ref_count -= 1
+        if handle.ref_count == 0 and handle.texture is None:
+            del self.handles[handle.key]
+            handle.loading = False
+
+    def set_budget(self, budget_bytes: int):
+
+        '''
+        Changes the GPU memory budget, evicting textures if needed.
+
+        Args:
+            budget_bytes: Maximum number of bytes of resident texture data.
+        '''
+
+        self.budget_bytes = budget_bytes
+        self.enforce_budget()
+
+    def stats(self) -> dict:
+
+        '''
+        Returns the manager counters.
+
+        Returns:
+            A dict with hit/miss/eviction counters and resident texture memory.
+        '''
+
+        return {
+            "textures": len(self.handles),
+            "resident": len(self.resident),
+            "resident_bytes": self.resident_bytes,
+            "budget_bytes": self.budget_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+# manager shared by all objects.
+textures = TextureManager()
@@ -0,0 +1,355 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import numpy as np
+
+class TransformStore:
+
+    '''
+    Keeps the transforms of all objects in contiguous (N, 3) float32 arrays and
+    computes their model matrices in one batched pass.
+
+    Composed matrices and their normal matrices are cached per row and only
+    recomputed for rows flagged dirty, i.e. rows that were allocated, assigned or
+    rotated since the last pass.
+    '''
+
+    def __init__(self, capacity: int = 64):
+
+        '''
+        Initializes an empty store.
+
+        Args:
+            capacity: Number of objects to reserve room for, the store grows when full.
+        '''
+
+        self.count = 0
+        self.free_indices = []
+
+        self.positions = np.zeros((capacity, 3), dtype=np.float32)
+        self.angles = np.zeros((capacity, 3), dtype=np.float32)
+        self.scales = np.ones((capacity, 3), dtype=np.float32)
+        self.angular_velocities = np.zeros((capacity, 3), dtype=np.float32)
+
+        # local bounding box of every object's mesh, the unit cube unless set.
+        self.bounds_min = np.full((capacity, 3), -0.5, dtype=np.float32)
+        self.bounds_max = np.full((capacity, 3), 0.5, dtype=np.float32)
+
+        # matrix cache.
+        self.matrices = np.zeros((capacity, 4, 4), dtype=np.float32)
+        self.normal_matrices = np.zeros((capacity, 3, 3), dtype=np.float32)
+        self.dirty = np.ones(capacity, dtype=bool)
+        self.changed = np.zeros(capacity, dtype=bool)
+
+        # interpolation fraction the cached matrices were computed with.
+        self.alpha = 0.0
+
+        # cache statistics of the last model_matrices call.
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+    def reserve(self, capacity: int):
+
+        '''
+        Grows the arrays so that they can hold at least capacity objects.
+
+        Args:
+            capacity: The required number of rows.
+        '''
+
+        if capacity <= len(self.positions):
+            return
+
+        capacity = max(capacity, 2 * len(self.positions))
+
+        for name, fill in (("positions", 0), ("angles", 0), ("scales", 1), ("angular_velocities", 0),
+                           ("bounds_min", -0.5), ("bounds_max", 0.5)):
+            old = getattr(self, name)
+            new = np.full((capacity, 3), fill, dtype=np.float32)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+        matrices = np.zeros((capacity, 4, 4), dtype=np.float32)
+        matrices[:len(self.matrices)] = self.matrices
+        self.matrices = matrices
+
+        normal_matrices = np.zeros((capacity, 3, 3), dtype=np.float32)
+        normal_matrices[:len(self.normal_matrices)] = self.normal_matrices
+        self.normal_matrices = normal_matrices
+
+        dirty = np.ones(capacity, dtype=bool)
+        dirty[:len(self.dirty)] = self.dirty
+        self.dirty = dirty
+        self.changed = np.zeros(capacity, dtype=bool)
+
+    def allocate(self, position, angles, scale, angular_velocity) -> int:
+
+        '''
+        Adds an object to the store.
+
+        Args:
+            position: Position of the object in 3D space.
+            angles: Euler angles in degrees.
+            scale: Scale factors along the X, Y, and Z axes.
+            angular_velocity: Change of the Euler angles per update.
+
+        Returns:
+            The row index of the object.
+        '''
+
+        if self.free_indices:
+            index = self.free_indices.pop()
+        else:
+            self.reserve(self.count + 1)
+            index = self.count
+            self.count += 1
+
+        self.positions[index] = position
+        self.angles[index] = angles
+        self.scales[index] = scale
+        self.angular_velocities[index] = angular_velocity
+        self.bounds_min[index] = -0.5
+        self.bounds_max[index] = 0.5
+        self.dirty[index] = True
+
+        return index
+
+    def allocate_many(self, positions, angles, scales, angular_velocities) -> np.ndarray:
+
+        '''
+        Appends many objects at once as contiguous rows.
+
+        Args:
+            positions: (N, 3) positions.
+            angles: (N, 3) Euler angles in degrees.
+            scales: (N, 3) scale factors.
+            angular_velocities: (N, 3) changes of the Euler angles per update.
+
+        Returns:
+            The row indices of the objects.
+        '''
+
+        count = len(positions)
+        start = self.count
+        self.reserve(start + count)
+
+        rows = slice(start, start + count)
+        self.positions[rows] = positions
+        self.angles[rows] = angles
+        self.scales[rows] = scales
+        self.angular_velocities[rows] = angular_velocities
+        self.dirty[rows] = True
+        self.count += count
+
+        return np.arange(start, start + count)
+
+    def set_bounds(self, index: int, local_min, local_max):
+
+        '''
+        Sets the local bounding box of a row's mesh, used for culling.
+
+        Args:
+            index: Row index of the object.
+            local_min: Minimum corner of the mesh's box.
+            local_max: Maximum corner of the mesh's box.
+        '''
+
+        self.bounds_min[index] = local_min
+        self.bounds_max[index] = local_max
+        self.dirty[index] = True
+
+    def free(self, index: int):
+
+        '''
+        Returns a row to the store so a later allocation can reuse it.
+
+        Args:
+            index: Row index previously returned by allocate.
+        '''
+
+        # a freed row collapses to a point and stops rotating.
+        self.scales[index] = 0
+        self.angular_velocities[index] = 0
+        self.dirty[index] = True
+        self.free_indices.append(index)
+
+    def advance(self):
+
+        '''
+        Advances all angles by their angular velocities, only rotating rows become dirty.
+        '''
+
+        self.angles[:self.count] += self.angular_velocities[:self.count]
+        self.dirty[:self.count] |= self.angular_velocities[:self.count].any(axis=1)
+
+    def mark_dirty(self, index: int):
+
+        '''
+        Flags a row whose transform was modified in place.
+
+        Args:
+            index: Row index of the modified object.
+        '''
+
+        self.dirty[index] = True
+
+    def get_rotation_mxs(self, indices: np.ndarray, alpha: float = 0.0) -> np.ndarray:
+
+        '''
+        Constructs the rotation matrices of the given rows from their Euler angles.
+
+        Args:
+            indices: Row indices to compute.
+            alpha: Fraction of the next tick's rotation to add, for interpolated rendering.
+
+        Returns:
+            An (M, 3, 3) float32 array with Rz * Ry * Rx for every row.
+        '''
+
+        count = len(indices)
+        angles = self.angles[indices]
+        if alpha:
+            angles = angles + alpha * self.angular_velocities[indices]
+
+        radians = np.radians(angles)
+        cos = np.cos(radians)
+        sin = np.sin(radians)
+
+        rotation_x = np.zeros((count, 3, 3), dtype=np.float32)
+        rotation_x[:, 0, 0] = 1
+        rotation_x[:, 1, 1] = cos[:, 0]
+        rotation_x[:, 1, 2] = -sin[:, 0]
+        rotation_x[:, 2, 1] = sin[:, 0]
+        rotation_x[:, 2, 2] = cos[:, 0]
+
+        rotation_y = np.zeros((count, 3, 3), dtype=np.float32)
+        rotation_y[:, 0, 0] = cos[:, 1]
+        rotation_y[:, 0, 2] = sin[:, 1]
+        rotation_y[:, 1, 1] = 1
+        rotation_y[:, 2, 0] = -sin[:, 1]
+        rotation_y[:, 2, 2] = cos[:, 1]
+
+        rotation_z = np.zeros((count, 3, 3), dtype=np.float32)
+        rotation_z[:, 0, 0] = cos[:, 2]
+        rotation_z[:, 0, 1] = -sin[:, 2]
+        rotation_z[:, 1, 0] = sin[:, 2]
+        rotation_z[:, 1, 1] = cos[:, 2]
+        rotation_z[:, 2, 2] = 1
+
+        return np.einsum("nij,njk,nkl->nil", rotation_z, rotation_y, rotation_x, optimize=True)
+
+    def compose(self, indices: np.ndarray, alpha: float = 0.0) -> np.ndarray:
+
+        '''
+        Computes the model matrices of the given rows, equal to Cube.transform() for each row.
+
+        Args:
+            indices: Row indices to compute.
+            alpha: Fraction of the next tick's rotation to add, for interpolated rendering.
+
+        Returns:
+            An (M, 4, 4) float32 array of scale * rotation * translation matrices.
+        '''
+
+        # scale * rotation scales the rows, translation fills the last row.
+        matrices = np.zeros((len(indices), 4, 4), dtype=np.float32)
+        matrices[:, :3, :3] = self.scales[indices, :, None] * self.get_rotation_mxs(indices, alpha)
+        matrices[:, 3, :3] = self.positions[indices]
+        matrices[:, 3, 3] = 1
+
+        return matrices
+
+    @staticmethod
+    def get_normal_mxs(matrices: np.ndarray) -> np.ndarray:
+
+        '''
+        Computes the matrices that transform normals of the given model matrices.
+
+        The result is the inverse transpose of the upper 3x3 scaled by the absolute
+        determinant (the cofactor matrix), so it also exists for flat objects with
+        a zero scale. Normals are normalized after transforming, the scale does not matter.
+
+        Args:
+            matrices: (M, 4, 4) model matrices.
+
+        Returns:
+            An (M, 3, 3) float32 array, row-vector normals are transformed by normal @ mx.
+        '''
+
+        rows = matrices[:, :3, :3]
+        cofactors = np.stack((
+            np.cross(rows[:, 1], rows[:, 2]),
+            np.cross(rows[:, 2], rows[:, 0]),
+            np.cross(rows[:, 0], rows[:, 1])
+        ), axis=1)
+
+        # mirroring matrices flip the cofactors, keep the normals facing out.
+        determinants = np.einsum("ni,ni->n", rows[:, 0], cofactors[:, 0])
+        cofactors[determinants < 0] *= -1
+
+        return cofactors.astype(np.float32, copy=False)
+
+    def is_animating(self) -> bool:
+
+        '''
+        Returns True if any object has a nonzero angular velocity.
+        '''
+
+        return bool(self.angular_velocities[:self.count].any())
+
+    def model_matrices(self, alpha: float = 0.0) -> np.ndarray:
+
+        '''
+        Returns the model matrices of all objects, recomputing only the dirty rows
+        together with their normal matrices (see get_normal_matrices).
+
+        The rows recomputed by this call are flagged in self.changed so renderers
+        can skip re-uploading matrices that did not change.
+
+        Args:
+            alpha: Fraction of the next tick's rotation to add, for rendering between
+                fixed simulation ticks.
+
+        Returns:
+            An (N, 4, 4) float32 view of the matrix cache.
+        '''
+
+        # rotating rows also move between ticks when interpolating.
+        if alpha != self.alpha:
+            self.dirty[:self.count] |= self.angular_velocities[:self.count].any(axis=1)
+            self.alpha = alpha
+
+        dirty = self.dirty[:self.count]
+        indices = np.flatnonzero(dirty)
+
+        if len(indices):
+            matrices = self.compose(indices, alpha)
+            self.matrices[indices] = matrices
+            self.normal_matrices[indices] = self.get_normal_mxs(matrices)
+
+        self.changed[:self.count] = dirty
+        dirty[:] = False
+
+        self.cache_misses = len(indices)
+        self.cache_hits = self.count - self.cache_misses
+
+        return self.matrices[:self.count]
+
+    def get_normal_matrices(self) -> np.ndarray:
+
+        '''
+        Returns the normal matrices of all objects as of the last model_matrices call.
+
+        Returns:
+            An (N, 3, 3) float32 view of the normal matrix cache.
+        '''
+
+        return self.normal_matrices[:self.count]
+
+# store shared by all objects.
+store = TransformStore()
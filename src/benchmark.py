@@ -0,0 +1,1132 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+
+def spawn_cubes(scene, count: int, rng: np.random.Generator, texture_path: str, angular_velocity=(0, 1, 0)):
+
+    '''
+    Adds small randomly placed cubes to a scene until it holds count objects.
+
+    Args:
+        scene: The scene to fill.
+        count: Target number of objects in the scene.
+        rng: Random generator used for positions and angles.
+        texture_path: Texture shared by all spawned cubes.
+        angular_velocity: Rotation of the cubes per tick, zero for static cubes.
+    '''
+
+    from Cube import Cube
+
+    while len(scene.objects) < count:
+        scene.add_object(Cube(
+            position=rng.uniform(-4, 4, 3).tolist(),
+            angles=rng.uniform(0, 360, 3).tolist(),
+            scale=[0.05, 0.05, 0.05],
+            angular_velocity=list(angular_velocity),
+            texture_path=texture_path
+        ))
+
+def time_frames(scene, frames: int) -> np.ndarray:
+
+    '''
+    Renders a number of frames and measures each one.
+
+    Args:
+        scene: The scene to render.
+        frames: Number of frames to render.
+
+    Returns:
+        The frame times in milliseconds.
+    '''
+
+    from GLBackend import glFinish
+
+    times = np.zeros(frames)
+    for frame in range(frames):
+        start = time.perf_counter()
+
+        pump_events(scene)
+        scene.update()
+        scene.camera.start()
+        scene.display()
+        glFinish()
+        scene.present()
+
+        times[frame] = (time.perf_counter() - start) * 1000.0
+
+    return times
+
+def pump_events(scene):
+
+    '''
+    Keeps the window responsive, nothing to do when rendering offscreen.
+    '''
+
+    if scene.window is not None:
+        from sdl2 import SDL_PumpEvents
+        SDL_PumpEvents()
+
+def create_scene(args, **kwargs):
+
+    '''
+    Creates a scene without vsync, offscreen when --headless is given.
+    '''
+
+    from Scene import Scene
+
+    return Scene(headless=args.headless, vsync=False, **kwargs)
+
+def bench_instancing(args):
+
+    '''
+    Compares draw calls and frame time of the per-object and instanced paths.
+    '''
+
+    print(f"{'mode':<10} {'cubes':>8} {'draw calls':>11} {'ms/frame':>9}")
+
+    for instanced in (False, True):
+        scene = create_scene(args, instanced=instanced)
+        rng = np.random.default_rng(args.seed)
+
+        for count in sorted(args.counts):
+            spawn_cubes(scene, count, rng, args.texture)
+            times = time_frames(scene, args.frames)
+
+            mode = "instanced" if instanced else "direct"
+            print(f"{mode:<10} {count:>8} {scene.draw_calls:>11} {np.median(times):>9.2f}")
+
+        scene.close()
+
+def bench_batching(args):
+
+    '''
+    Compares draw calls and frame time of static cubes drawn one by one and from a static batch.
+    '''
+
+    print(f"{'mode':<10} {'cubes':>8} {'draw calls':>11} {'ms/frame':>9} {'bake ms':>8}")
+
+    for static_batching in (False, True):
+        scene = create_scene(args, static_batching=static_batching)
+        rng = np.random.default_rng(args.seed)
+
+        for count in sorted(args.counts):
+            spawn_cubes(scene, count, rng, args.texture, angular_velocity=(0, 0, 0))
+
+            # the first frame after adding objects bakes the batches.
+            start = time.perf_counter()
+            scene.update()
+            scene.display()
+            bake = (time.perf_counter() - start) * 1000.0
+
+            times = time_frames(scene, args.frames)
+
+            mode = "batched" if static_batching else "direct"
+            print(f"{mode:<10} {count:>8} {scene.draw_calls:>11} {np.median(times):>9.2f} {bake:>8.1f}")
+
+        scene.close()
+
+def bench_streaming(args):
+
+    '''
+    Compares frame time of rotating instanced cubes whose instance data is reallocated
+    with glBufferData every frame and streamed through the persistently mapped ring
+    buffer, and counts the frames the ring had to wait for the GPU.
+    '''
+
+    print(f"{'mode':<11} {'cubes':>8} {'ms/frame':>9} {'cpu ms':>11} {'waits':>6} {'stall ms':>9}")
+
+    for persistent_buffers in (False, True):
+        scene = create_scene(args, instanced=True, persistent_buffers=persistent_buffers)
+        rng = np.random.default_rng(args.seed)
+
+        for count in sorted(args.counts):
+            spawn_cubes(scene, count, rng, args.texture)
+            times = time_frames(scene, args.frames)
+
+            # without waiting for the GPU after every frame, the CPU runs ahead until the ring stops it.
+            display = np.zeros(args.frames)
+            for frame in range(args.frames):
+                start = time.perf_counter()
+                scene.update()
+                scene.display()
+                display[frame] = (time.perf_counter() - start) * 1000.0
+
+            ring = scene.renderer.ring
+            stats = ring.stats() if ring is not None else {"waits": 0, "stall_ms": 0.0}
+
+            mode = "ring" if ring is not None else "bufferdata"
+            print(f"{mode:<11} {count:>8} {np.median(times):>9.2f} {np.median(display):>11.2f} "
+                  f"{stats['waits']:>6} {stats['stall_ms']:>9.1f}")
+
+        scene.close()
+
+def bench_vertex(args):
+
+    '''
+    Measures the vertex stage: static cubes are drawn into a 1x1 viewport so almost
+    no fragments are shaded and no matrices are uploaded, leaving vertex processing
+    and draw overhead.
+    '''
+
+    from GLBackend import glViewport
+
+    print(f"{'mode':<10} {'cubes':>8} {'ms/frame':>9} {'ns/vertex':>10}")
+
+    for instanced in (False, True):
+        scene = create_scene(args, instanced=instanced, culling=False)
+        glViewport(0, 0, 1, 1)
+        rng = np.random.default_rng(args.seed)
+
+        for count in sorted(args.counts):
+            spawn_cubes(scene, count, rng, args.texture, angular_velocity=(0, 0, 0))
+            times = time_frames(scene, args.frames)
+
+            mode = "instanced" if instanced else "direct"
+            # indexed draws run the vertex shader per index, less what the post-transform cache reuses.
+            vertices = sum(obj.index_count for obj in scene.objects)
+            print(f"{mode:<10} {count:>8} {np.median(times):>9.2f} {np.median(times) * 1e6 / vertices:>10.1f}")
+
+        scene.close()
+
+def bench_transforms(args):
+
+    '''
+    Measures model matrices per second of the per-object and batched transform paths (CPU only).
+    '''
+
+    from Cube import Cube
+    from TransformStore import TransformStore
+
+    print(f"{'objects':>8} {'per-object/s':>13} {'batched/s':>13} {'max error':>10}")
+
+    for count in sorted(args.counts):
+        rng = np.random.default_rng(args.seed)
+        store = TransformStore(count)
+        for _ in range(count):
+            store.allocate(rng.uniform(-4, 4, 3), rng.uniform(0, 360, 3), rng.uniform(0.1, 2, 3), [0, 0, 0])
+
+        # views into the store without any GL resources.
+        views = []
+        for index in range(count):
+            view = Cube.__new__(Cube)
+            view.store = store
+            view.index = index
+            views.append(view)
+
+        start = time.perf_counter()
+        reference = np.array([view.transform() for view in views])
+        per_object = count / (time.perf_counter() - start)
+
+        indices = np.arange(count)
+        start = time.perf_counter()
+        for _ in range(args.frames):
+            matrices = store.compose(indices)
+        batched = count * args.frames / (time.perf_counter() - start)
+
+        error = np.abs(matrices - reference).max()
+        print(f"{count:>8} {per_object:>13.0f} {batched:>13.0f} {error:>10.2e}")
+
+def bench_sorting(args):
+
+    '''
+    Measures packing and sorting of render queue commands and the memory allocated
+    per frame (CPU only).
+    '''
+
+    import tracemalloc
+    from RenderQueue import RenderQueue
+
+    print(f"{'commands':>9} {'submit ms':>10} {'sort ms':>8} {'ns/cmd':>7} {'alloc KB':>9} {'bytes/cmd':>10}")
+
+    for count in sorted(args.counts):
+        rng = np.random.default_rng(args.seed)
+        items = list(range(count))
+        vaos = rng.integers(1, 4, count)
+        textures = rng.integers(1, 64, count)
+        depths = rng.uniform(0, 10, count)
+
+        queue = RenderQueue()
+
+        # the first frame grows the key buffer, later frames reuse it.
+        queue.submit(items, 3, vaos, textures, depths)
+        queue.sort()
+
+        submit_seconds = sort_seconds = 0.0
+        tracemalloc.start()
+        for _ in range(args.frames):
+            queue.clear()
+            start = time.perf_counter()
+            queue.submit(items, 3, vaos, textures, depths)
+            submit_seconds += time.perf_counter() - start
+            queue.sort()
+            sort_seconds += queue.sort_seconds
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        submit_ms = submit_seconds / args.frames * 1000.0
+        sort_ms = sort_seconds / args.frames * 1000.0
+        print(f"{count:>9} {submit_ms:>10.2f} {sort_ms:>8.2f} {sort_ms * 1e6 / count:>7.1f} "
+              f"{peak / 1024:>9.0f} {peak / count:>10.1f}")
+
+def write_scene_file(path: str, count: int, rng: np.random.Generator, texture_path: str):
+
+    '''
+    Writes a JSON scene of small randomly placed cubes, like spawn_cubes.
+
+    Args:
+        path: Output .json path.
+        count: Number of cubes.
+        rng: Random generator used for positions and angles.
+        texture_path: Texture shared by all cubes.
+    '''
+
+    objects = [
+        {
+            "position": rng.uniform(-4, 4, 3).tolist(),
+            "angles": rng.uniform(0, 360, 3).tolist(),
+            "scale": [0.05, 0.05, 0.05],
+            "angular_velocity": [0, 1, 0],
+            "texture": texture_path,
+            "mesh": "cube",
+        }
+        for _ in range(count)
+    ]
+
+    with open(path, "w") as f:
+        json.dump({"lights": [{"position": [0, 5, 0], "color": [1, 1, 1]}], "objects": objects}, f)
+
+def bench_scenefile(args):
+
+    '''
+    Compares building a scene object by object with compiling a scene file and
+    loading its memory-mapped binary form.
+    '''
+
+    import tempfile
+    from SceneFile import SceneFile
+
+    print(f"{'objects':>8} {'imperative ms':>14} {'compile ms':>11} {'load ms':>8} {'instantiate ms':>15} {'speedup':>8}")
+
+    # the same key for both paths, scene files store resolved texture paths.
+    texture_path = os.path.abspath(args.texture)
+
+    with tempfile.TemporaryDirectory() as directory:
+        for count in sorted(args.counts):
+            rng = np.random.default_rng(args.seed)
+            json_path = os.path.join(directory, f"cubes-{count}.json")
+            write_scene_file(json_path, count, rng, texture_path)
+
+            scene = create_scene(args)
+            start = time.perf_counter()
+            spawn_cubes(scene, count, np.random.default_rng(args.seed), texture_path)
+            imperative = time.perf_counter() - start
+            scene.close()
+
+            start = time.perf_counter()
+            compiled_path = SceneFile.compile(json_path)
+            compiling = time.perf_counter() - start
+
+            scene = create_scene(args)
+            start = time.perf_counter()
+            data = SceneFile.load(compiled_path)
+            loading = time.perf_counter() - start
+            data.instantiate(scene)
+            instantiating = time.perf_counter() - start - loading
+            scene.close()
+
+            speedup = imperative / (loading + instantiating)
+            print(f"{count:>8} {imperative * 1000:>14.1f} {compiling * 1000:>11.1f} {loading * 1000:>8.2f} "
+                  f"{instantiating * 1000:>15.1f} {speedup:>7.1f}x")
+
+def build_grid(triangles: int):
+
+    '''
+    Builds a wavy square grid with about the given number of triangles.
+
+    Returns:
+        The indexed Mesh.
+    '''
+
+    from Mesh import Mesh
+
+    side = max(int(np.sqrt(triangles / 2)), 1)
+    u, v = np.meshgrid(np.linspace(0, 1, side + 1, dtype=np.float32), np.linspace(0, 1, side + 1, dtype=np.float32))
+    positions = np.stack((u, 0.05 * np.sin(12 * u) * np.cos(12 * v), v), axis=-1).reshape(-1, 3)
+    uvs = np.stack((u, v), axis=-1).reshape(-1, 2)
+
+    corners = (np.arange(side)[:, None] * (side + 1) + np.arange(side)).ravel()
+    quads = np.stack((corners, corners + side + 1, corners + side + 2, corners + 1), axis=1)
+    indices = quads[:, [0, 1, 2, 0, 2, 3]].astype(np.uint32)
+
+    return Mesh.from_arrays(positions, uvs, None, indices)
+
+def write_obj(path: str, mesh):
+
+    '''
+    Writes a mesh as a Wavefront OBJ file with v/vt/vn faces.
+    '''
+
+    vertices = mesh.vertices
+    corners = mesh.indices.reshape(-1, 3) + 1
+
+    with open(path, "w") as f:
+        np.savetxt(f, vertices[:, 0:3], fmt="v %.6f %.6f %.6f")
+        np.savetxt(f, vertices[:, 3:5], fmt="vt %.6f %.6f")
+        np.savetxt(f, vertices[:, 5:8], fmt="vn %.6f %.6f %.6f")
+        np.savetxt(f, np.repeat(corners, 3, axis=1), fmt="f %d/%d/%d %d/%d/%d %d/%d/%d")
+
+def write_glb(path: str, mesh):
+
+    '''
+    Writes a mesh as a binary glTF 2.0 file with interleaved vertex attributes.
+    '''
+
+    import struct
+
+    vertices = mesh.vertices.tobytes()
+    indices = mesh.indices.tobytes()
+    count = mesh.vertex_count
+    low, high = mesh.bounds
+
+    document = {
+        "asset": {"version": "2.0"},
+        "scene": 0,
+        "scenes": [{"nodes": [0]}],
+        "nodes": [{"mesh": 0}],
+        "meshes": [{"primitives": [{"attributes": {"POSITION": 0, "TEXCOORD_0": 1, "NORMAL": 2}, "indices": 3}]}],
+        "buffers": [{"byteLength": len(vertices) + len(indices)}],
+        "bufferViews": [
+            {"buffer": 0, "byteOffset": 0, "byteLength": len(vertices), "byteStride": 32},
+            {"buffer": 0, "byteOffset": len(vertices), "byteLength": len(indices)},
+        ],
+        "accessors": [
+            {"bufferView": 0, "byteOffset": 0, "componentType": 5126, "count": count, "type": "VEC3",
+             "min": low.tolist(), "max": high.tolist()},
+            {"bufferView": 0, "byteOffset": 12, "componentType": 5126, "count": count, "type": "VEC2"},
+            {"bufferView": 0, "byteOffset": 20, "componentType": 5126, "count": count, "type": "VEC3"},
+            {"bufferView": 1, "componentType": 5125, "count": mesh.index_count, "type": "SCALAR"},
+        ],
+    }
+
+    # chunks are padded to four bytes, JSON with spaces.
+    text = json.dumps(document).encode()
+    text += b" " * (-len(text) % 4)
+    binary = vertices + indices
+
+    with open(path, "wb") as f:
+        f.write(struct.pack("<4sII", b"glTF", 2, 12 + 8 + len(text) + 8 + len(binary)))
+        f.write(struct.pack("<II", len(text), 0x4E4F534A) + text)
+        f.write(struct.pack("<II", len(binary), 0x004E4942) + binary)
+
+def bench_meshes(args):
+
+    '''
+    Measures the parse throughput of the OBJ and binary glTF loaders on generated
+    grids with the given numbers of triangles (CPU only).
+    '''
+
+    import tempfile
+    import MeshLoader
+
+    print(f"{'format':<7} {'triangles':>10} {'MB':>7} {'load ms':>9} {'MB/s':>7} {'Mtri/s':>7} "
+          f"{'corners':>9} {'vertices':>9}")
+
+    writers = {".obj": write_obj, ".glb": write_glb}
+
+    with tempfile.TemporaryDirectory() as directory:
+        for count in sorted(args.counts):
+            mesh = build_grid(count)
+
+            for suffix, write in writers.items():
+                path = os.path.join(directory, f"grid-{count}{suffix}")
+                write(path, mesh)
+                size = os.path.getsize(path) / 2 ** 20
+
+                times = []
+                for _ in range(max(args.frames // 10, 1)):
+                    start = time.perf_counter()
+                    loaded = MeshLoader.load_mesh(path)
+                    times.append(time.perf_counter() - start)
+
+                seconds = np.median(times)
+                print(f"{suffix[1:]:<7} {loaded.triangle_count:>10} {size:>7.1f} {seconds * 1000:>9.1f} "
+                      f"{size / seconds:>7.1f} {loaded.triangle_count / seconds / 1e6:>7.2f} "
+                      f"{loaded.index_count:>9} {loaded.vertex_count:>9}")
+
+def bench_lod(args):
+
+    '''
+    Compares frame time, triangles drawn and texels sampled of detailed models spread
+    out to the far plane, drawn at full detail and with levels of detail.
+    '''
+
+    import tempfile
+    from Cube import Cube
+
+    print(f"{'mode':<6} {'objects':>8} {'ms/frame':>9} {'triangles':>10} {'texels':>9} {'levels':>16}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "grid.glb")
+        write_glb(path, build_grid(20000))
+
+        for lod in (False, True):
+            scene = create_scene(args, lod=lod)
+            rng = np.random.default_rng(args.seed)
+
+            for count in sorted(args.counts):
+                while len(scene.objects) < count:
+                    distance = rng.uniform(1.5, 9.5)
+                    angle = rng.uniform(0, 2 * np.pi)
+                    scene.add_object(Cube(
+                        position=[distance * np.cos(angle), rng.uniform(-1, 1), distance * np.sin(angle)],
+                        angles=[rng.uniform(0, 90), 0, 0],
+                        scale=[0.6, 0.6, 0.6],
+                        angular_velocity=[0, 0, 0],
+                        texture_path=args.texture,
+                        mesh_path=path
+                    ))
+
+                times = time_frames(scene, args.frames)
+
+                stats = scene.get_frame_stats()
+                levels = np.bincount([obj.lod for obj in scene.objects], minlength=len(scene.objects[0].lods))
+                mode = "lod" if lod else "full"
+                print(f"{mode:<6} {count:>8} {np.median(times):>9.2f} {stats['triangles']:>10} "
+                      f"{stats['texels']:>9} {str(levels.tolist()):>16}")
+
+            scene.close()
+
+def bench_shaders(args):
+
+    '''
+    Compares the time to get every shader variant on a cold start (empty binary
+    cache, programs are compiled) and on a warm start (binaries are loaded).
+    '''
+
+    import tempfile
+    from ShaderCache import ShaderCache
+    from ShaderManager import ShaderManager
+
+    variants = {
+        "direct": {},
+        "instanced": {"INSTANCED": None},
+        "atlas": {"INSTANCED": None, "ATLAS": None},
+    }
+
+    scene = create_scene(args)
+    if not scene.shaders.supports_binaries():
+        print("the driver does not support program binaries, warm starts compile too")
+
+    print(f"{'variant':<10} {'cold ms':>8} {'warm ms':>8} {'speedup':>8}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        cold = {}
+        warm = {}
+        for times in (cold, warm):
+            # a new manager per start, like a new process, sharing the cache directory.
+            manager = ShaderManager(ShaderCache(directory))
+            for name, defines in variants.items():
+                start = time.perf_counter()
+                manager.get_program("shaders/vertex.glsl", "shaders/fragment.glsl", defines)
+                times[name] = (time.perf_counter() - start) * 1000.0
+            manager.clear()
+
+        for name in variants:
+            print(f"{name:<10} {cold[name]:>8.2f} {warm[name]:>8.2f} {cold[name] / warm[name]:>8.1f}")
+
+        total_cold = sum(cold.values())
+        total_warm = sum(warm.values())
+        print(f"{'total':<10} {total_cold:>8.2f} {total_warm:>8.2f} {total_cold / total_warm:>8.1f}")
+
+        sizes = [os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory)]
+        print(f"cache: {len(sizes)} binaries, {sum(sizes) / 1024:.1f} KB")
+
+    scene.close()
+
+def add_spotlights(scene, count: int, rng: np.random.Generator, layout: str = "gallery"):
+
+    '''
+    Adds spotlights to a scene.
+
+    Args:
+        scene: A scene created with clustered_lights=True.
+        count: Number of spotlights.
+        rng: Random generator used for positions and colors.
+        layout: "gallery" hangs them over a floor grid of fixed spacing that grows
+            outward from the room, as in a museum of many rooms, "room" packs them
+            all along the walls of the one room.
+    '''
+
+    if layout == "gallery":
+        # grid points nearest the room's center first, 1.5 units apart.
+        side = int(np.ceil(np.sqrt(count))) + 1
+        x, z = np.meshgrid(np.arange(-side, side + 1) * 1.5, np.arange(-side, side + 1) * 1.5)
+        points = np.stack((x.ravel(), z.ravel()), axis=1)
+        points = points[np.argsort(np.hypot(points[:, 0], points[:, 1]), kind="stable")][:count]
+
+        for x, z in points.tolist():
+            scene.add_light((x, -3.5, z), rng.uniform(0.5, 2.0, 3), (0, -1, 0), range=2.5, angle=40.0)
+        return
+
+    for _ in range(count):
+        along = rng.uniform(-4.5, 4.5)
+        height = rng.uniform(-2, 4)
+        normal = np.array([(0, 0, 1), (1, 0, 0), (-1, 0, 0), (0, 0, -1)][rng.integers(4)], dtype=np.float32)
+        tangent = np.array([normal[2], 0, -normal[0]], dtype=np.float32)
+
+        # one unit out from the wall, above the lit spot.
+        target = -4.5 * normal + along * tangent + [0, height - 1, 0]
+        position = target + normal + [0, 1, 0]
+        scene.add_light(position, rng.uniform(0.5, 2.0, 3), target - position, range=2.5, angle=25.0)
+
+def bench_gpu_driven(args):
+
+    '''
+    Compares frame time and the CPU time of display of CPU culling with instanced
+    draws and GPU-driven culling with multi-draw indirect, and checks the GPU's
+    visibility flags and image against the CPU path. On llvmpipe the GL calls do
+    the GPU's work on the CPU and show up in the display time.
+    '''
+
+    from GLBackend import glFinish
+    from Culling import FrustumCuller
+
+    print(f"{'mode':<8} {'cubes':>8} {'draw calls':>11} {'ms/frame':>9} {'display ms':>10} {'mismatches':>11} {'pixels':>7}")
+
+    for count in sorted(args.counts):
+        images = {}
+        for gpu_driven in (False, True):
+            scene = create_scene(args, instanced=True, gpu_driven=gpu_driven)
+            spawn_cubes(scene, count, np.random.default_rng(args.seed), args.texture)
+
+            times = time_frames(scene, args.frames)
+
+            # CPU time of display alone.
+            display = np.zeros(args.frames)
+            for frame in range(args.frames):
+                scene.update()
+                start = time.perf_counter()
+                scene.display()
+                display[frame] = (time.perf_counter() - start) * 1000.0
+                glFinish()
+
+            # the visibility the compute shader wrote against the CPU culler on the same matrices.
+            mismatches = 0
+            if scene.indirect is not None:
+                rows = scene.transforms.count
+                expected = FrustumCuller().cull(
+                    scene.transforms.matrices[:rows], np.ones(rows, dtype=bool),
+                    scene.camera.get_view_projection_mx(),
+                    scene.transforms.bounds_min[:rows], scene.transforms.bounds_max[:rows]
+                )
+                mismatches = int((scene.indirect.read_visible() != expected).sum())
+
+            images[gpu_driven] = scene.offscreen.read_pixels() if scene.offscreen is not None else None
+            pixels = ""
+            if gpu_driven and images[False] is not None:
+                pixels = int((images[False] != images[True]).any(axis=-1).sum())
+
+            mode = "gpu" if scene.indirect is not None else "cpu"
+            print(f"{mode:<8} {count:>8} {scene.draw_calls:>11} {np.median(times):>9.2f} {np.median(display):>10.2f} "
+                  f"{mismatches:>11} {pixels:>7}")
+
+            scene.close()
+
+def bench_lights(args):
+
+    '''
+    Measures frame time of the museum lit by increasing numbers of spotlights with
+    clustered shading, and the cost of assigning them to clusters. Frame time follows
+    the lights per cluster: flat while the lights spread out (gallery), growing once
+    they pile up in the room (room).
+    '''
+
+    from digital_museum_example import add_museum
+
+    print(f"{'layout':<8} {'lights':>7} {'ms/frame':>9} {'assign ms':>10} {'assignments':>12} {'max/cluster':>12}")
+
+    for layout in ("gallery", "room"):
+        for count in sorted(args.counts):
+            scene = create_scene(args, instanced=True, clustered_lights=True)
+            add_museum(scene)
+            add_spotlights(scene, count, np.random.default_rng(args.seed), layout)
+
+            # the camera turns every frame, so lights are reassigned every frame.
+            times = np.zeros(args.frames)
+            assign = np.zeros(args.frames)
+            for frame in range(args.frames):
+                scene.camera.rotation_angle_degrees = 360.0 * frame / args.frames
+                times[frame] = time_frames(scene, 1)[0]
+                assign[frame] = scene.get_frame_stats()["light_assign_ms"]
+
+            stats = scene.get_frame_stats()
+            print(f"{layout:<8} {count:>7} {np.median(times):>9.2f} {np.median(assign):>10.2f} "
+                  f"{stats['light_assignments']:>12} {stats['max_lights_per_cluster']:>12}")
+
+            scene.close()
+
+def build_rooms(side: int, size: float):
+
+    '''
+    Builds a square grid of rooms around the origin, neighbors linked by a doorway
+    in the middle of their shared wall.
+
+    Args:
+        side: Rooms along each axis, odd so the camera stands in the middle room.
+        size: Width of a room.
+
+    Returns:
+        The PortalGraph.
+    '''
+
+    from Portals import PortalGraph
+
+    graph = PortalGraph()
+    origin = -side * size / 2
+    for row in range(side):
+        for column in range(side):
+            x, z = origin + column * size, origin + row * size
+            graph.add_cell((x, -2, z), (x + size, 2, z + size), f"room {row} {column}")
+
+    # doorways one unit wide and two high.
+    for row in range(side):
+        for column in range(side):
+            x, z = origin + column * size, origin + row * size
+            cell = row * side + column
+            if column + 1 < side:
+                wall, middle = x + size, z + size / 2
+                graph.add_portal(cell, cell + 1, [(wall, -2, middle - 0.5), (wall, -2, middle + 0.5),
+                                                  (wall, 0, middle + 0.5), (wall, 0, middle - 0.5)])
+            if row + 1 < side:
+                wall, middle = z + size, x + size / 2
+                graph.add_portal(cell, cell + side, [(middle - 0.5, -2, wall), (middle + 0.5, -2, wall),
+                                                     (middle + 0.5, 0, wall), (middle - 0.5, 0, wall)])
+
+    return graph
+
+def bench_portals(args):
+
+    '''
+    Compares frame time and drawn objects of a grid of rooms with frustum culling
+    alone and with the portal pass, which also rejects rooms hidden behind walls.
+    '''
+
+    from Cube import Cube
+
+    side, size = 7, 3.0
+    print(f"{'mode':<8} {'cubes':>8} {'visible':>8} {'cells rejected':>15} {'ms/frame':>9}")
+
+    for count in sorted(args.counts):
+        for mode in ("frustum", "portals"):
+            graph = build_rooms(side, size)
+            scene = create_scene(args, instanced=True, portals=graph if mode == "portals" else None)
+
+            rng = np.random.default_rng(args.seed)
+            extent = side * size / 2
+            for _ in range(count):
+                scene.add_object(Cube(
+                    position=[rng.uniform(-extent, extent), rng.uniform(-1.5, 1.5), rng.uniform(-extent, extent)],
+                    angles=rng.uniform(0, 360, 3).tolist(),
+                    scale=[0.05, 0.05, 0.05],
+                    angular_velocity=[0, 0, 0],
+                    texture_path=args.texture
+                ))
+
+            times = np.zeros(args.frames)
+            visible = np.zeros(args.frames)
+            rejected = np.zeros(args.frames)
+            for frame in range(args.frames):
+                scene.camera.rotation_angle_degrees = 360.0 * frame / args.frames
+                times[frame] = time_frames(scene, 1)[0]
+                stats = scene.get_frame_stats()
+                visible[frame] = stats["visible_objects"]
+                rejected[frame] = stats["cells_rejected"]
+
+            print(f"{mode:<8} {count:>8} {np.mean(visible):>8.0f} {np.mean(rejected):>15.1f} {np.median(times):>9.2f}")
+
+            scene.close()
+
+def write_textures(directory: str, count: int, size: int, rng: np.random.Generator) -> list:
+
+    '''
+    Writes count unique JPEG textures of size x size noise.
+
+    Returns:
+        The file paths.
+    '''
+
+    import os
+    from PIL import Image
+
+    paths = []
+    for index in range(count):
+        path = os.path.join(directory, f"texture_{index}.jpg")
+        pixels = rng.integers(0, 256, (size, size, 3), dtype=np.uint8)
+        Image.fromarray(pixels).save(path, quality=90)
+        paths.append(path)
+
+    return paths
+
+def bench_assets(args):
+
+    '''
+    Measures time-to-first-frame and time until all textures are resident, with
+    textures decoded on the main thread and on background threads.
+    '''
+
+    import tempfile
+    from AssetLoader import AssetLoader
+    from Cube import Cube
+    from GLBackend import glFinish
+    from TextureManager import TextureManager
+
+    print(f"{'mode':<6} {'textures':>9} {'first frame s':>14} {'all loaded s':>13}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        rng = np.random.default_rng(args.seed)
+        paths = write_textures(directory, max(args.counts), args.texture_size, rng)
+
+        for count in sorted(args.counts):
+            for background in (False, True):
+                scene = create_scene(args)
+                scene.textures = TextureManager(loader=AssetLoader() if background else None)
+
+                for index in range(count):
+                    scene.add_object(Cube(
+                        position=[(index % 10) - 4.5, (index // 10 % 10) - 4.5, -4],
+                        angles=[0, 0, 0],
+                        scale=[0.8, 0.8, 0.1],
+                        angular_velocity=[0, 0, 0],
+                        texture_path=paths[index],
+                        textures=scene.textures
+                    ))
+
+                first_frame = None
+                while first_frame is None or len(scene.textures.resident) < count:
+                    pump_events(scene)
+                    if scene.loader is not None:
+                        scene.loader.pump()
+                    scene.update()
+                    scene.camera.start()
+                    scene.display()
+                    glFinish()
+                    scene.present()
+
+                    if first_frame is None:
+                        first_frame = time.perf_counter() - scene.start_time
+
+                all_loaded = time.perf_counter() - scene.start_time
+                mode = "async" if background else "sync"
+                print(f"{mode:<6} {count:>9} {first_frame:>14.3f} {all_loaded:>13.3f}")
+
+                scene.close()
+
+def bench_glcall_timings(args):
+
+    '''
+    Times hot GL calls of the current GLBackend mode, through PyOpenGL and in release
+    mode also through the ctypes fast paths, and prints the microseconds per call as
+    JSON (used by the glcalls benchmark).
+    '''
+
+    import GLBackend
+    from GLBackend import GL_FALSE, GL_TEXTURE_2D, GL_TRIANGLES, glFinish, glGenTextures, glGenVertexArrays
+
+    scene = create_scene(args)
+    shader = scene.shader
+    texture = glGenTextures(1)
+    vertex_array = glGenVertexArrays(1)
+    matrix = np.eye(4, dtype=np.float32)
+    vector = np.ones(3, dtype=np.float32)
+
+    # the draw has no vertices, so only the cost of making the call is timed.
+    calls = {
+        "glUseProgram": (shader.program,),
+        "glBindVertexArray": (vertex_array,),
+        "glBindTexture": (GL_TEXTURE_2D, texture),
+        "glUniformMatrix4fv": (shader.get_location("model"), 1, GL_FALSE, matrix),
+        "glUniform3fv": (shader.get_location("lightPos"), 1, vector),
+        "glUniform1i": (shader.get_location("imageTexture"), 0),
+        "glDrawArrays": (GL_TRIANGLES, 0, 0),
+    }
+
+    if GLBackend.DEBUG:
+        variants = {"debug": GLBackend.wrapped}
+    else:
+        variants = {"release": GLBackend.wrapped, "ctypes": GLBackend.fast}
+
+    repeats = args.counts[0]
+    results = {}
+    for variant, functions in variants.items():
+        results[variant] = {}
+        for name, arguments in calls.items():
+            function = functions[name]
+            function(*arguments)
+
+            start = time.perf_counter()
+            for _ in range(repeats):
+                function(*arguments)
+            glFinish()
+            results[variant][name] = (time.perf_counter() - start) / repeats * 1e6
+
+    scene.close()
+    print(json.dumps(results))
+
+def bench_glcalls(args):
+
+    '''
+    Compares the per-call overhead of hot GL calls with PyOpenGL's error checking on
+    (debug), off (release) and through the ctypes fast paths, each mode in a fresh
+    process since PyOpenGL reads its flags on import.
+    '''
+
+    results = {}
+    for mode in ("debug", "release"):
+        command = [sys.executable, os.path.abspath(__file__), "glcall-timings", "--counts", str(args.counts[0])]
+        if args.headless:
+            command.append("--headless")
+
+        environment = dict(os.environ, DIGITAL_MUSEUM_GL=mode)
+        output = subprocess.run(command, capture_output=True, text=True, check=True, env=environment).stdout
+        results.update(json.loads(output.strip().splitlines()[-1]))
+
+    print(f"{'call':<20} {'debug us':>9} {'release us':>11} {'ctypes us':>10} {'speedup':>8}")
+
+    for name, debug in results["debug"].items():
+        release = results["release"][name]
+        fast = results["ctypes"][name]
+        print(f"{name:<20} {debug:>9.2f} {release:>11.2f} {fast:>10.2f} {debug / fast:>7.1f}x")
+
+# reproducible scenes of the benchmark suite: object count, unique textures and draw path.
+SCENARIOS = {
+    "museum": {"cubes": 0, "textures": 0, "instanced": False},
+    "cubes-1k": {"cubes": 1000, "textures": 0, "instanced": True},
+    "cubes-10k": {"cubes": 10000, "textures": 0, "instanced": True},
+    "cubes-100k": {"cubes": 100000, "textures": 0, "instanced": True},
+    "textures-256": {"cubes": 256, "textures": 256, "instanced": True},
+}
+
+def run_scenario(name: str, args) -> dict:
+
+    '''
+    Builds a scenario, renders it along an orbiting camera path and measures it.
+
+    Returns:
+        A dict with frame rate, frame time percentiles, draw calls and memory use.
+    '''
+
+    import resource
+    import tempfile
+    from Camera import get_orbit_path
+    from Cube import Cube
+    from Geometry import registry
+    from Profiler import FrameProfiler
+    from digital_museum_example import add_museum
+
+    scenario = SCENARIOS[name]
+    rng = np.random.default_rng(args.seed)
+    profiler = FrameProfiler(history=args.frames, count_gl_calls=False)
+
+    with tempfile.TemporaryDirectory() as directory:
+        scene = create_scene(args, instanced=scenario["instanced"], profiler=profiler)
+
+        if name == "museum":
+            add_museum(scene)
+        elif scenario["textures"]:
+            paths = write_textures(directory, scenario["textures"], 256, rng)
+            for index in range(scenario["cubes"]):
+                scene.add_object(Cube(
+                    position=rng.uniform(-4, 4, 3).tolist(),
+                    angles=rng.uniform(0, 360, 3).tolist(),
+                    scale=[0.3, 0.3, 0.3],
+                    angular_velocity=[0, 1, 0],
+                    texture_path=paths[index % len(paths)]
+                ))
+        else:
+            spawn_cubes(scene, scenario["cubes"], rng, args.texture)
+
+        # warm up caches and drivers before measuring.
+        scene.run(frames=args.warmup, camera_path=get_orbit_path(args.frames))
+        profiler.frame = 0
+        profiler.samples[:] = np.nan
+
+        start = time.perf_counter()
+        scene.run(frames=args.frames, camera_path=get_orbit_path(args.frames))
+        seconds = time.perf_counter() - start
+
+        phases = profiler.summary()["phases"]
+        result = {
+            "objects": len(scene.objects),
+            "frames": args.frames,
+            "fps": args.frames / seconds,
+            "frame_ms": phases["frame"],
+            "gpu_ms": phases.get("gpu"),
+            "draw_calls": scene.draw_calls,
+            "visible_objects": scene.get_frame_stats()["visible_objects"],
+            "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+            "texture_mb": scene.textures.resident_bytes / 2 ** 20,
+            "geometry_mb": registry.bytes_uploaded / 2 ** 20,
+            "shader_ms": scene.shader_seconds * 1000.0,
+        }
+
+        renderer = scene.offscreen.get_renderer() if scene.offscreen is not None else None
+        scene.close()
+
+    result["renderer"] = renderer
+    return result
+
+def bench_scenario(args):
+
+    '''
+    Runs one scenario and prints its result as JSON (used by the suite).
+    '''
+
+    print(json.dumps({name: run_scenario(name, args) for name in args.names}))
+
+def get_commit() -> str:
+
+    '''
+    Returns the current git commit, or None outside a repository.
+    '''
+
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def bench_suite(args):
+
+    '''
+    Runs every scenario in a fresh process and writes the results as JSON, so runs
+    of different commits can be compared with the compare benchmark.
+    '''
+
+    names = args.names or list(SCENARIOS)
+    results = {}
+
+    for name in names:
+        command = [sys.executable, os.path.abspath(__file__), "scenario", name,
+                   "--frames", str(args.frames), "--warmup", str(args.warmup),
+                   "--seed", str(args.seed), "--texture", args.texture]
+        if args.headless:
+            command.append("--headless")
+
+        output = subprocess.run(command, capture_output=True, text=True, check=True).stdout
+        results.update(json.loads(output.strip().splitlines()[-1]))
+
+        result = results[name]
+        print(f"{name:<14} {result['objects']:>7} objects {result['fps']:>8.1f} fps "
+              f"p50 {result['frame_ms']['p50']:>7.2f} ms p99 {result['frame_ms']['p99']:>7.2f} ms "
+              f"{result['peak_rss_mb']:>7.1f} MB", file=sys.stderr)
+
+    report = {
+        "commit": get_commit(),
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "headless": args.headless,
+        "scenarios": results,
+    }
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+def bench_compare(args):
+
+    '''
+    Compares two suite reports, printing the change of frame rate, p99 frame time and memory.
+    '''
+
+    with open(args.names[0], "r") as f:
+        before = json.load(f)
+    with open(args.names[1], "r") as f:
+        after = json.load(f)
+
+    print(f"{before['commit']} -> {after['commit']}")
+    print(f"{'scenario':<14} {'fps':>9} {'p99 ms':>9} {'peak MB':>9}")
+
+    for name, new in after["scenarios"].items():
+        old = before["scenarios"].get(name)
+        if old is None:
+            continue
+
+        fps = new["fps"] / old["fps"] - 1
+        p99 = new["frame_ms"]["p99"] / old["frame_ms"]["p99"] - 1
+        memory = new["peak_rss_mb"] / old["peak_rss_mb"] - 1
+        print(f"{name:<14} {fps:>+9.1%} {p99:>+9.1%} {memory:>+9.1%}")
+
+BENCHMARKS = {
+    "instancing": bench_instancing,
+    "batching": bench_batching,
+    "vertex": bench_vertex,
+    "streaming": bench_streaming,
+    "transforms": bench_transforms,
+    "assets": bench_assets,
+    "sorting": bench_sorting,
+    "scenefile": bench_scenefile,
+    "meshes": bench_meshes,
+    "lod": bench_lod,
+    "shaders": bench_shaders,
+    "lights": bench_lights,
+    "gpu": bench_gpu_driven,
+    "portals": bench_portals,
+    "glcalls": bench_glcalls,
+    "glcall-timings": bench_glcall_timings,
+    "scenario": bench_scenario,
+    "suite": bench_suite,
+    "compare": bench_compare,
+}
+
+# object counts used when --counts is not given.
+DEFAULT_COUNTS = {
+    "assets": [10, 50, 200],
+    "scenefile": [1000, 10000, 100000],
+    "meshes": [100000, 1000000, 2000000],
+    "lod": [100, 500, 2000],
+    "lights": [1, 8, 64, 256, 512],
+    "portals": [1000, 5000, 20000],
+    "glcalls": [100000],
+}
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Digital Museum benchmarks.")
+    parser.add_argument("benchmark", choices=BENCHMARKS.keys())
+    parser.add_argument("names", nargs="*",
+                        help="scenarios for scenario/suite, two suite reports for compare")
+    parser.add_argument("--counts", type=int, nargs="+", help="object counts (triangle counts for meshes, calls per function for glcalls) to measure")
+    parser.add_argument("--frames", type=int, default=20, help="frames rendered per measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--texture", default="textures/walls/white.png",
+                        help="texture shared by the generated cubes")
+    parser.add_argument("--texture-size", type=int, default=1024,
+                        help="edge length of generated textures")
+    parser.add_argument("--warmup", type=int, default=10, help="frames rendered before measuring a scenario")
+    parser.add_argument("--headless", action="store_true",
+                        help="render offscreen through EGL, for machines without a display")
+    parser.add_argument("-o", "--output", help="file the suite report is written to")
+
+    args = parser.parse_args()
+    if args.headless:
+        # selects the EGL platform before anything imports OpenGL.
+        import Headless
+    if args.counts is None:
+        args.counts = DEFAULT_COUNTS.get(args.benchmark, [10, 100, 1000, 10000, 100000])
+
+    BENCHMARKS[args.benchmark](args)
@@ -6,111 +6,174 @@ Mail: william_abrahamsson@outlook.com
 Digital Museum
 '''
 
+import argparse
 from Scene import Scene
 from Cube import Cube
-from OpenGL.GL import *
-
-scene = Scene()
-
-# room is a cube (camera is inside)
-room = Cube(
-    position=[0, 0, 0],
-    angles=[0, 0, 0],
-    scale=[10, 10, 10],
-    angular_velocity=[0, 0, 0],
-    texture_path="textures/walls/white.png"
-)
-scene.add_object(room)
-
-floor = Cube(
-    position=[0, -5, 0],
-    angles=[90, 0, 90],
-    scale=[10, 10, 1],
-    angular_velocity=[0, 0, 0],
-    texture_path="textures/walls/bricks.jpg"
-)
-scene.add_object(floor)
-
-roof = Cube(
-    position=[0, 5, 0],
-    angles=[-90, 0, 0],
-    scale=[10, 10, 1],
-    angular_velocity=[0, 0, 0],
-    texture_path="textures/walls/putty.png"
-)
-scene.add_object(roof)
-
-
-front_frame = Cube(
-    position=[0, 0, -5],
-    angles=[0, 0, 0],
-    scale=[7, 6, 1],
-    angular_velocity=[0, 0, 0],
-    texture_path="textures/frames/silver.png"
-)
-scene.add_object(front_frame)
-
-front_painting = Cube(
-    position=[0, 0, -4],
-    angles=[0, 0, 180],
-    scale=[6.1, 5.2, 0],
-    angular_velocity=[0, 0, 0],
-    texture_path="textures/paintings/vangough.png"
-)
-scene.add_object(front_painting)
-
-left_frame = Cube(
-    position=[-5, 0, 0],
-    angles=[0, 90, 0],
-    scale=[7, 7, 1],
-    angular_velocity=[0, 0, 0],
-    texture_path="textures/frames/gold.png"
-)
-scene.add_object(left_frame)
-
-left_painting = Cube(
-    position=[-4, 0, 0],
-    angles=[0, 90, 180],
-    scale=[6, 6, 0],
-    angular_velocity=[0, 0, 0],
-    texture_path="textures/paintings/monalisa.png"
-)
-scene.add_object(left_painting)
-
-right_frame = Cube(
-    position=[5, 0, 0],
-    angles=[0, -90, 0],
-    scale=[7, 3.6, 1],
-    angular_velocity=[0, 0, 0],
-    texture_path="textures/frames/wood.png"
-)
-scene.add_object(right_frame)
-
-right_painting = Cube(
-    position=[4, 0, 0],
-    angles=[0, -90, 180],
-    scale=[6, 3, 0],
-    angular_velocity=[0, 0, 0],
-    texture_path="textures/paintings/lastsupper.jpeg"
-)
-scene.add_object(right_painting)
-
-back_frame = Cube(
-    position=[0, 0, 5],
-    angles=[0, 180, 0],
-    scale=[7, 4.7, 1],
-    angular_velocity=[0, 0, 0],
-    texture_path="textures/frames/stone.png"
-)
-scene.add_object(back_frame)
-
-back_painting = Cube(
-    position=[0, 0, 4],
-    angles=[0, 180, 180],
-    scale=[6, 4, 0],
-    angular_velocity=[0, 0, 0],
-    texture_path="textures/paintings/abstract.jpeg"
-)
-scene.add_object(back_painting)
-
-scene.run()
+from Profiler import FrameProfiler
+from SceneFile import SceneFile
+from GLBackend import *
+
+def add_museum(scene):
+
+    '''
+    Adds the museum room, its walls and the framed paintings to a scene.
+
+    Args:
+        scene: The scene to fill.
+    '''
+
+    # room is a cube (camera is inside)
+    room = Cube(
+        position=[0, 0, 0],
+        angles=[0, 0, 0],
+        scale=[10, 10, 10],
+        angular_velocity=[0, 0, 0],
+        texture_path="textures/walls/white.png"
+    )
+    scene.add_object(room)
+
+    floor = Cube(
+        position=[0, -5, 0],
+        angles=[90, 0, 90],
+        scale=[10, 10, 1],
+        angular_velocity=[0, 0, 0],
+        texture_path="textures/walls/bricks.jpg"
+    )
+    scene.add_object(floor)
+
+    roof = Cube(
+        position=[0, 5, 0],
+        angles=[-90, 0, 0],
+        scale=[10, 10, 1],
+        angular_velocity=[0, 0, 0],
+        texture_path="textures/walls/putty.png"
+    )
+    scene.add_object(roof)
+
+
+    front_frame = Cube(
+        position=[0, 0, -5],
+        angles=[0, 0, 0],
+        scale=[7, 6, 1],
+        angular_velocity=[0, 0, 0],
+        texture_path="textures/frames/silver.png"
+    )
+    scene.add_object(front_frame)
+
+    front_painting = Cube(
+        position=[0, 0, -4],
+        angles=[0, 0, 180],
+        scale=[6.1, 5.2, 0],
+        angular_velocity=[0, 0, 0],
+        texture_path="textures/paintings/vangough.png"
+    )
+    scene.add_object(front_painting)
+
+    left_frame = Cube(
+        position=[-5, 0, 0],
+        angles=[0, 90, 0],
+        scale=[7, 7, 1],
+        angular_velocity=[0, 0, 0],
+        texture_path="textures/frames/gold.png"
+    )
+    scene.add_object(left_frame)
+
+    left_painting = Cube(
+        position=[-4, 0, 0],
+        angles=[0, 90, 180],
+        scale=[6, 6, 0],
+        angular_velocity=[0, 0, 0],
+        texture_path="textures/paintings/monalisa.png"
+    )
+    scene.add_object(left_painting)
+
+    right_frame = Cube(
+        position=[5, 0, 0],
+        angles=[0, -90, 0],
+        scale=[7, 3.6, 1],
+        angular_velocity=[0, 0, 0],
+        texture_path="textures/frames/wood.png"
+    )
+    scene.add_object(right_frame)
+
+    right_painting = Cube(
+        position=[4, 0, 0],
+        angles=[0, -90, 180],
+        scale=[6, 3, 0],
+        angular_velocity=[0, 0, 0],
+        texture_path="textures/paintings/lastsupper.jpeg"
+    )
+    scene.add_object(right_painting)
+
+    back_frame = Cube(
+        position=[0, 0, 5],
+        angles=[0, 180, 0],
+        scale=[7, 4.7, 1],
+        angular_velocity=[0, 0, 0],
+        texture_path="textures/frames/stone.png"
+    )
+    scene.add_object(back_frame)
+
+    back_painting = Cube(
+        position=[0, 0, 4],
+        angles=[0, 180, 180],
+        scale=[6, 4, 0],
+        angular_velocity=[0, 0, 0],
+        texture_path="textures/paintings/abstract.jpeg"
+    )
+    scene.add_object(back_painting)
+
+def add_spotlights(scene):
+
+    '''
+    Hangs a warm spotlight in front of every painting, aimed at its center.
+
+    Args:
+        scene: A scene created with clustered_lights=True.
+    '''
+
+    for painting in ([0, 0, -4], [-4, 0, 0], [4, 0, 0], [0, 0, 4]):
+        position = [0.6 * painting[0], 4, 0.6 * painting[2]]
+        direction = [painting[0] - position[0], painting[1] - position[1], painting[2] - position[2]]
+        scene.add_light(position, [1.6, 1.4, 1.0], direction, range=8.0, angle=35.0)
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description="Digital museum.")
+    parser.add_argument("--scene", metavar="PATH",
+                        help="load the objects from a .json or compiled scene file instead of building them in code")
+    parser.add_argument("--static-batching", action="store_true",
+                        help="draw objects that do not rotate from pre-transformed vertex buffers")
+    parser.add_argument("--lod", action="store_true",
+                        help="draw distant models and textures at lower levels of detail")
+    parser.add_argument("--spotlights", action="store_true",
+                        help="light every painting with a spotlight, shaded with clustered lighting")
+    parser.add_argument("--profile", metavar="PATH",
+                        help="record frame times and write their percentiles to a .csv or .json file on exit")
+    parser.add_argument("--profile-frames", type=int, default=600, help="number of frames kept by the profiler")
+    parser.add_argument("--overlay", action="store_true", help="show frame time percentiles in the window title")
+    parser.add_argument("--no-vsync", dest="vsync", action="store_false", help="swap without waiting for the display")
+    parser.add_argument("--fps", type=float, help="cap the frame rate, e.g. together with --no-vsync")
+    parser.add_argument("--on-demand", action="store_true",
+                        help="only render after input or while something animates (kiosk mode)")
+    args = parser.parse_args()
+
+    profiler = None
+    if args.profile or args.overlay:
+        profiler = FrameProfiler(history=args.profile_frames)
+
+    scene = Scene(profiler=profiler, overlay=args.overlay, vsync=args.vsync,
+                  target_fps=args.fps, on_demand=args.on_demand, static_batching=args.static_batching,
+                  lod=args.lod, clustered_lights=args.spotlights)
+    if args.scene:
+        SceneFile.load(args.scene).instantiate(scene)
+    else:
+        add_museum(scene)
+
+    if args.spotlights:
+        add_spotlights(scene)
+
+    scene.run()
+
+    if args.profile:
+        profiler.export(args.profile)
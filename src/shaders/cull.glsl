@@ -0,0 +1,93 @@
+#version 430 core
+
+// frustum culling of every object on the GPU: visible objects are appended to the
+// instances of their draw command, read by glMultiDrawElementsIndirect
+// variants: ATLAS also copies each visible object's atlas region
+
+layout (local_size_x = 64) in;
+
+// DrawElementsIndirectCommand, instanceCount is counted up by the culling
+struct DrawCommand {
+    uint count;
+    uint instanceCount;
+    uint firstIndex;
+    int baseVertex;
+    uint baseInstance;
+};
+
+// per object: model matrix (16 floats) followed by the normal matrix (9 floats)
+layout (std430, binding = 0) readonly buffer Transforms { float transforms[]; };
+
+// per object: local box minimum and maximum
+layout (std430, binding = 1) readonly buffer Bounds { float bounds[]; };
+
+// per object: index of its draw command, 0xffffffff for rows that are not drawn
+layout (std430, binding = 2) readonly buffer ObjectCommands { uint objectCommands[]; };
+
+layout (std430, binding = 3) buffer DrawCommands { DrawCommand commands[]; };
+
+// per instance: the visible object's transform, in the layout of the INSTANCED vertex shader
+layout (std430, binding = 4) writeonly buffer Instances { float instances[]; };
+
+// per object: 1 if it passed the culling
+layout (std430, binding = 5) writeonly buffer Visibility { uint visible[]; };
+
+#ifdef ATLAS
+// per object and per instance: atlas (u, v, width, height) and layer
+layout (std430, binding = 6) readonly buffer Regions { float regions[]; };
+layout (std430, binding = 7) writeonly buffer InstanceRegions { float instanceRegions[]; };
+#endif
+
+// frustum planes (a, b, c, d), inside when a * x + b * y + c * z + d >= 0
+uniform vec4 planes[6];
+uniform int objectCount;
+
+void main() {
+    uint object = gl_GlobalInvocationID.x;
+    if (object >= uint(objectCount)) {
+        return;
+    }
+
+    uint command = objectCommands[object];
+    if (command == 0xffffffffu) {
+        visible[object] = 0u;
+        return;
+    }
+
+    // world-space box of the transformed local box, rows of the matrix are its axes
+    uint base = object * 25u;
+    vec3 localMin = vec3(bounds[object * 6u], bounds[object * 6u + 1u], bounds[object * 6u + 2u]);
+    vec3 localMax = vec3(bounds[object * 6u + 3u], bounds[object * 6u + 4u], bounds[object * 6u + 5u]);
+    vec3 localCenter = (localMin + localMax) * 0.5;
+    vec3 localHalf = (localMax - localMin) * 0.5;
+
+    vec3 center = vec3(transforms[base + 12u], transforms[base + 13u], transforms[base + 14u]);
+    vec3 halfExtent = vec3(0.0);
+    for (uint row = 0u; row < 3u; row++) {
+        vec3 axis = vec3(transforms[base + row * 4u], transforms[base + row * 4u + 1u], transforms[base + row * 4u + 2u]);
+        center += localCenter[row] * axis;
+        halfExtent += localHalf[row] * abs(axis);
+    }
+
+    // outside when the whole box is behind any plane
+    for (int i = 0; i < 6; i++) {
+        float distance = dot(planes[i].xyz, center) + planes[i].w;
+        float radius = dot(abs(planes[i].xyz), halfExtent);
+        if (distance < -radius) {
+            visible[object] = 0u;
+            return;
+        }
+    }
+
+    visible[object] = 1u;
+
+    uint instance = commands[command].baseInstance + atomicAdd(commands[command].instanceCount, 1u);
+    for (uint i = 0u; i < 25u; i++) {
+        instances[instance * 25u + i] = transforms[base + i];
+    }
+#ifdef ATLAS
+    for (uint i = 0u; i < 5u; i++) {
+        instanceRegions[instance * 5u + i] = regions[object * 5u + i];
+    }
+#endif
+}
\ No newline at end of file
@@ -4,12 +4,77 @@
 in vec3 theNormal;
 in vec3 fragPos;
 in vec2 TexCoords;
+#ifdef ATLAS
+flat in float layer;
+#endif
 
 out vec4 outputColor;
 
+#ifdef ATLAS
+uniform sampler2DArray imageTexture;
+#else
 uniform sampler2D imageTexture;
+#endif
 uniform vec3 lightPos;
-uniform vec3 viewPos;
+
+#ifdef CLUSTERED_LIGHTS
+// local lights, four texels each: (position, range), (color, 0), (direction, cos outer), (cos inner, 0, 0, 0)
+uniform samplerBuffer lightData;
+
+// per cluster: first entry in lightIndices and number of lights
+uniform usamplerBuffer clusterData;
+uniform usamplerBuffer lightIndices;
+
+// cluster grid: tile size in pixels, tiles and depth slices, slice = log(depth) * x + y
+uniform vec2 clusterTileSize;
+uniform ivec3 clusterCounts;
+uniform vec2 clusterDepth;
+#endif
+
+// per-frame camera data, shared by every program
+layout (std140) uniform Camera {
+    mat4 projection;
+    mat4 view;
+    vec4 viewPos;
+};
+
+#ifdef CLUSTERED_LIGHTS
+// sums the diffuse and specular light of the local lights overlapping this fragment's cluster
+vec3 getLocalLight(vec3 norm, vec3 viewDir)
+{
+    float depth = -(view * vec4(fragPos, 1.0)).z;
+    int slice = int(max(log(depth) * clusterDepth.x + clusterDepth.y, 0.0));
+    ivec3 cell = min(ivec3(ivec2(gl_FragCoord.xy / clusterTileSize), slice), clusterCounts - 1);
+    int cluster = (cell.z * clusterCounts.y + cell.y) * clusterCounts.x + cell.x;
+    uvec2 range = texelFetch(clusterData, cluster).xy;
+
+    vec3 light = vec3(0.0);
+    for (uint i = 0u; i < range.y; i++) {
+        int texel = int(texelFetch(lightIndices, int(range.x + i)).r) * 4;
+        vec4 positionRange = texelFetch(lightData, texel);
+        vec3 color = texelFetch(lightData, texel + 1).rgb;
+        vec4 directionCone = texelFetch(lightData, texel + 2);
+        float cosInner = texelFetch(lightData, texel + 3).r;
+
+        vec3 toLight = positionRange.xyz - fragPos;
+        float distance = length(toLight);
+        vec3 lightDir = toLight / distance;
+
+        // inverse square falloff, windowed to reach zero at the range
+        float window = clamp(1.0 - pow(distance / positionRange.w, 4.0), 0.0, 1.0);
+        float attenuation = window * window / (1.0 + distance * distance);
+
+        // soft spotlight edge between the outer and inner cone
+        float cone = clamp((dot(-lightDir, directionCone.xyz) - directionCone.w) / max(cosInner - directionCone.w, 1e-4), 0.0, 1.0);
+
+        float diffInt = max(dot(lightDir, norm), 0.0);
+        float specPow = pow(max(dot(viewDir, reflect(-lightDir, norm)), 0.0), 256);
+        light += (diffInt + specPow) * attenuation * cone * cone * color;
+    }
+
+    return light;
+}
+#endif
 
 void main()
 {
@@ -27,14 +92,24 @@ void main()
 
     // specular component
     float specInt = 1.0;
-    vec3 viewDir = normalize(viewPos - fragPos);
+    vec3 viewDir = normalize(viewPos.xyz - fragPos);
     vec3 reflectDir = reflect(-lightDir, norm);
     float specPow = pow(max(dot(viewDir, reflectDir), 0.0), 256);
     vec3 spec = specInt * specPow * diffColor;
+
+    // local lights
+    vec3 local = vec3(0.0);
+#ifdef CLUSTERED_LIGHTS
+    local = getLocalLight(norm, viewDir);
+#endif
     
     vec3 fragColor = vec3(0.5, 0.7, 0.1);
     outputColor = vec4((spec + diff + amb) * fragColor, 1.0);
 
+#ifdef ATLAS
+    vec4 texColor = texture(imageTexture, vec3(TexCoords, layer)); // Sample the atlas layer
+#else
     vec4 texColor = texture(imageTexture, TexCoords); // Sample the texture
-    outputColor = vec4((spec + diff + amb) * texColor.rgb, texColor.a); // Use texture color
+#endif
+    outputColor = vec4((spec + diff + amb + local) * texColor.rgb, texColor.a); // Use texture color
 }
\ No newline at end of file
@@ -1,21 +1,58 @@
 #version 330 core
 
+// variants: INSTANCED reads the model and normal matrices per instance,
+// ATLAS (with INSTANCED) also reads each instance's atlas region
+
 // in from opengl application
 layout (location=0) in vec3 vertexPos;
 layout (location=1) in vec2 vertexTexCoord;
 layout (location=2) in vec3 normal;
 
+#ifdef INSTANCED
+// per-instance model matrix (occupies locations 3-6)
+layout (location=3) in mat4 instanceModel;
+
+// per-instance inverse transpose of the model matrix, computed on the CPU (locations 9-11)
+layout (location=9) in mat3 instanceNormalMatrix;
+
+#define model instanceModel
+#define normalMatrix instanceNormalMatrix
+#else
 uniform mat4 model;
-uniform mat4 projection;
+
+// inverse transpose of the model matrix, computed on the CPU
+uniform mat3 normalMatrix;
+#endif
+
+#ifdef ATLAS
+// per-instance atlas region: (u, v, width, height) and array layer
+layout (location=7) in vec4 instanceUvRect;
+layout (location=8) in float instanceLayer;
+#endif
+
+// per-frame camera data, shared by every program
+layout (std140) uniform Camera {
+    mat4 projection;
+    mat4 view;
+    vec4 viewPos;
+};
 
 // out to fragment shader
-out vec2 TexCoords; 
+out vec2 TexCoords;
 out vec3 fragPos;
 out vec3 theNormal;
+#ifdef ATLAS
+flat out float layer;
+#endif
 
 void main() {
-    gl_Position = projection * model * vec4(vertexPos, 1.0);
+    gl_Position = projection * view * model * vec4(vertexPos, 1.0);
     fragPos = vec3(model * vec4(vertexPos, 1.0));
-    theNormal = transpose(inverse(mat3(model))) * normal;
-    TexCoords = vertexTexCoord; 
-}
+    theNormal = normalMatrix * normal;
+#ifdef ATLAS
+    TexCoords = instanceUvRect.xy + vertexTexCoord * instanceUvRect.zw;
+    layer = instanceLayer;
+#else
+    TexCoords = vertexTexCoord;
+#endif
+}
\ No newline at end of file
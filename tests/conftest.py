@@ -0,0 +1,59 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import os
+import sys
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+sys.path.insert(0, SRC)
+
+# the GL tests render offscreen, EGL has to be chosen before anything imports OpenGL.
+import Headless
+
+@pytest.fixture(autouse=True)
+def src_directory(monkeypatch):
+
+    '''
+    Runs every test from src, shaders and textures are loaded by relative paths.
+    '''
+
+    monkeypatch.chdir(SRC)
+
+@pytest.fixture
+def create_scene():
+
+    '''
+    Creates headless scenes that are closed after the test (or earlier with close),
+    skipping the test on machines where no EGL context can be created.
+    '''
+
+    from Scene import Scene
+
+    scenes = []
+
+    def create(**kwargs):
+        try:
+            scene = Scene(headless=True, vsync=False, **kwargs)
+        except RuntimeError as error:
+            pytest.skip(f"no headless OpenGL context: {error}")
+
+        scenes.append(scene)
+        return scene
+
+    def close(scene):
+        # for tests checking what a closed scene leaves behind.
+        scenes.remove(scene)
+        scene.close()
+
+    create.close = close
+
+    yield create
+
+    for scene in scenes:
+        scene.close()
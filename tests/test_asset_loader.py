@@ -0,0 +1,90 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import logging
+import time
+import numpy as np
+import pytest
+from PIL import Image
+from Cube import Cube
+
+def pump_until_loaded(scene, timeout: float = 10.0):
+
+    '''
+    Renders frames until the loader has nothing left in flight.
+    '''
+
+    loader = scene.loader
+    deadline = time.perf_counter() + timeout
+    while loader.pending > 0 and time.perf_counter() < deadline:
+        scene.display()
+        loader.pump()
+        time.sleep(0.01)
+
+def test_broken_textures_keep_placeholder(create_scene, tmp_path, caplog):
+    good = str(tmp_path / "painting.png")
+    Image.fromarray(np.full((8, 8, 4), 200, dtype=np.uint8), "RGBA").save(good)
+
+    corrupt = str(tmp_path / "corrupt.png")
+    with open(corrupt, "wb") as f:
+        f.write(b"\x89PNG not really")
+
+    # a cache file cut short by a killed run is re-decoded, not a failure.
+    truncated = str(tmp_path / "truncated.png")
+    Image.fromarray(np.full((8, 8, 4), 100, dtype=np.uint8), "RGBA").save(truncated)
+    with open(truncated + ".texcache", "wb") as f:
+        f.write(b"DMTEXC01")
+
+    scene = create_scene(async_textures=True)
+    cubes = [Cube([0, 0, -2], [0, 0, 0], [1, 1, 1], [0, 0, 0], path)
+             for path in (good, str(tmp_path / "missing.png"), corrupt, truncated)]
+    scene.add_objects(cubes)
+
+    with caplog.at_level(logging.WARNING, logger="AssetLoader"):
+        pump_until_loaded(scene)
+        scene.display()
+
+    loader = scene.loader
+    stats = loader.stats()
+    assert stats["pending"] == 0 and stats["ready"] == 0
+    assert stats["failed"] == 2
+    assert stats["decoded"] == stats["uploaded"] == 2
+
+    placeholder = scene.textures.get_placeholder()
+    assert cubes[0].texture.get() != placeholder
+    assert cubes[1].texture.get() == placeholder
+    assert cubes[2].texture.get() == placeholder
+    assert cubes[3].texture.get() != placeholder
+
+    # the failures are logged once each, not retried every frame.
+    scene.display()
+    loader.pump()
+    assert loader.failed == 2
+    assert sum("could not load texture" in record.getMessage() for record in caplog.records) == 2
+
+def test_sync_scene_after_async_scene(create_scene):
+    scene = create_scene(async_textures=True)
+    scene.add_object(Cube([0, 0, -2], [0, 0, 0], [1, 1, 1], [0, 0, 0], "textures/walls/white.png"))
+    scene.display()
+    loader = scene.loader
+    create_scene.close(scene)
+
+    # the old loader's workers are joined and the next scene loads synchronously.
+    with pytest.raises(RuntimeError):
+        loader.executor.submit(print)
+    assert loader.pbo is None
+    assert scene.textures.loader is None
+
+    scene = create_scene()
+    cube = Cube([0, 0, -2], [0, 0, 0], [1, 1, 1], [0, 0, 0], "textures/walls/white.png")
+    scene.add_object(cube)
+    scene.display()
+
+    assert scene.loader is None
+    assert not cube.texture.loading
+    assert cube.texture.get() != scene.textures.get_placeholder()
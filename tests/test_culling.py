@@ -0,0 +1,153 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import numpy as np
+import pytest
+from Cube import Cube
+from Culling import BVH, FrustumCuller, classify_boxes, compute_aabbs, extract_frustum_planes
+
+def get_clip_mx(eye, yaw: float, far: float = 10.0) -> np.ndarray:
+
+    '''
+    Returns the view-projection matrix (row vectors) of a camera at eye, looking down
+    -z turned yaw degrees around y, with the scene's 90 degree 800x600 projection.
+    '''
+
+    translation = np.eye(4)
+    translation[3, :3] = -np.asarray(eye, dtype=np.float64)
+
+    angle = np.radians(yaw)
+    rotation = np.array([
+        [np.cos(angle), 0, np.sin(angle), 0],
+        [0, 1, 0, 0],
+        [-np.sin(angle), 0, np.cos(angle), 0],
+        [0, 0, 0, 1]
+    ])
+
+    near = 0.1
+    nf = 1 / (near - far)
+    projection = np.array([
+        [600 / 800, 0, 0, 0],
+        [0, 1, 0, 0],
+        [0, 0, (far + near) * nf, -1],
+        [0, 0, 2 * far * near * nf, 0]
+    ])
+
+    return translation @ rotation @ projection
+
+def random_boxes(rng: np.random.Generator, count: int) -> tuple:
+    centers = rng.uniform(-8, 8, (count, 3))
+    half_extents = rng.uniform(0.01, 0.5, (count, 3))
+    return centers - half_extents, centers + half_extents
+
+def brute_force(planes: np.ndarray, box_min: np.ndarray, box_max: np.ndarray) -> np.ndarray:
+    outside, _ = classify_boxes(planes, (box_min + box_max) * 0.5, (box_max - box_min) * 0.5)
+    return ~outside
+
+def random_planes(rng: np.random.Generator) -> np.ndarray:
+    return extract_frustum_planes(get_clip_mx(rng.uniform(-2, 2, 3), rng.uniform(0, 360)))
+
+def test_planes_keep_points_in_front():
+    planes = extract_frustum_planes(get_clip_mx((0, 0, 0), 0))
+    inside = np.array([[0, 0, -1], [0, 0, -9.9], [0.7, 0.9, -1]])
+    outside = np.array([[0, 0, 1], [0, 0, -10.5], [0, 1.5, -1], [0, 0, -0.05]])
+
+    assert (inside @ planes[:, :3].T + planes[:, 3] >= 0).all(axis=1).all()
+    assert not (outside @ planes[:, :3].T + planes[:, 3] >= 0).all(axis=1).any()
+
+@pytest.mark.parametrize("leaf_size", [1, 8, 64])
+def test_bvh_query_matches_brute_force(leaf_size):
+    rng = np.random.default_rng(leaf_size)
+    box_min, box_max = random_boxes(rng, 2000)
+
+    bvh = BVH(leaf_size)
+    bvh.build(box_min, box_max)
+
+    for _ in range(10):
+        planes = random_planes(rng)
+        np.testing.assert_array_equal(bvh.query(planes), brute_force(planes, box_min, box_max))
+
+def test_bvh_query_matches_brute_force_after_refits():
+    rng = np.random.default_rng(0)
+    box_min, box_max = random_boxes(rng, 1000)
+
+    bvh = BVH()
+    bvh.build(box_min, box_max)
+
+    for _ in range(30):
+        # moves of every size, from single boxes to all of them.
+        moved = rng.choice(len(box_min), rng.integers(1, len(box_min) + 1), replace=False)
+        box_min[moved], box_max[moved] = random_boxes(rng, len(moved))
+        bvh.refit(moved, box_min[moved], box_max[moved])
+
+        planes = random_planes(rng)
+        np.testing.assert_array_equal(bvh.query(planes), brute_force(planes, box_min, box_max))
+
+    # refitted bounds enclose their primitives.
+    primitives, offsets = bvh.get_primitives(np.arange(len(bvh.start)))
+    np.testing.assert_array_equal(bvh.node_min, np.minimum.reduceat(bvh.box_min[primitives], offsets))
+    np.testing.assert_array_equal(bvh.node_max, np.maximum.reduceat(bvh.box_max[primitives], offsets))
+
+def test_bvh_empty_and_single_box():
+    planes = extract_frustum_planes(get_clip_mx((0, 0, 0), 0))
+
+    bvh = BVH()
+    bvh.build(np.array([[-0.1, -0.1, -2.1]]), np.array([[0.1, 0.1, -1.9]]))
+    np.testing.assert_array_equal(bvh.query(planes), [True])
+
+    # e.g. after the last object left the scene.
+    bvh.build(np.zeros((0, 3)), np.zeros((0, 3)))
+    assert len(bvh.query(planes)) == 0
+    assert len(bvh.start) == 0
+
+def test_frustum_culler_across_frames():
+    rng = np.random.default_rng(1)
+    count = 500
+
+    matrices = np.tile(np.eye(4, dtype=np.float32), (count, 1, 1))
+    matrices[:, 3, :3] = rng.uniform(-8, 8, (count, 3))
+    matrices[:, [0, 1, 2], [0, 1, 2]] = rng.uniform(0.05, 0.5, (count, 3))
+    changed = np.ones(count, dtype=bool)
+
+    culler = FrustumCuller()
+    for frame in range(20):
+        clip_mx = get_clip_mx((0, 0, 0), frame * 18.0)
+        visible = culler.cull(matrices, changed, clip_mx)
+
+        centers, half_extents = compute_aabbs(matrices)
+        outside, _ = classify_boxes(extract_frustum_planes(clip_mx), centers, half_extents)
+        np.testing.assert_array_equal(visible, ~outside)
+
+        # some objects move, the rest keep their rows in the hierarchy.
+        changed = rng.random(count) < 0.1
+        matrices[changed, 3, :3] = rng.uniform(-8, 8, (int(changed.sum()), 3))
+
+def test_scene_counts_only_its_own_objects(create_scene):
+    scene = create_scene()
+    cubes = [Cube([index - 4.5, 0, -8], [0, 0, 0], [0.3, 0.3, 0.3], [0, 0, 0], "textures/walls/white.png")
+             for index in range(10)]
+    scene.add_objects(cubes[:3])
+
+    # rows of freed objects and of objects never added stay in the shared store.
+    for cube in cubes[3:]:
+        cube.release()
+    stray = Cube([0, 0, -4], [0, 0, 0], [1, 1, 1], [0, 0, 0], "textures/walls/white.png")
+
+    scene.update()
+    scene.display()
+    stats = scene.get_frame_stats()
+    assert stats["visible_objects"] == 3 and stats["total_objects"] == 3
+
+    scene.objects[0].position = [0, 0, 8]
+    scene.update()
+    scene.display()
+    stats = scene.get_frame_stats()
+    assert stats["visible_objects"] == 2 and stats["total_objects"] == 3
+
+    # the scene only releases its own objects, the shared mesh must not outlive the context.
+    stray.release()
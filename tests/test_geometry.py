@@ -0,0 +1,42 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+from Cube import Cube
+from Geometry import GeometryRegistry
+
+def test_shared_mesh_freed_with_last_reference(create_scene):
+    create_scene()
+    registry = GeometryRegistry()
+
+    first = registry.acquire("cube", Cube.build_mesh)
+    second = registry.acquire("cube", Cube.build_mesh)
+    assert first is second and first.ref_count == 2
+
+    registry.release(first)
+    assert registry.stats()["meshes"] == 1
+
+    registry.release(second)
+    assert registry.stats()["meshes"] == 0
+
+def test_extra_release_is_ignored(create_scene):
+    create_scene()
+    registry = GeometryRegistry()
+
+    stale = registry.acquire("cube", Cube.build_mesh)
+    registry.release(stale)
+    registry.release(stale)
+    assert stale.ref_count == 0
+
+    # a stale handle must not drop references of the mesh uploaded again under its key.
+    fresh = registry.acquire("cube", Cube.build_mesh)
+    registry.release(stale)
+    assert fresh.ref_count == 1
+    assert registry.stats()["meshes"] == 1
+
+    registry.release(fresh)
+    assert registry.stats()["meshes"] == 0
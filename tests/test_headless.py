@@ -0,0 +1,42 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import os
+import subprocess
+import sys
+import pytest
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src")
+
+def run_python(code: str, **environment) -> subprocess.CompletedProcess:
+
+    '''
+    Runs code in a fresh interpreter from src, PyOpenGL picks its platform on the
+    first import so this process's choice must not leak in.
+    '''
+
+    env = {key: value for key, value in os.environ.items() if key != "PYOPENGL_PLATFORM"}
+    env.update(environment)
+
+    return subprocess.run([sys.executable, "-c", code], cwd=SRC, env=env, capture_output=True, text=True)
+
+def test_headless_scene_without_egl_platform_raises():
+    result = run_python("from Scene import Scene\nScene(headless=True)")
+
+    assert result.returncode != 0
+    assert "RuntimeError: headless=True needs PyOpenGL's EGL platform" in result.stderr
+
+@pytest.mark.parametrize("mode", ["release", "debug"])
+def test_headless_scene_with_egl_platform(mode):
+    result = run_python("from Scene import Scene\nscene = Scene(headless=True)\nscene.close()",
+                        PYOPENGL_PLATFORM="egl", DIGITAL_MUSEUM_GL=mode)
+
+    if result.returncode != 0 and result.stderr.strip().splitlines()[-1].startswith("RuntimeError"):
+        pytest.skip(f"no headless OpenGL context: {result.stderr.strip().splitlines()[-1]}")
+
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,168 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import numpy as np
+import pytest
+from Portals import FULL_RECT, PortalGraph, intersect_rects, project_polygon
+
+def get_clip_mx(eye, yaw: float = 0.0) -> np.ndarray:
+
+    '''
+    Returns the view-projection matrix (row vectors) of a camera at eye with a 90 degree
+    field of view and a square viewport, looking down -z turned yaw degrees around y.
+    '''
+
+    translation = np.eye(4)
+    translation[3, :3] = -np.asarray(eye, dtype=np.float64)
+
+    angle = np.radians(yaw)
+    rotation = np.array([
+        [np.cos(angle), 0, np.sin(angle), 0],
+        [0, 1, 0, 0],
+        [-np.sin(angle), 0, np.cos(angle), 0],
+        [0, 0, 0, 1]
+    ])
+
+    near, far = 0.1, 100.0
+    nf = 1 / (near - far)
+    projection = np.array([
+        [1, 0, 0, 0],
+        [0, 1, 0, 0],
+        [0, 0, (far + near) * nf, -1],
+        [0, 0, 2 * far * near * nf, 0]
+    ])
+
+    return translation @ rotation @ projection
+
+def z_doorway(z: float, x0: float, x1: float, y0: float, y1: float) -> list:
+    return [(x0, y0, z), (x1, y0, z), (x1, y1, z), (x0, y1, z)]
+
+def x_doorway(x: float, z0: float, z1: float, y0: float, y1: float) -> list:
+    return [(x, y0, z0), (x, y0, z1), (x, y1, z1), (x, y1, z0)]
+
+def build_corridor() -> PortalGraph:
+
+    '''
+    Four rooms down -z, each doorway narrower than the one before it; the last one is
+    off to the side, hidden behind the wall around the second one as seen from the origin.
+    '''
+
+    graph = PortalGraph()
+    for index in range(4):
+        graph.add_cell((-2, -2, -4 * index - 2), (2, 2, -4 * index + 2), f"room {index}")
+
+    graph.add_portal(0, 1, z_doorway(-2, -1, 1, -1, 1))
+    graph.add_portal(1, 2, z_doorway(-6, -0.5, 0.5, -0.5, 0.5))
+    graph.add_portal(2, 3, z_doorway(-10, 1.5, 2, -0.5, 0.5))
+
+    return graph
+
+def build_cycle(order=(0, 1, 2)) -> PortalGraph:
+
+    '''
+    Three rooms each linked to the other two: A around the origin, B behind it along
+    -z and C to the right of both. The portals are added in the given order.
+    '''
+
+    graph = PortalGraph()
+    graph.add_cell((-2, -2, -2), (2, 2, 2), "A")
+    graph.add_cell((-2, -2, -6), (2, 2, -2), "B")
+    graph.add_cell((2, -2, -6), (6, 2, 2), "C")
+
+    portals = [
+        (0, 1, z_doorway(-2, -1.5, 1.5, -1, 1)),
+        (0, 2, x_doorway(2, -1.5, -0.5, -1, 1)),
+        (1, 2, x_doorway(2, -4, -3, -1, 1)),
+    ]
+    for index in order:
+        graph.add_portal(*portals[index])
+
+    return graph
+
+def test_corridor_narrows_rect_per_doorway():
+    rects = build_corridor().traverse((0, 0, 0), get_clip_mx((0, 0, 0)))
+
+    # a doorway of half width w at distance d spans w / d in normalized device coordinates.
+    assert rects[0] == FULL_RECT
+    np.testing.assert_allclose(rects[1], (-0.5, 0.5, -0.5, 0.5))
+    np.testing.assert_allclose(rects[2], (-1 / 12, 1 / 12, -1 / 12, 1 / 12))
+
+def test_doorway_hidden_behind_opening():
+    graph = build_corridor()
+    rects = graph.traverse((0, 0, 0), get_clip_mx((0, 0, 0)))
+
+    # the last doorway spans x 0.15 to 0.2 on screen, outside the second one.
+    assert rects[3] is None
+
+    # stepping up to the second doorway brings it into view.
+    rects = graph.traverse((0, 0, -5.5), get_clip_mx((0, 0, -5.5)))
+    assert rects[3] is not None
+
+def test_cycle_of_three_rooms():
+    rects = build_cycle().traverse((0, 0, 0), get_clip_mx((0, 0, 0)))
+
+    # C's doorway to A is outside the screen, C is only seen through B.
+    assert rects[0] == FULL_RECT
+    np.testing.assert_allclose(rects[1], (-0.75, 0.75, -0.5, 0.5))
+    np.testing.assert_allclose(rects[2], (0.5, 2 / 3, -1 / 3, 1 / 3))
+
+def test_cycle_through_both_paths():
+    graph = build_cycle()
+    eye = (0, 0, 0)
+    clip_mx = get_clip_mx(eye, yaw=-45)
+    rects = graph.traverse(eye, clip_mx)
+
+    # looking right of -z, C is seen through its doorway to A and, through B, the one to B.
+    direct = project_polygon(graph.portals[1][2], clip_mx)
+    through_b = intersect_rects(rects[1], project_polygon(graph.portals[2][2], clip_mx))
+    assert direct is not None and through_b is not None
+
+    np.testing.assert_allclose(rects[2], (min(direct[0], through_b[0]), max(direct[1], through_b[1]),
+                                          min(direct[2], through_b[2]), max(direct[3], through_b[3])))
+
+def test_eye_in_doorway():
+    graph = build_corridor()
+    eye = np.array([0, 0, -2.02])
+
+    assert graph.find_cell(eye) == 1
+    assert graph.is_in_portal(0, eye, 0.1)
+    assert not graph.is_in_portal(0, np.array([0, 0, -3.0]), 0.1)
+    assert not graph.is_in_portal(0, np.array([1.5, 0, -2.02]), 0.1)
+
+    # looking along the wall the doorway projects edge-on, the room behind it stays visible.
+    rects = graph.traverse(eye, get_clip_mx(eye, yaw=90))
+    assert rects[0] == rects[1] == FULL_RECT
+
+def test_eye_outside_every_cell():
+    eye = (0, 0, 5)
+    assert build_corridor().traverse(eye, get_clip_mx(eye)) is None
+
+@pytest.mark.parametrize("order", [(1, 2, 0), (2, 1, 0), (2, 0, 1)])
+def test_result_independent_of_portal_order(order):
+    for eye, yaw in (((0, 0, 0), 0), ((0, 0, 0), -45), ((0, 1, -4), -120)):
+        expected = build_cycle().traverse(eye, get_clip_mx(eye, yaw))
+        rects = build_cycle(order).traverse(eye, get_clip_mx(eye, yaw))
+
+        for rect, expected_rect in zip(rects, expected):
+            assert (rect is None) == (expected_rect is None)
+            if rect is not None:
+                np.testing.assert_allclose(rect, expected_rect)
+
+def test_traverse_is_repeatable():
+    graph = build_cycle()
+    eye = (0, 0, 0)
+
+    assert graph.traverse(eye, get_clip_mx(eye, -45)) == graph.traverse(eye, get_clip_mx(eye, -45))
+
+def test_portal_needs_three_corners():
+    graph = PortalGraph()
+    graph.add_cell((0, 0, 0), (1, 1, 1))
+    graph.add_cell((1, 0, 0), (2, 1, 1))
+
+    with pytest.raises(ValueError):
+        graph.add_portal(0, 1, [(1, 0, 0), (1, 1, 0)])
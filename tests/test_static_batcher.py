@@ -0,0 +1,56 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import numpy as np
+from Cube import Cube
+
+def get_baked_positions(scene, obj) -> tuple:
+
+    '''
+    Returns the world-space positions an object's batch holds and the ones its
+    current model matrix gives, for an object alone in its batch.
+    '''
+
+    batch = scene.batcher.batches[obj.texture.source]
+    model = scene.transforms.model_matrices()[obj.index]
+    expected = obj.mesh.vertices[:, 0:3] @ model[:3, :3] + model[3, :3]
+
+    return batch.vertices[:, 0:3], expected
+
+def render_frame(scene):
+    scene.update()
+    scene.display()
+
+def test_static_object_moved_while_batches_rebuild(create_scene):
+    scene = create_scene(static_batching=True)
+    moved = Cube([0, 0, 0], [0, 0, 0], [0.5, 0.5, 0.5], [0, 0, 0], "textures/walls/white.png")
+    other = Cube([0, 0, -3], [0, 0, 0], [0.5, 0.5, 0.5], [0, 0, 0], "textures/walls/putty.png")
+    scene.add_objects([moved, other])
+    render_frame(scene)
+
+    # the other object starting to rotate rebuilds the batches in the same frame.
+    moved.position = [2, 0, 0]
+    other.angular_velocity = [0, 1, 0]
+    render_frame(scene)
+    render_frame(scene)
+
+    baked, expected = get_baked_positions(scene, moved)
+    np.testing.assert_allclose(baked, expected, atol=1e-5)
+
+def test_static_object_moved_when_object_added(create_scene):
+    scene = create_scene(static_batching=True)
+    moved = Cube([0, 0, 0], [0, 0, 0], [0.5, 0.5, 0.5], [0, 0, 0], "textures/walls/white.png")
+    scene.add_object(moved)
+    render_frame(scene)
+
+    moved.position = [0, 1, 0]
+    scene.add_object(Cube([0, 0, -3], [0, 0, 0], [0.5, 0.5, 0.5], [0, 0, 0], "textures/walls/putty.png"))
+    render_frame(scene)
+
+    baked, expected = get_baked_positions(scene, moved)
+    np.testing.assert_allclose(baked, expected, atol=1e-5)
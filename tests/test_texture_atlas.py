@@ -0,0 +1,114 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import numpy as np
+import pytest
+from PIL import Image
+from GLBackend import GL_TEXTURE_2D
+from Cube import Cube
+from TextureAtlas import TextureAtlas, pack_rectangles
+from TextureManager import TextureHandle
+
+def assert_disjoint(rects: np.ndarray):
+
+    '''
+    Fails if any two (page, x0, y0, x1, y1) rectangles on the same page overlap.
+    '''
+
+    page, x0, y0, x1, y1 = rects.T
+    overlaps = ((page[:, None] == page[None]) & (x0[:, None] < x1[None]) & (x0[None] < x1[:, None])
+                & (y0[:, None] < y1[None]) & (y0[None] < y1[:, None]))
+    np.fill_diagonal(overlaps, False)
+
+    assert not overlaps.any(), np.argwhere(overlaps)[:5]
+
+@pytest.mark.parametrize("padding", [0, 2])
+def test_packed_rectangles_do_not_overlap(padding):
+    rng = np.random.default_rng(padding)
+    sizes = [tuple(size) for size in rng.integers(1, 300, (300, 2))]
+    page_size = 512
+
+    placements = pack_rectangles(sizes, page_size, padding)
+
+    # the padding around every rectangle is kept free as well.
+    rects = np.array([(page, x - padding, y - padding, x + width + padding, y + height + padding)
+                      for (page, x, y), (width, height) in zip(placements, sizes)])
+    assert (rects[:, 1:3] >= 0).all() and (rects[:, 3:5] <= page_size).all()
+    assert_disjoint(rects)
+
+def test_pack_rejects_rectangles_larger_than_a_page():
+    with pytest.raises(ValueError):
+        pack_rectangles([(10, 10), (100, 20)], 100, padding=1)
+
+def test_pack_single_page_order():
+    placements = pack_rectangles([(10, 10), (20, 30), (40, 10)], 64)
+
+    # tallest first, the wide one still fits its shelf, the last opens a shelf below it.
+    assert placements == [(0, 0, 30), (0, 0, 0), (0, 20, 0)]
+
+def test_atlas_build_regions_and_efficiency(tmp_path):
+    rng = np.random.default_rng(0)
+    atlas = TextureAtlas(page_size=128, padding=2)
+
+    images = {}
+    for index, (width, height) in enumerate(rng.integers(8, 60, (24, 2))):
+        pixels = rng.integers(0, 256, (height, width, 4), dtype=np.uint8)
+        path = str(tmp_path / f"image{index}.png")
+        Image.fromarray(pixels, "RGBA").save(path)
+        atlas.add_image(path)
+        images[path] = pixels
+
+    atlas.build()
+
+    rects = []
+    for path, pixels in images.items():
+        region = atlas.get_region(path)
+        x, y = round(region.rect[0] * 128), round(region.rect[1] * 128)
+        height, width = pixels.shape[:2]
+
+        # every image is composed into its region unchanged.
+        np.testing.assert_array_equal(atlas.pages[region.layer][y:y + height, x:x + width], pixels)
+        rects.append((region.layer, x, y, x + width, y + height))
+
+    assert_disjoint(np.array(rects))
+
+    used = sum(pixels.shape[0] * pixels.shape[1] for pixels in images.values())
+    report = atlas.report()
+    assert report["images"] == len(images)
+    assert report["layers"] == len(atlas.pages) > 1
+    assert report["efficiency"] == pytest.approx(used / (len(atlas.pages) * 128 ** 2))
+    assert 0 < report["efficiency"] <= 1
+
+def test_empty_atlas_efficiency():
+    atlas = TextureAtlas()
+    atlas.build()
+
+    assert atlas.get_efficiency() == 0.0
+    assert atlas.report()["layers"] == 0
+
+def test_plain_scene_after_atlas_scene(create_scene):
+    atlas = TextureAtlas(page_size=256)
+    atlas.add_image("textures/walls/white.png")
+    atlas.build()
+
+    scene = create_scene(atlas=atlas)
+    scene.add_object(Cube([0, 0, -2], [0, 0, 0], [1, 1, 1], [0, 0, 0], "textures/walls/white.png"))
+    scene.display()
+    create_scene.close(scene)
+    assert atlas.texture is None
+
+    # the shared texture manager is back to plain textures, including ones outside the atlas.
+    scene = create_scene()
+    cubes = [Cube([0, 0, -2], [0, 0, 0], [1, 1, 1], [0, 0, 0], path)
+             for path in ("textures/walls/white.png", "textures/paintings/abstract.jpeg")]
+    scene.add_objects(cubes)
+    scene.display()
+
+    for cube in cubes:
+        assert isinstance(cube.texture, TextureHandle)
+        assert cube.texture.target == GL_TEXTURE_2D
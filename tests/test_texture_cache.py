@@ -0,0 +1,47 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import os
+import numpy as np
+import pytest
+from PIL import Image
+from TextureCache import TextureCache
+
+@pytest.fixture
+def image_path(tmp_path) -> str:
+    pixels = np.random.default_rng(0).integers(0, 256, (30, 20, 4), dtype=np.uint8)
+    path = str(tmp_path / "painting.png")
+    Image.fromarray(pixels, "RGBA").save(path)
+    return path
+
+def test_second_load_maps_cache(image_path):
+    cache = TextureCache()
+    decoded = cache.load(image_path)
+    mapped = cache.load(image_path)
+
+    assert not decoded.from_cache
+    assert mapped.from_cache
+    for expected, level in zip(decoded.levels, mapped.levels):
+        np.testing.assert_array_equal(level, expected)
+
+@pytest.mark.parametrize("size", [0, 20, 60, -1])
+def test_truncated_cache_is_rewritten(image_path, size):
+    cache = TextureCache()
+    expected = cache.load(image_path).levels
+
+    # cut the file inside the header, the level table and the last level.
+    cache_path = cache.get_cache_path(image_path)
+    with open(cache_path, "r+b") as f:
+        f.truncate(size if size >= 0 else os.path.getsize(cache_path) - 1)
+
+    data = cache.load(image_path)
+    assert not data.from_cache
+    for level, pixels in zip(data.levels, expected):
+        np.testing.assert_array_equal(level, pixels)
+
+    assert cache.load(image_path).from_cache
@@ -0,0 +1,28 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+from Cube import Cube
+
+def test_hits_count_deduplicated_acquires(create_scene):
+    scene = create_scene()
+
+    # the manager is shared with earlier scenes, only this test's counts matter.
+    before = scene.textures.stats()
+    scene.add_objects([Cube([index - 1, 0, -3], [0, 0, 0], [0.5, 0.5, 0.5], [0, 0, 0], path)
+                       for index, path in enumerate(["textures/walls/white.png"] * 3 + ["textures/walls/putty.png"])])
+
+    stats = scene.textures.stats()
+    assert stats["misses"] - before["misses"] == 2 and stats["hits"] - before["hits"] == 2
+
+    # drawing frames uses the textures without acquiring them again.
+    for _ in range(5):
+        scene.update()
+        scene.display()
+
+    stats = scene.textures.stats()
+    assert stats["misses"] - before["misses"] == 2 and stats["hits"] - before["hits"] == 2
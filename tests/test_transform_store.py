@@ -0,0 +1,70 @@
+'''
+Author: William Abrahamsson
+Mail: william_abrahamsson@outlook.com
+    (alt): wa222dt@student.lnu.se
+
+Digital Museum
+'''
+
+import numpy as np
+import pytest
+from Cube import Cube
+from TransformStore import TransformStore
+
+def fill_store(seed: int, count: int, alpha: float = None) -> TransformStore:
+
+    '''
+    Returns a store of count random objects, with non-uniform and some zero scales,
+    the angles advanced by alpha of their angular velocities if given.
+    '''
+
+    store = TransformStore(4)
+    rng = np.random.default_rng(seed)
+    for index in range(count):
+        scale = rng.uniform(-2, 2, 3)
+        if index % 7 == 0:
+            scale[index % 3] = 0
+        angles = rng.uniform(-360, 360, 3)
+        velocity = rng.uniform(-5, 5, 3)
+        if alpha is not None:
+            angles = angles + alpha * velocity
+        store.allocate(rng.uniform(-10, 10, 3), angles, scale, velocity)
+
+    return store
+
+def get_reference(store: TransformStore) -> np.ndarray:
+
+    '''
+    Returns the per-object Cube.transform() of every row, through views without GL resources.
+    '''
+
+    matrices = []
+    for index in range(store.count):
+        view = Cube.__new__(Cube)
+        view.store = store
+        view.index = index
+        matrices.append(view.transform())
+
+    return np.array(matrices)
+
+def test_batched_matrices_match_per_object_transform():
+    store = fill_store(0, 200)
+    np.testing.assert_allclose(store.model_matrices(), get_reference(store), rtol=1e-5, atol=1e-5)
+
+    # after ticks only the rotating rows are recomputed, the cache still matches.
+    for _ in range(3):
+        store.advance()
+    store.scales[5] = [0, 1, 2]
+    store.mark_dirty(5)
+    np.testing.assert_allclose(store.model_matrices(), get_reference(store), rtol=1e-5, atol=1e-5)
+
+@pytest.mark.parametrize("alpha", [0.25, 0.5, 0.9])
+def test_interpolated_matrices_match_advanced_angles(alpha):
+    store = fill_store(1, 100)
+
+    # interpolating adds alpha of a tick's rotation to the angles.
+    expected = get_reference(fill_store(1, 100, alpha))
+    np.testing.assert_allclose(store.model_matrices(alpha), expected, rtol=1e-4, atol=1e-4)
+
+    # going back to the tick itself recomputes the rotating rows.
+    np.testing.assert_allclose(store.model_matrices(), get_reference(store), rtol=1e-5, atol=1e-5)